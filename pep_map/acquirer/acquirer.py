@@ -1,21 +1,69 @@
-import codecs
 from datetime import datetime
 import glob
+import http.client
+import logging
 import os
 from pathlib import Path
+import threading
 import time
-import urllib.request
+import urllib.error
 from urllib.parse import urlparse
 
 import pandas as pd
 
+from instrumentation import count, log_event, timer
+from .http_cache import HttpCache
+from .http_transport import HttpTransport
+from .rate_limiter import HostRateLimiter
+from .raw_data_store import ContentAddressedRawDataStore
+
+# 4xxのうち、時間をおいて再試行すると成功する可能性があるステータスコード
+_RETRYABLE_CLIENT_ERROR_CODES = (408, 429)
+
+logger = logging.getLogger(__name__)
+
+
+def is_fetch_error(error: Exception) -> bool:
+    """
+    Webからの取得時に発生するエラー（HTTPエラー、接続エラー、タイムアウトなど）かを判定する
+    """
+    return isinstance(error, (urllib.error.URLError, http.client.HTTPException,
+                              ConnectionError, TimeoutError))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    一時的な障害によるエラー（接続エラー、タイムアウト、5xxなど）で、再試行する価値があるかを判定する
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code in _RETRYABLE_CLIENT_ERROR_CODES
+    return is_fetch_error(error)
+
 
 class Acquirer:
 
     def __init__(self,
                  should_save_raw_data: bool = False,
                  raw_data_out_root_path: str='html',
-                 make_fetch_datetime_dir: bool=True) -> None:
+                 make_fetch_datetime_dir: bool=True,
+                 base_url: str = 'https://www.python.org',
+                 max_workers: int = 1,
+                 max_in_flight_per_host: int = None,
+                 requests_per_second: float = 1.0,
+                 http_cache_dir_path: str = None,
+                 raw_data_store: ContentAddressedRawDataStore = None,
+                 max_retries: int = 3,
+                 retry_backoff_seconds: float = 1.0) -> None:
+        """
+        :param base_url: 取得先のサイトのURL。ローカルのHTTPサーバで代用するときに変更する
+        :param max_workers: 並行して取得するスレッド数。1の場合は逐次取得する
+        :param max_in_flight_per_host: 1つのホストに対する同時リクエスト数の上限。省略時はmax_workers
+        :param requests_per_second: 1つのホストに対する1秒あたりのリクエスト数の上限（並行取得時のみ有効）
+        :param http_cache_dir_path: 条件付きGETのキャッシュを保存するディレクトリのパス。省略時はキャッシュしない
+        :param raw_data_store: HTMLの保存先・読み込み元のストア。省略時はディレクトリにファイルとして保存する
+        :param max_retries: 一時的なエラーで取得に失敗したときに再試行する回数
+        :param retry_backoff_seconds: 1回目の再試行までの待ち時間（秒）。再試行のたびに2倍にする
+        """
         self._fetch_start_datetime = None
         self._data = None
         self._csv_out_file_name_base = ''
@@ -27,6 +75,36 @@ class Acquirer:
         self._raw_data_out_dir_path = None
         self._make_fetch_datetime_dir = make_fetch_datetime_dir
 
+        self._base_url = base_url.rstrip('/')
+        self._max_workers = max_workers
+        self._rate_limiter = None
+        if max_workers > 1:
+            max_in_flight = max_in_flight_per_host if max_in_flight_per_host else max_workers
+            self._rate_limiter = HostRateLimiter(max_in_flight=max_in_flight,
+                                                 requests_per_second=requests_per_second)
+
+        self._http_cache = HttpCache(http_cache_dir_path) if http_cache_dir_path else None
+        self._cache_hit_count = 0
+        self._cache_miss_count = 0
+        self._counter_lock = threading.Lock()
+
+        self._raw_data_store = raw_data_store
+        self._transport = HttpTransport()
+
+        self._max_retries = max_retries
+        self._retry_backoff_seconds = retry_backoff_seconds
+
+    def __getstate__(self) -> dict:
+        # プロセスプールに渡すときは、pickleできないロックとリミッタを除く
+        state = self.__dict__.copy()
+        state['_rate_limiter'] = None
+        del state['_counter_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._counter_lock = threading.Lock()
+
     @property
     def fetch_start_datetime(self):
         return self._fetch_start_datetime
@@ -39,6 +117,14 @@ class Acquirer:
     def raw_data_out_dir_path(self):
         return self._raw_data_out_dir_path
 
+    @property
+    def cache_hit_count(self) -> int:
+        return self._cache_hit_count
+
+    @property
+    def cache_miss_count(self) -> int:
+        return self._cache_miss_count
+
     @property
     def data(self):
         return self._data
@@ -74,26 +160,84 @@ class Acquirer:
         :param url: 取得先のURL
         :return: 取得したHTMLデータ
         """
-        # logging.info('Started to fetch: {}'.format(url))
-        sleep_time = 1 if sleep_time < 1 else sleep_time  # sleep_timeが1s以下だと迷惑をかけるので強制的に1に設定する
-        time.sleep(sleep_time)
-        req = urllib.request.Request(str(url))
-        response = urllib.request.urlopen(req)
-        html = response.read()
+        for attempt in range(self._max_retries + 1):
+            try:
+                if self._rate_limiter:
+                    # 並行取得時はホストごとのリクエスト予算の範囲内で取得する
+                    with self._rate_limiter.limit(url):
+                        html = self._request_html(url)
+                else:
+                    sleep_time = 1 if sleep_time < 1 else sleep_time  # sleep_timeが1s以下だと迷惑をかけるので強制的に1に設定する
+                    with timer('fetch_wait'):
+                        time.sleep(sleep_time)
+                    html = self._request_html(url)
+                break
+            except Exception as e:
+                if attempt >= self._max_retries or not is_retryable_error(e):
+                    raise
+                backoff_seconds = self._retry_backoff_seconds * (2 ** attempt)
+                count('fetch_retries')
+                log_event(logger, 'fetch_retry', level=logging.WARNING,
+                          message='Failed to fetch ({}), retrying in {}s: {}'.format(e, backoff_seconds, url),
+                          url=url, error=repr(e), attempt=attempt + 1, backoff_seconds=backoff_seconds)
+                with timer('fetch_wait'):
+                    time.sleep(backoff_seconds)
 
-        print('Compeleted to fetch.: {}'.format(url))  # TODO: loggigに置き換える
+        count('pages_fetched')
+        count('bytes_fetched', len(html))
+        log_event(logger, 'fetch', level=logging.DEBUG,
+                  message='Completed to fetch: {}'.format(url), url=url, bytes=len(html))
 
         return html
 
+    def _request_html(self, url: str) -> bytes:
+        # キャッシュ済みなら条件付きGETを行い、304が返ってきたらキャッシュを使う
+        headers = self._http_cache.conditional_headers(url) if self._http_cache else {}
+        # レート制限の待ち時間を除いた、リクエストの時間だけを計測する
+        with timer('fetch'):
+            response = self._transport.get(url, headers=headers)
+
+        if response.status == 304:
+            if not headers:
+                raise urllib.error.HTTPError(url, response.status, 'Unexpected 304 response',
+                                             response.headers, None)
+            self._count_cache_result(is_hit=True)
+            return self._http_cache.load_body(url)
+
+        if self._http_cache:
+            self._count_cache_result(is_hit=False)
+            self._http_cache.store(url, response.body, response.headers)
+        return response.body
+
+    def _count_cache_result(self, is_hit: bool) -> None:
+        with self._counter_lock:
+            if is_hit:
+                self._cache_hit_count += 1
+            else:
+                self._cache_miss_count += 1
+        count('http_cache_hits' if is_hit else 'http_cache_misses')
+
     def _save_html(self, html: bytes, path: Path) -> None:
-        os.makedirs(path.parent, exist_ok=True)
-        with path.open(mode='w', encoding='utf-8') as f:
-            f.write(html.decode('utf-8'))
+        count('bytes_saved', len(html))
+        with timer('save_raw'):
+            if self._raw_data_store:
+                # ストアでは、保存先のディレクトリ名をスナップショットの名前として扱う
+                self._raw_data_store.put(path.parent.name, path.name, html)
+                return
+
+            os.makedirs(path.parent, exist_ok=True)
+            with path.open(mode='wb') as f:
+                f.write(html)
 
     def _load_html(self, path: Path) -> bytes:
-        with codecs.open(path, mode='r', encoding='utf-8') as f:
-            html = f.read()
-        html = html.encode('utf-8')
+        path = Path(path)
+        with timer('load'):
+            if self._raw_data_store and self._raw_data_store.has(path.parent.name, path.name):
+                html = self._raw_data_store.get(path.parent.name, path.name)
+            else:
+                with path.open(mode='rb') as f:
+                    html = f.read()
+        count('bytes_loaded', len(html))
         return html
 
     def _extract_fetch_date_time_from_path(self, path) -> datetime:
@@ -124,7 +268,7 @@ class Acquirer:
         # Save
         df = self._to_dataframe(source_dict)
         df.to_csv(path, encoding='utf-8')
-        print('Compeleted to save csv file: {}'.format(path))  # TODO: loggingで置き換える
+        logger.info('Completed to save csv file: {}'.format(path))
 
     def _to_dataframe(self, source_dict: dict) -> pd.DataFrame:
         df = pd.DataFrame(source_dict).T
@@ -141,6 +285,7 @@ class Acquirer:
                                         input_local_dir_path: str) -> datetime:
         # 指定されたディレクトリが日付形式の場合は、その日をfetch_dateだと解釈する
         # 指定されたディレクトリが日付形式ではない場合は、そのフォルダ内の最新日付のファイルの作成日で解釈する
+        # HTMLがストアにだけある場合はマニフェストの更新日時、どちらもない場合は現在の日時とする
 
         dir_name = Path(input_local_dir_path).name
         try:
@@ -149,7 +294,10 @@ class Acquirer:
         except ValueError:
             path_list = glob.glob(os.path.join(input_local_dir_path, '*.html'))
             mtime_list = [os.stat(x).st_mtime for x in path_list]
-            fetch_start_datetime = datetime.fromtimestamp(min(mtime_list))
+            if not mtime_list and self._raw_data_store:
+                snapshot_mtime = self._raw_data_store.snapshot_mtime(dir_name)
+                mtime_list = [snapshot_mtime] if snapshot_mtime is not None else []
+            fetch_start_datetime = datetime.fromtimestamp(min(mtime_list)) if mtime_list else datetime.now()
 
         return fetch_start_datetime
 
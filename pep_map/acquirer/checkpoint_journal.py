@@ -0,0 +1,111 @@
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+
+
+def _to_json_value(value):
+    # numpyの整数型などはjsonで直接書き込めないので、Pythonの型に変換する
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+class CheckpointJournal:
+    """
+    取得が完了したPEPのレコードを1件ずつ追記するJSON Linesのジャーナル
+    1行目は実行の情報(fetch_start_datetime, raw_data_out_dir_path)、2行目以降は
+    {"pep_id": ..., "record": ..., "content_hash": ...}の形式で記録する
+    途中で異常終了した場合でも、ジャーナルから取得済みのレコードを復元して再開できる
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = Path(path)
+        self._file = None
+        self._meta = None
+        self._records = {}
+        self._content_hashes = {}
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def fetch_start_datetime(self) -> datetime:
+        if not self._meta:
+            return None
+        return datetime.fromisoformat(self._meta['fetch_start_datetime'])
+
+    @property
+    def raw_data_out_dir_path(self) -> str:
+        if not self._meta:
+            return None
+        return self._meta['raw_data_out_dir_path']
+
+    @property
+    def records(self) -> dict:
+        return self._records
+
+    @property
+    def content_hashes(self) -> dict:
+        return self._content_hashes
+
+    def exists(self) -> bool:
+        return self._path.exists()
+
+    def load(self) -> None:
+        """
+        ジャーナルを読み込み、取得済みのレコードを復元する
+        書き込み途中で終了した最後の行は読み飛ばす
+        """
+        self._meta = None
+        self._records = {}
+        self._content_hashes = {}
+        with self._path.open(mode='r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'pep_id' not in entry:
+                    self._meta = entry
+                    continue
+                self._records[entry['pep_id']] = entry['record']
+                if entry.get('content_hash'):
+                    self._content_hashes[entry['pep_id']] = entry['content_hash']
+
+    def open(self, fetch_start_datetime: datetime, raw_data_out_dir_path: str,
+             resume: bool = False) -> None:
+        """
+        ジャーナルを書き込み用に開く
+        :param resume: Trueの場合は既存のジャーナルに追記し、Falseの場合は新しく作り直す
+        """
+        os.makedirs(self._path.parent, exist_ok=True)
+        if resume and self.exists():
+            self._file = self._path.open(mode='a', encoding='utf-8')
+            return
+
+        self._meta = dict(fetch_start_datetime=fetch_start_datetime.isoformat(),
+                          raw_data_out_dir_path=raw_data_out_dir_path)
+        self._records = {}
+        self._content_hashes = {}
+        self._file = self._path.open(mode='w', encoding='utf-8')
+        self._write_line(self._meta)
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def append(self, pep_id: str, record: dict, content_hash: str = None) -> None:
+        """
+        取得が完了したPEPのレコードを追記する。異常終了に備えて、1件ごとにフラッシュする
+        """
+        self._records[pep_id] = record
+        if content_hash:
+            self._content_hashes[pep_id] = content_hash
+        self._write_line(dict(pep_id=pep_id, record=record, content_hash=content_hash))
+
+    def _write_line(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=_to_json_value) + '\n')
+        self._file.flush()
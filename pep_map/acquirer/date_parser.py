@@ -0,0 +1,107 @@
+from datetime import datetime
+import re
+
+import pandas as pd
+
+# PEPのCreatedフィールドで想定する日付書式のリスト
+PEP_CREATED_FORMATS = ['%d-%b-%Y', '%d-%B-%Y', '%Y-%m-%d', '%d %b %Y', '%d %B %Y']
+
+# python.orgのダウンロードページのリリース日の書式のリスト（例: "Oct. 24, 2022", "June 6, 2022"）
+RELEASE_DATE_FORMATS = ['%b. %d, %Y', '%B %d, %Y', '%b %d, %Y']
+
+# 日付情報の後にコメントが入っている形式
+_TRAILING_COMMENT_PATTERN = re.compile('^[0-9]{1,2}-[a-z,A-Z]{3}-[0-9]{4}.+$')
+
+
+def _parse_trailing_comment(source_str: str) -> datetime:
+    # 日付情報の後にコメントが入っている形式があるので、
+    # コメント部分をトリミングしてから日付型に変換する
+    if not _TRAILING_COMMENT_PATTERN.match(source_str):
+        return None
+    try:
+        return datetime.strptime(source_str[:len('YYYY-mm-dd') + 1], '%d-%b-%Y')
+    except ValueError:
+        return None
+
+
+def _normalize_release_date(source_str: str) -> str:
+    return source_str.replace('Sept.', 'Sep.')
+
+
+class DateParser:
+    """
+    書式が揃っていない日付文字列を日付型に変換する
+    変換結果は文字列ごとにキャッシュし、直前に成功した書式から試すので、
+    同じ書式の文字列が多い列は1回のstrptimeで変換できる
+    """
+
+    def __init__(self, formats: list,
+                 normalize=None,
+                 fallback=None) -> None:
+        """
+        :param formats: 想定する日付書式のリスト
+        :param normalize: 変換前に文字列を整形する関数
+        :param fallback: どの書式でも変換できなかったときに使う、文字列から日付型（失敗時はNone）を返す関数
+        """
+        self._formats = list(formats)
+        self._normalize = normalize
+        self._fallback = fallback
+        self._last_format = self._formats[0]
+        self._cache = {}
+
+    def parse(self, source_str: str):
+        """
+        文字列を日付型に変換する
+        :param source_str: 変換前の文字列
+        :return: (変換後の日付型, 変換に失敗したか)。空文字列とnullは失敗とせずNaTを返す
+        """
+        if (source_str != source_str) or not source_str:  # nullチェック
+            return pd.NaT, False
+
+        if source_str not in self._cache:
+            self._cache[source_str] = self._parse_uncached(source_str)
+
+        converted = self._cache[source_str]
+        if converted is None:
+            return pd.NaT, True
+        return converted, False
+
+    def _parse_uncached(self, source_str: str) -> datetime:
+        target_str = self._normalize(source_str) if self._normalize else source_str
+
+        # 直前に成功した書式から試す
+        last_format = self._last_format
+        format_list = [last_format] + [x for x in self._formats if x != last_format]
+        for format_text in format_list:
+            try:
+                converted = datetime.strptime(target_str, format_text)
+            except ValueError:
+                continue
+            self._last_format = format_text
+            return converted
+
+        if self._fallback:
+            return self._fallback(target_str)
+
+        return None
+
+    def parse_series(self, series: pd.Series) -> (pd.Series, pd.Series):
+        """
+        日付文字列の列をまとめて変換する。異なる文字列ごとに1回だけ変換する
+        :param series: 変換前の文字列の列
+        :return: (変換後の日付型の列, 変換に失敗したかの列)
+        """
+        unique_values = pd.unique(series.dropna())
+        parsed_dict = {value: self.parse(value) for value in unique_values}
+
+        converted = series.map(lambda x: parsed_dict[x][0] if x in parsed_dict else pd.NaT)
+        failed = series.map(lambda x: parsed_dict[x][1] if x in parsed_dict else False)
+        return pd.to_datetime(converted), failed.astype(bool)
+
+
+def make_pep_created_date_parser() -> DateParser:
+    return DateParser(PEP_CREATED_FORMATS, fallback=_parse_trailing_comment)
+
+
+def make_release_date_parser() -> DateParser:
+    return DateParser(RELEASE_DATE_FORMATS, normalize=_normalize_release_date)
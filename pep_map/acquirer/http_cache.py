@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+class HttpCache:
+    """
+    ETag/Last-Modifiedを使った条件付きGETのためのディスクキャッシュ
+    URLごとに、レスポンスの本文(.body)と検証用のヘッダ(.json)を保存する
+    """
+
+    def __init__(self, cache_dir_path: str) -> None:
+        self._cache_dir_path = Path(cache_dir_path)
+        os.makedirs(self._cache_dir_path, exist_ok=True)
+
+    @property
+    def cache_dir_path(self) -> Path:
+        return self._cache_dir_path
+
+    def _entry_paths(self, url: str) -> (Path, Path):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        body_path = self._cache_dir_path / '{}.body'.format(key)
+        meta_path = self._cache_dir_path / '{}.json'.format(key)
+        return body_path, meta_path
+
+    def _load_meta(self, url: str) -> dict:
+        body_path, meta_path = self._entry_paths(url)
+        if not (body_path.exists() and meta_path.exists()):
+            return {}
+        with meta_path.open(mode='r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        キャッシュ済みのURLについて、条件付きGETのリクエストヘッダを作成する
+        :param url: リクエスト先のURL
+        :return: If-None-Match, If-Modified-Sinceのヘッダの辞書。キャッシュがなければ空の辞書
+        """
+        meta = self._load_meta(url)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load_body(self, url: str) -> bytes:
+        body_path, _ = self._entry_paths(url)
+        return body_path.read_bytes()
+
+    def store(self, url: str, body: bytes, headers) -> None:
+        """
+        レスポンスをキャッシュに保存する。検証用のヘッダがないレスポンスは保存しない
+        :param url: リクエスト先のURL
+        :param body: レスポンスの本文
+        :param headers: レスポンスヘッダ（getで値を取り出せるもの）
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not (etag or last_modified):
+            return
+
+        body_path, meta_path = self._entry_paths(url)
+        meta = dict(url=url, etag=etag, last_modified=last_modified)
+
+        # 並行取得中に読まれても壊れないように、一時ファイルに書いてから置き換える
+        self._write_atomically(body_path, body)
+        self._write_atomically(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def _write_atomically(self, path: Path, data: bytes) -> None:
+        tmp_path = path.with_name('{}.{}.tmp'.format(path.name, os.getpid()))
+        tmp_path.write_bytes(data)
+        os.replace(str(tmp_path), str(path))
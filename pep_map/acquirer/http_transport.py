@@ -0,0 +1,141 @@
+import http.client
+import threading
+import urllib.error
+from urllib.parse import urljoin, urlparse
+import zlib
+
+DEFAULT_REQUEST_HEADERS = {
+    'User-Agent': 'pep_map (https://github.com/komo-fr/pep_map_site)',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+
+
+class HttpResponse:
+    def __init__(self, url: str, status: int, headers, body: bytes) -> None:
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class HttpTransport:
+    """
+    ホストごとに持続的なHTTP接続を再利用し、gzip/deflateで圧縮されたレスポンスを受け取るためのクライアント
+    接続はスレッドごとに持つので、並行取得時にも使用できる
+    """
+
+    def __init__(self, timeout: float = 30, max_redirects: int = 5,
+                 chunk_size: int = 64 * 1024) -> None:
+        self._timeout = timeout
+        self._max_redirects = max_redirects
+        self._chunk_size = chunk_size
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connections(self) -> dict:
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+    def _get_connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        connections = self._connections()
+        key = (scheme, netloc)
+        if key not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self._timeout)
+        return connections[key]
+
+    def _discard_connection(self, scheme: str, netloc: str) -> None:
+        connection = self._connections().pop((scheme, netloc), None)
+        if connection:
+            connection.close()
+
+    def close(self) -> None:
+        for connection in self._connections().values():
+            connection.close()
+        self._connections().clear()
+
+    def get(self, url: str, headers: dict = None) -> HttpResponse:
+        """
+        URLにGETリクエストを送り、リダイレクトをたどってレスポンスを返す
+        304はそのまま返し、400以上はurllibと同じくHTTPErrorを送出する
+        :param url: リクエスト先のURL
+        :param headers: 追加のリクエストヘッダ
+        :return: 展開済みの本文を持つレスポンス
+        """
+        request_headers = dict(DEFAULT_REQUEST_HEADERS)
+        request_headers.update(headers or {})
+
+        for _ in range(self._max_redirects + 1):
+            status, response_headers, body = self._request(url, request_headers)
+            if status in REDIRECT_STATUS_CODES and response_headers.get('Location'):
+                url = urljoin(url, response_headers['Location'])
+                continue
+            if status >= 400:
+                raise urllib.error.HTTPError(url, status, 'HTTP Error {}'.format(status),
+                                             response_headers, None)
+            return HttpResponse(url, status, response_headers, body)
+
+        raise urllib.error.HTTPError(url, status, 'Too many redirects', response_headers, None)
+
+    def _request(self, url: str, headers: dict) -> (int, http.client.HTTPMessage, bytes):
+        o = urlparse(url)
+        path = o.path or '/'
+        if o.query:
+            path += '?' + o.query
+
+        # 再利用した接続がサーバ側で切られていた場合は、1回だけ接続し直す
+        for attempt in range(2):
+            connection = self._get_connection(o.scheme, o.netloc)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = self._read_body(response)
+                break
+            except (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                    ConnectionResetError, BrokenPipeError):
+                self._discard_connection(o.scheme, o.netloc)
+                if attempt > 0:
+                    raise
+            except BaseException:
+                # タイムアウトなどで途中まで送受信した接続は再利用できないので、捨ててから送出する
+                self._discard_connection(o.scheme, o.netloc)
+                raise
+
+        if response.will_close:
+            self._discard_connection(o.scheme, o.netloc)
+
+        return response.status, response.headers, body
+
+    def _read_body(self, response: http.client.HTTPResponse) -> bytes:
+        # 圧縮されたレスポンスは、読み込みながら展開する
+        encoding = (response.headers.get('Content-Encoding') or '').lower()
+        if encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decompressor = zlib.decompressobj()
+        else:
+            decompressor = None
+
+        chunks = []
+        while True:
+            chunk = response.read(self._chunk_size)
+            if not chunk:
+                break
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            chunks.append(chunk)
+        if decompressor:
+            chunks.append(decompressor.flush())
+
+        return b''.join(chunks)
@@ -0,0 +1,147 @@
+import argparse
+import collections
+from html import unescape
+import io
+from pathlib import Path
+import re
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# PEPへのリンクとみなすhrefのパターン
+PEP_LINK_PATTERN = re.compile('/dev/peps/pep-[0-9]{4}')
+PEP_LINK_BYTES_PATTERN = re.compile(b'/dev/peps/pep-[0-9]{4}|&')
+
+_PEP_URL_WITH_FRAGMENT_PATTERN = re.compile('.+/pep-[0-9]{4}/#.+')
+_PEP_URL_PATTERN = re.compile('.+/pep-[0-9]{4}/{0,1}')
+
+# <a>タグのhref属性（ダブルクォート、シングルクォート、クォートなし）
+_ANCHOR_HREF_PATTERN = re.compile(
+    rb'<a\s(?:[^>"\']|"[^"]*"|\'[^\']*\')*?(?<![\w-])href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))',
+    re.IGNORECASE)
+_COMMENT_PATTERN = re.compile(rb'<!--.*?-->', re.DOTALL)
+
+
+def extract_pep_id(url: str) -> str:
+    """
+    URL文字列から、PEPの番号を抽出する
+    :param url: 抽出元のURL
+    :return: PEPの番号。PEPのURLでなければNone
+    """
+    # TODO: どういう経緯で条件分岐が必要だったのか確認する
+    if _PEP_URL_WITH_FRAGMENT_PATTERN.match(url):
+        return [x[len('pep-'):] for x in url.split('/') if x][-2]  # TODO: prefixの除去方法
+    elif _PEP_URL_PATTERN.match(url):
+        return [x[len('pep-'):] for x in url.split('/') if x][-1]  # TODO: prefixの除去方法
+
+
+def extract_linked_pep_ids_from_soup(soup: BeautifulSoup) -> list:
+    a_tags = soup.find_all("a", href=PEP_LINK_PATTERN)
+    return [extract_pep_id(a_tag.get("href")) for a_tag in a_tags]
+
+
+def extract_linked_pep_ids_bs4(html: bytes) -> list:
+    """
+    BeautifulSoupで木構造を作ってから、PEPへのリンクを抽出する（従来の方法）
+    :param html: 抽出元のPEPのHTML
+    :return: リンクされているPEPのリスト（重複あり）
+    """
+    soup = BeautifulSoup(html, "lxml")
+    return extract_linked_pep_ids_from_soup(soup)
+
+
+def extract_linked_pep_ids_lxml(html: bytes) -> list:
+    """
+    木構造を作らずに、lxmlのiterparseで<a>タグだけを順に取り出してPEPへのリンクを抽出する
+    :param html: 抽出元のPEPのHTML
+    :return: リンクされているPEPのリスト（重複あり）
+    """
+    if not html.strip():
+        return []
+
+    pep_ids = []
+    for _, element in etree.iterparse(io.BytesIO(html), events=('end',),
+                                      tag='a', html=True, recover=True):
+        href = element.get('href')
+        if href and PEP_LINK_PATTERN.search(href):
+            pep_ids.append(extract_pep_id(href))
+        element.clear()
+    return pep_ids
+
+
+def extract_linked_pep_ids_regex(html: bytes) -> list:
+    """
+    パースせずに、バイト列から正規表現で<a>タグのhrefを走査してPEPへのリンクを抽出する
+    コメント内のタグの除外や文字参照の展開は行うが、壊れたHTMLの扱いなどはパーサと異なるので、
+    check_parityで結果が一致することを確認したコーパスに対して使用すること
+    :param html: 抽出元のPEPのHTML
+    :return: リンクされているPEPのリスト（重複あり）
+    """
+    html = _COMMENT_PATTERN.sub(b'', html)
+
+    pep_ids = []
+    for match in _ANCHOR_HREF_PATTERN.finditer(html):
+        href = match.group(1) or match.group(2) or match.group(3)
+        if not (href and PEP_LINK_BYTES_PATTERN.search(href)):
+            continue
+        href = unescape(href.decode('utf-8', errors='replace'))  # パーサと同様に文字参照を展開する
+        if PEP_LINK_PATTERN.search(href):
+            pep_ids.append(extract_pep_id(href))
+    return pep_ids
+
+
+LINK_EXTRACTORS = {
+    'bs4': extract_linked_pep_ids_bs4,
+    'lxml': extract_linked_pep_ids_lxml,
+    'regex': extract_linked_pep_ids_regex,
+}
+
+
+def get_link_extractor(name: str):
+    if name not in LINK_EXTRACTORS:
+        raise ValueError('Unknown link extractor: {} (choose from {})'.format(
+            name, ', '.join(sorted(LINK_EXTRACTORS))))
+    return LINK_EXTRACTORS[name]
+
+
+def check_parity(input_dir_path: str, extractor_names: list = None) -> dict:
+    """
+    ディレクトリ内のすべてのpep-NNNN.htmlについて、各抽出方法の結果がbs4と同じ多重集合になるか確認する
+    :param input_dir_path: pep-NNNN.htmlが保存されたディレクトリのパス
+    :param extractor_names: 確認する抽出方法の名前のリスト。省略時はbs4以外のすべて
+    :return: 抽出方法ごとの、結果が一致しなかったファイル名のリストの辞書
+    """
+    if not extractor_names:
+        extractor_names = [name for name in LINK_EXTRACTORS if name != 'bs4']
+
+    mismatch_dict = {name: [] for name in extractor_names}
+    for path in sorted(Path(input_dir_path).glob('pep-*.html')):
+        html = path.read_bytes()
+        expected = collections.Counter(extract_linked_pep_ids_bs4(html))
+        for name in extractor_names:
+            actual = collections.Counter(get_link_extractor(name)(html))
+            if actual != expected:
+                mismatch_dict[name].append(path.name)
+
+    return mismatch_dict
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PEPへのリンクの抽出方法ごとに、抽出結果がbs4と一致するか確認します。')
+    parser.add_argument('-s',
+                        '--source',
+                        type=str,
+                        required=True,
+                        help='pep-NNNN.htmlが保存されたフォルダのパス')
+    parser.add_argument('-e',
+                        '--extractors',
+                        type=str,
+                        nargs='*',
+                        help='確認する抽出方法の名前。デフォルトではbs4以外のすべて')
+    args = parser.parse_args()
+
+    result = check_parity(args.source, args.extractors)
+    for name, mismatched_files in result.items():
+        print('{}: {} mismatched {}'.format(name, len(mismatched_files), mismatched_files))
+    if any(result.values()):
+        raise SystemExit(1)
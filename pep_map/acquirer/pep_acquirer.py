@@ -1,24 +1,135 @@
 import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+import logging
 import os
 from pathlib import Path
-import re
 
 from bs4 import BeautifulSoup
 import pandas as pd
 import numpy as np
 
-from .acquirer import Acquirer
+from instrumentation import count, get_instrumentation, log_event, timer
+from .acquirer import Acquirer, is_fetch_error
+from .checkpoint_journal import CheckpointJournal
+from .date_parser import make_pep_created_date_parser
+from .link_extractor import extract_linked_pep_ids_bs4, extract_linked_pep_ids_from_soup, extract_pep_id
+from .link_extractor import get_link_extractor
+from .snapshot_baseline import SnapshotBaseline, calc_content_hash
+
+# リンク数を縦持ちで保存するときの列名と、保存形式
+EDGE_LIST_COLUMN_NAMES = ['link_source_pep_id', 'link_destination_pep_id', 'count']
+EDGE_LIST_FILE_FORMATS = ('csv', 'parquet', 'feather')
+
+logger = logging.getLogger(__name__)
+
+# プロセスプールの各ワーカーで使用するAcquirer（ワーカーの起動時に1回だけ受け取る）
+_worker_acquirer = None
+
+
+def _init_worker(acquirer) -> None:
+    global _worker_acquirer
+    _worker_acquirer = acquirer
+
+
+def _acquire_records_in_worker(pep_ids: list, input_local_dir_path: str) -> list:
+    """
+    プロセスプールのワーカーで、pep_idsのPEPをまとめて取得する
+    :return: (pep_id, レコード, HTMLのハッシュ値)のリストと、ワーカーで増えたカウンタ
+    """
+    instrumentation = get_instrumentation()
+    start_counters = instrumentation.counters
+    results = []
+    for pep_id in pep_ids:
+        record = _worker_acquirer._acquire_one_record(pep_id=pep_id,
+                                                      input_local_dir_path=input_local_dir_path)
+        results.append((pep_id, record, _worker_acquirer._content_hashes.get(pep_id)))
+    counters = {key: value - start_counters.get(key, 0)
+                for key, value in instrumentation.counters.items()}
+    return results, counters
+
+
+def read_edge_list(path: str) -> pd.DataFrame:
+    """
+    PepLinkDestinationAcquirer.to_edge_listで保存したファイルを読み込む。形式は拡張子で判定する
+    :param path: csv, parquet, featherのいずれかのファイルのパス
+    :return: link_source_pep_id, link_destination_pep_id, countを列に持つDataFrame
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        df = pd.read_parquet(path)
+    elif path.suffix == '.feather':
+        df = pd.read_feather(path)
+    else:
+        df = pd.read_csv(path, encoding='utf-8',
+                         dtype={'link_source_pep_id': str, 'link_destination_pep_id': str})
+    return df.astype({'count': 'int32'})
 
 
 class PepAcquirer(Acquirer):
     def __init__(self,
                  should_save_raw_data: bool= False,
                  raw_data_out_root_path: str = 'html',
-                 make_fetch_datetime_dir: bool = True) -> None:
+                 make_fetch_datetime_dir: bool = True,
+                 link_extractor: str = 'bs4',
+                 checkpoint_path: str = None,
+                 **kwargs) -> None:
+        """
+        :param link_extractor: PEPへのリンクの抽出方法（bs4, lxml, regex）。link_extractor.LINK_EXTRACTORSを参照
+        :param checkpoint_path: 取得済みのレコードを記録するジャーナルのパス。省略時は記録しない
+        """
         super().__init__(should_save_raw_data,
                          raw_data_out_root_path,
-                         make_fetch_datetime_dir)
+                         make_fetch_datetime_dir,
+                         **kwargs)
+        self._link_extractor = get_link_extractor(link_extractor)
+        self._created_date_parser = make_pep_created_date_parser()
+        self._created_dt_failures = {}
+        self._baseline = None
+        self._content_hashes = {}
+        self._changeset = None
+        self._checkpoint_journal = CheckpointJournal(checkpoint_path) if checkpoint_path else None
+        self._failures = {}
+        self._requested_pep_ids = None
+        self._resumed_pep_ids = []
+        self._requested_pep_count = 0
+        self._acquired_pep_count = 0
+        self._run_summary = None
+
+    def __getstate__(self) -> dict:
+        # ジャーナルは開いているファイルを持つので、プロセスプールには渡さない
+        state = super().__getstate__()
+        state['_checkpoint_journal'] = None
+        return state
+
+    @property
+    def created_dt_failures(self) -> dict:
+        """
+        Createdフィールドを日付型に変換できなかったPEPの番号と、Createdフィールドの文字列
+        """
+        return self._created_dt_failures
+
+    @property
+    def changeset(self) -> dict:
+        """
+        差分取得時に、前回のスナップショットから追加・削除・変更されたPEPの番号
+        取得に失敗したPEPは削除ではなくfailedに分類し、前回のレコードを使う
+        """
+        return self._changeset
+
+    @property
+    def failures(self) -> dict:
+        """
+        再試行しても取得できなかったPEPの番号と、エラーの内容
+        """
+        return self._failures
+
+    @property
+    def run_summary(self) -> dict:
+        """
+        直前の取得の結果（取得対象の件数、取得できた件数、ジャーナルから再開した件数、失敗したPEP）
+        """
+        return self._run_summary
 
     def _save_raw_data(self, html, pep_id: str, out_dir_path: str) -> None:
         file_name = 'pep-{}.html'.format(pep_id)
@@ -31,13 +142,7 @@ class PepAcquirer(Acquirer):
         :param url: 抽出元のURL
         :return: PEPの番号 ()
         """
-        # TODO: どういう経緯で条件分岐が必要だったのか確認する
-        if re.match('.+/pep-[0-9]{4}/#.+', url):
-            return [x[len('pep-'):] for x in url.split('/') if x][
-                -2]  # TODO: prefixの除去方法
-        elif re.match('.+/pep-[0-9]{4}/{0,1}', url):
-            return [x[len('pep-'):] for x in url.split('/') if x][
-                -1]  # TODO: prefixの除去方法
+        return extract_pep_id(url)
 
     def _acquire_pep_html(self, pep_id: str,
                           input_local_dir_path=None) -> bytes:
@@ -47,8 +152,7 @@ class PepAcquirer(Acquirer):
             path = Path(input_local_dir_path) / 'pep-{}.html'.format(pep_id)
             path = str(path)
         else:  # Webから取得
-            base_url = 'https://www.python.org/dev/peps/pep-{}'
-            path = base_url.format(pep_id)
+            path = '{}/dev/peps/pep-{}'.format(self._base_url, pep_id)
 
         html = self._acquire_html(path)
 
@@ -72,13 +176,7 @@ class PepAcquirer(Acquirer):
         :param html: リンク抽出元のPEPのHTML
         :return: リンクされているPEPのリスト（重複あり）
         """
-        soup = BeautifulSoup(html, "lxml")
-        a_tags = soup.find_all("a", href=re.compile("/dev/peps/pep-[0-9]{4}"))
-        link_destination_pep_ids = []
-        for a_tag in a_tags:
-            pep_url = a_tag.get("href")
-            pep_id = self._extract_pep_id(pep_url)
-            link_destination_pep_ids.append(pep_id)
+        link_destination_pep_ids = self._link_extractor(html)
 
         if not allow_duplication:
             # 重複の排除
@@ -87,7 +185,143 @@ class PepAcquirer(Acquirer):
 
         return link_destination_pep_ids
 
-    def acquire(self, input_local_dir_path: str = None, pep_ids: list = None):
+    def _find_linked_pep_ids(self, soup: BeautifulSoup,
+                             allow_duplication: bool = False) -> list:
+        """
+        パース済みのHTMLから、リンクされているPEPを取得する
+        :param soup: リンク抽出元のPEPのHTMLをパースしたもの
+        :return: リンクされているPEPのリスト
+        """
+        link_destination_pep_ids = extract_linked_pep_ids_from_soup(soup)
+
+        if not allow_duplication:
+            # 重複の排除
+            link_destination_pep_ids = set(link_destination_pep_ids)
+            link_destination_pep_ids = list(link_destination_pep_ids)
+
+        return link_destination_pep_ids
+
+    def _scrape_header(self, soup: BeautifulSoup) -> dict:
+        """
+        パース済みのPEPの個別ページから、基本情報（Title, Createdなど）を抽出する
+        :param soup: 抽出元となるHTMLをパースしたもの
+        :return: 抽出した基本情報の辞書
+        """
+        table_tag = soup.select("table.rfc2822")
+        if not table_tag:
+            return {}
+        tr_tags = table_tag[0].find_all('tr')
+        header_dict = {}
+        for tr_tag in tr_tags:
+            field_name = tr_tag.find('th').text.replace(':', '')
+            field_body = tr_tag.find('td').text.replace(':', '')
+            header_dict[field_name] = field_body
+
+        return header_dict
+
+    def _scrape_link_counter(self, soup: BeautifulSoup, html: bytes = None) -> dict:
+        """
+        パース済みのPEPの個別ページから、リンク先のPEPごとのリンク数を取得する
+        bs4以外の抽出方法（link_extractor）を選んだ場合は、soupを走査せずにhtmlから抽出する
+        :param soup: 抽出元となるHTMLをパースしたもの
+        :param html: soupのパース前のHTML
+        :return: PEPごとのリンク数の辞書
+        """
+        if html is not None and self._link_extractor is not extract_linked_pep_ids_bs4:
+            link_destination_pep_ids = self._scrape_linked_pep_list(html, allow_duplication=True)
+        else:
+            link_destination_pep_ids = self._find_linked_pep_ids(soup, allow_duplication=True)
+        count_dict = collections.Counter(link_destination_pep_ids)
+        return dict(count_dict)
+
+    def acquire(self, input_local_dir_path: str = None, pep_ids: list = None,
+                baseline_raw_dir_path: str = None,
+                baseline_csv_path: str = None,
+                workers: int = None,
+                resume: bool = False):
+        """
+        PEPの情報を取得する
+        baseline_raw_dir_pathを指定すると、前回のスナップショットからHTMLが変わったPEPだけをスクレイピングし、
+        変わっていないPEPは前回のCSVのレコードを再利用する
+        :param input_local_dir_path: ローカルのHTMLファイルから取得する場合のディレクトリのパス
+        :param pep_ids: 取得するPEPの番号のリスト。省略時はPEP 0にリンクされているすべてのPEP
+        :param baseline_raw_dir_path: 前回のHTMLファイルを保存したディレクトリ(raw/<YYYYmmdd-HHMMSS>)のパス
+        :param baseline_csv_path: 前回のCSVのパス。省略時はbaseline_raw_dir_pathの2つ上のディレクトリから探す
+        :param workers: ローカルのHTMLファイルから取得する場合に、パースに使用するプロセス数
+        :param resume: Trueの場合は、チェックポイントのジャーナルに記録済みのPEPを取得せずに途中から再開する
+        :return: PEPごとの辞書。取得に失敗したPEPは、差分取得時は前回のレコードを使い、それ以外は含まない（failuresを参照）
+        """
+        self._start_acquisition(input_local_dir_path=input_local_dir_path,
+                                pep_ids=pep_ids,
+                                baseline_raw_dir_path=baseline_raw_dir_path,
+                                baseline_csv_path=baseline_csv_path,
+                                resume=resume)
+
+        data = self._acquire(input_local_dir_path=input_local_dir_path,
+                             pep_ids=pep_ids,
+                             workers=workers)
+        data = self._postprocess(data)
+        self._data = data
+
+        self._finish_acquisition()
+
+        return data
+
+    def iter_acquire(self, input_local_dir_path: str = None, pep_ids: list = None,
+                     baseline_raw_dir_path: str = None,
+                     baseline_csv_path: str = None,
+                     workers: int = None,
+                     resume: bool = False):
+        """
+        PEPの情報を1件取得するごとに(pep_id, レコード)を返すジェネレータ
+        引数はacquireと同じ。並行取得時は完了した順に返す
+        すべてのレコードをメモリに保持しないので、dataとto_dataframe()は使用できない
+        """
+        self._start_acquisition(input_local_dir_path=input_local_dir_path,
+                                pep_ids=pep_ids,
+                                baseline_raw_dir_path=baseline_raw_dir_path,
+                                baseline_csv_path=baseline_csv_path,
+                                resume=resume)
+        self._data = None
+
+        for pep_id, record in self._iter_acquire(input_local_dir_path=input_local_dir_path,
+                                                 pep_ids=pep_ids,
+                                                 workers=workers):
+            yield pep_id, self._postprocess_record(pep_id, record)
+
+        self._finish_acquisition()
+
+    def _start_acquisition(self, input_local_dir_path: str = None,
+                           pep_ids: list = None,
+                           baseline_raw_dir_path: str = None,
+                           baseline_csv_path: str = None,
+                           resume: bool = False) -> None:
+        # PEPを指定した場合は、指定しなかったPEPを差分取得で削除されたとみなさない
+        self._requested_pep_ids = list(pep_ids) if pep_ids else None
+        self._baseline = None
+        self._content_hashes = {}
+        self._changeset = None
+        self._created_dt_failures = {}
+        self._failures = {}
+        self._resumed_pep_ids = []
+        self._requested_pep_count = 0
+        self._acquired_pep_count = 0
+        self._run_summary = None
+        if baseline_raw_dir_path:
+            self._baseline = self._load_baseline(baseline_raw_dir_path, baseline_csv_path)
+
+        journal = self._checkpoint_journal
+        if resume and journal and journal.exists():
+            # 中断した実行と同じ取得日時・保存先で再開する
+            journal.load()
+            self._fetch_start_datetime = journal.fetch_start_datetime
+            self._raw_data_out_dir_path = journal.raw_data_out_dir_path
+            self._content_hashes.update(journal.content_hashes)
+            journal.open(self._fetch_start_datetime, self._raw_data_out_dir_path, resume=True)
+            log_event(logger, 'resume',
+                      message='Resumed from checkpoint: {} ({} records)'.format(journal.path, len(journal.records)),
+                      checkpoint_path=str(journal.path), records=len(journal.records))
+            return
 
         if input_local_dir_path:
             self._fetch_start_datetime = self._get_fetch_date_from_local_path(
@@ -102,82 +336,271 @@ class PepAcquirer(Acquirer):
         else:
             self._raw_data_out_dir_path = self._raw_data_out_root_path
 
-        data = self._acquire(input_local_dir_path=input_local_dir_path,
-                             pep_ids=pep_ids)
-        self._data = data
-
-        return data
+        if journal:
+            journal.open(self._fetch_start_datetime, self._raw_data_out_dir_path)
+
+    def _finish_acquisition(self) -> None:
+        self._run_summary = dict(requested=self._requested_pep_count,
+                                 acquired=self._acquired_pep_count,
+                                 resumed=len(self._resumed_pep_ids),
+                                 failed=dict(self._failures))
+        log_event(logger, 'run_summary',
+                  message='Run summary: requested={requested}, acquired={acquired}, '
+                          'resumed={resumed}, failed={failed_count}'.format(failed_count=len(self._failures),
+                                                                            **self._run_summary),
+                  requested=self._requested_pep_count, acquired=self._acquired_pep_count,
+                  resumed=len(self._resumed_pep_ids), failed=len(self._failures))
+        for pep_id, error in self._failures.items():
+            log_event(logger, 'acquire_failure', level=logging.WARNING,
+                      message='Failed to acquire: {} ({})'.format(pep_id, error), pep_id=pep_id, error=error)
+
+        if self._baseline:
+            self._changeset = self._baseline.make_changeset(self._content_hashes,
+                                                            failed_pep_ids=list(self._failures),
+                                                            requested_pep_ids=self._requested_pep_ids)
+            changeset_sizes = {key: len(value) for key, value in self._changeset.items()}
+            log_event(logger, 'changeset', message='Changeset: {}'.format(changeset_sizes), **changeset_sizes)
+
+    def _load_baseline(self, baseline_raw_dir_path: str,
+                       baseline_csv_path: str = None) -> SnapshotBaseline:
+        if not baseline_csv_path:
+            # out_root/raw/<YYYYmmdd-HHMMSS>/ に対して out_root/<csv_out_file_name_base>_<YYYYmmdd-HHMMSS>.csv
+            raw_dir_path = Path(baseline_raw_dir_path)
+            file_name = '{}_{}.csv'.format(self._csv_out_file_name_base, raw_dir_path.name)
+            baseline_csv_path = raw_dir_path.parent.parent / file_name
+
+        df = pd.read_csv(baseline_csv_path, encoding='utf-8', index_col=0,
+                         dtype=str, keep_default_na=False, na_values=[''])
+        records = self._from_dataframe(df)
+        return SnapshotBaseline(baseline_raw_dir_path, records, self._raw_data_store)
+
+    def _from_dataframe(self, df: pd.DataFrame) -> dict:
+        """
+        to_csvで保存したCSVのDataFrameから、_scrapeが返すのと同じ形式のPEPごとの辞書に戻す
+        """
+        raise NotImplementedError
 
     def _acquire(self, input_local_dir_path: str = None,
-                 pep_ids: list=None) -> dict:
+                 pep_ids: list=None,
+                 workers: int = None) -> dict:
 
         # pep_idsはstr型のlist(0000,0001などの文字列)
         if not pep_ids:
             pep_ids = self._acquire_all_pep_ids(input_local_dir_path=input_local_dir_path)
 
-        peps_dict = {}
+        acquired_dict = dict(self._iter_acquire(input_local_dir_path=input_local_dir_path,
+                                                pep_ids=pep_ids,
+                                                workers=workers))
+
+        # 完了順ではなく、pep_idsの順に並べ直す（取得に失敗して前回のレコードもないPEPは含めない）
+        peps_dict = {pep_id: acquired_dict[pep_id] for pep_id in pep_ids
+                     if pep_id in acquired_dict}
+        return peps_dict
+
+    def _iter_acquire(self, input_local_dir_path: str = None,
+                      pep_ids: list = None,
+                      workers: int = None):
+        # pep_idsはstr型のlist(0000,0001などの文字列)
+        if not pep_ids:
+            pep_ids = self._acquire_all_pep_ids(input_local_dir_path=input_local_dir_path)
+        self._requested_pep_count = len(pep_ids)
+
+        journal = self._checkpoint_journal
+        if journal:
+            # ジャーナルに記録済みのPEPは取得し直さない
+            journaled_records = journal.records
+            self._resumed_pep_ids = [pep_id for pep_id in pep_ids if pep_id in journaled_records]
+            pep_ids = [pep_id for pep_id in pep_ids if pep_id not in journaled_records]
+            for pep_id in self._resumed_pep_ids:
+                self._acquired_pep_count += 1
+                yield pep_id, journaled_records[pep_id]
+
+        try:
+            for pep_id, record in self._iter_acquire_records(input_local_dir_path=input_local_dir_path,
+                                                             pep_ids=pep_ids,
+                                                             workers=workers):
+                if record is None:  # 取得に失敗したPEPはfailuresに記録済み
+                    if self._baseline and pep_id in self._baseline.records:
+                        # 一時的な障害でPEPが消えないように、前回のレコードを使う（ジャーナルには記録しない）
+                        log_event(logger, 'baseline_fallback', level=logging.WARNING,
+                                  message='Use the baseline record for failed PEP: {}'.format(pep_id),
+                                  pep_id=pep_id)
+                        yield pep_id, self._baseline.records[pep_id]
+                    continue
+                if journal:
+                    journal.append(pep_id, record, self._content_hashes.get(pep_id))
+                self._acquired_pep_count += 1
+                yield pep_id, record
+        finally:
+            if journal:
+                journal.close()
+
+    def _iter_acquire_records(self, pep_ids: list,
+                              input_local_dir_path: str = None,
+                              workers: int = None):
+        if input_local_dir_path and workers and workers > 1:
+            yield from self._iter_acquire_in_processes(pep_ids=pep_ids,
+                                                       input_local_dir_path=input_local_dir_path,
+                                                       workers=workers)
+            return
+
+        if self._max_workers > 1:
+            yield from self._iter_acquire_concurrently(pep_ids=pep_ids,
+                                                       input_local_dir_path=input_local_dir_path)
+            return
 
         for i, pep_id in enumerate(pep_ids):
             pep_dict = self._acquire_one_record(pep_id=pep_id,
                                                 input_local_dir_path=input_local_dir_path)
-            peps_dict[pep_id] = pep_dict
-            print('[{}/{}] Completed to acquire: {}'.format(i+1, len(pep_ids), pep_id))  # TODO: logging
+            logger.info('[{}/{}] Completed to acquire: {}'.format(i+1, len(pep_ids), pep_id))
+            yield pep_id, pep_dict
 
-        return peps_dict
+    def _iter_acquire_concurrently(self, pep_ids: list,
+                                   input_local_dir_path: str = None):
+        """
+        複数のスレッドでPEPを並行して取得し、完了した順に(pep_id, レコード)を返す
+        Webから取得する場合のリクエスト間隔はHostRateLimiterで制御する
+        :param pep_ids: 取得するPEPの番号のリスト
+        :param input_local_dir_path: ローカルのHTMLファイルから取得する場合のディレクトリのパス
+        """
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            future_to_pep_id = {executor.submit(self._acquire_one_record,
+                                                pep_id=pep_id,
+                                                input_local_dir_path=input_local_dir_path): pep_id
+                                for pep_id in pep_ids}
+            for i, future in enumerate(as_completed(future_to_pep_id)):
+                pep_id = future_to_pep_id[future]
+                pep_dict = future.result()
+                logger.info('[{}/{}] Completed to acquire: {}'.format(i+1, len(pep_ids), pep_id))
+                yield pep_id, pep_dict
+
+    def _iter_acquire_in_processes(self, pep_ids: list,
+                                   input_local_dir_path: str,
+                                   workers: int,
+                                   chunk_size: int = None):
+        """
+        ローカルのHTMLファイルの読み込みとパースを複数のプロセスに分けて行い、pep_idsの順に(pep_id, レコード)を返す
+        :param pep_ids: 取得するPEPの番号のリスト
+        :param input_local_dir_path: HTMLファイルが保存されたディレクトリのパス
+        :param workers: 使用するプロセス数
+        :param chunk_size: 1回にワーカーへ渡すPEPの数。省略時はプロセスあたり4回に分ける
+        """
+        if not chunk_size:
+            chunk_size = max(1, -(-len(pep_ids) // (workers * 4)))
+        chunks = [pep_ids[i:i + chunk_size] for i in range(0, len(pep_ids), chunk_size)]
+
+        completed_count = 0
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(self,)) as executor:
+            # mapはchunksの順に結果を返すので、pep_idsの順序が保たれる
+            results = executor.map(_acquire_records_in_worker,
+                                   chunks,
+                                   [input_local_dir_path] * len(chunks))
+            for chunk_results, counters in results:
+                # ワーカーのカウンタは別のプロセスにあるので、結果と一緒に受け取って加算する
+                get_instrumentation().merge_counters(counters)
+                for pep_id, record, content_hash in chunk_results:
+                    if content_hash:
+                        self._content_hashes[pep_id] = content_hash
+                    yield pep_id, record
+                completed_count += len(chunk_results)
+                logger.info('[{}/{}] Completed to acquire: {}'.format(completed_count, len(pep_ids),
+                                                                      chunk_results[-1][0]))
 
     def _acquire_one_record(self, pep_id: str,
                             input_local_dir_path: str = None):
-        html = self._acquire_pep_html(pep_id=pep_id,
-                                      input_local_dir_path=input_local_dir_path)
-        pep_dict = self._scrape(html)
+        try:
+            html = self._acquire_pep_html(pep_id=pep_id,
+                                          input_local_dir_path=input_local_dir_path)
+        except Exception as e:
+            # 再試行しても取得できなかったPEPは、実行全体を止めずに記録してNoneを返す
+            if not is_fetch_error(e):
+                raise
+            count('fetch_failures')
+            self._failures[pep_id] = repr(e)
+            return None
+
+        if self._baseline:
+            # 前回からHTMLが変わっていなければ、スクレイピングせずに前回のレコードを使う
+            content_hash = calc_content_hash(html)
+            self._content_hashes[pep_id] = content_hash
+            if self._baseline.is_unchanged(pep_id, content_hash):
+                count('baseline_cache_hits')
+                return self._baseline.records[pep_id]
+
+        try:
+            with timer('parse'):
+                pep_dict = self._scrape(html)
+        except Exception:
+            count('parse_failures')
+            raise
+        count('pages_parsed')
+        log_event(logger, 'parse', level=logging.DEBUG,
+                  message='Completed to parse: {}'.format(pep_id), pep_id=pep_id)
         return pep_dict
 
     def _scrape(self, html: str) -> dict:
         raise NotImplementedError
 
-    def _str2datetime(self, source_str: str) -> datetime:
+    def _postprocess(self, peps_dict: dict) -> dict:
         """
-        文字列を日付型に変換する
-        :param source_str: 変換前の文字列
-        :return: 変換後の日付型。変換に失敗したら文字列'Failed to convert'を返す
+        すべてのレコードを取得した後に、まとめて行う処理
         """
+        return peps_dict
 
-        if (source_str != source_str) or not source_str:  # nullチェック
-            # return source_str
-            return pd.NaT
+    def _postprocess_record(self, pep_id: str, record: dict) -> dict:
+        """
+        iter_acquireで1件ずつ返すときに、_postprocessの代わりに行う処理
+        """
+        return record
 
-        converted = ''
-        # 想定する日付書式のリスト
-        format_list = ['%d-%b-%Y', '%d-%B-%Y', '%Y-%m-%d', '%d %b %Y',
-                       '%d %B %Y']
-        for format_text in format_list:
-            try:
-                converted = datetime.strptime(source_str, format_text)
-            except:  # TODO: ちゃんと指定する
-                continue
+    def _parse_created_date(self, pep_id: str, header_dict: dict) -> None:
+        """
+        1件の基本情報のCreatedフィールドを日付型に変換し、Created_dtとして追加する
+        変換結果はDateParserにキャッシュされるので、同じ文字列は1回しか変換しない
+        """
+        if not header_dict:
+            return
+        created_dt, failed = self._created_date_parser.parse(header_dict.get('Created'))
+        header_dict['Created_dt'] = created_dt
+        if failed:
+            count('created_date_failures')
+            self._created_dt_failures[pep_id] = header_dict.get('Created')
+
+    def _parse_created_dates(self, header_records: dict) -> None:
+        """
+        基本情報のCreatedフィールドをまとめて日付型に変換し、Created_dtとして各レコードに追加する
+        Createdフィールドは日付形式が揃っていないので、異なる文字列ごとに1回だけ書式を判定して変換する
+        変換に失敗したPEPはCreated_dtをNaTにして、created_dt_failuresに記録する
+        :param header_records: PEPごとの基本情報の辞書
+        """
+        pep_ids = [pep_id for pep_id, header_dict in header_records.items() if header_dict]
+        created_series = pd.Series([header_records[pep_id].get('Created') for pep_id in pep_ids],
+                                   index=pep_ids, dtype=object)
+        created_dt_series, failed_series = self._created_date_parser.parse_series(created_series)
 
-        if not converted:
-            # 個別対応
-            # 日付情報の後にコメントが入っている形式があるので、
-            # コメント部分をトリミングしてから日付型に変換する
-            pattern = '^[0-9]{1,2}-[a-z,A-Z]{3}-[0-9]{4}.+$'
-            if re.match(pattern, source_str):
-                source_str = source_str[:len('YYYY-mm-dd') + 1]
-                converted = datetime.strptime(source_str, '%d-%b-%Y')
-            else:
-                converted = 'Failed to convert'
+        for pep_id, created_dt in created_dt_series.items():
+            header_records[pep_id]['Created_dt'] = created_dt
 
-        return converted
+        self._created_dt_failures = dict(created_series[failed_series])
+        if self._created_dt_failures:
+            count('created_date_failures', len(self._created_dt_failures))
+            log_event(logger, 'created_date_failure', level=logging.WARNING,
+                      message='Failed to convert Created: {}'.format(self._created_dt_failures),
+                      failures=self._created_dt_failures)
 
 
 class PepHeaderAcquirer(PepAcquirer):
     def __init__(self,
                  should_save_raw_data: bool = False,
                  raw_data_out_root_path: str = 'html',
-                 make_fetch_datetime_dir: bool = True) -> None:
+                 make_fetch_datetime_dir: bool = True,
+                 **kwargs) -> None:
         super().__init__(should_save_raw_data,
                          raw_data_out_root_path,
-                         make_fetch_datetime_dir)
+                         make_fetch_datetime_dir,
+                         **kwargs)
         self._csv_out_file_name_base = 'pep_header'
 
     def _to_dataframe(self, source_dict: dict) -> pd.DataFrame:
@@ -188,6 +611,23 @@ class PepHeaderAcquirer(PepAcquirer):
         df = df.set_index('pep_id')
         return df
 
+    def _postprocess(self, peps_dict: dict) -> dict:
+        self._parse_created_dates(peps_dict)
+        return peps_dict
+
+    def _postprocess_record(self, pep_id: str, record: dict) -> dict:
+        self._parse_created_date(pep_id, record)
+        return record
+
+    def _from_dataframe(self, df: pd.DataFrame) -> dict:
+        peps_dict = {}
+        for pep_id, series in df.iterrows():
+            # Created_dtは_postprocessで変換し直す
+            header_dict = {key: value for key, value in series.items()
+                           if key != 'Created_dt' and value == value}
+            peps_dict[pep_id] = header_dict
+        return peps_dict
+
     def _scrape(self, html: str) -> dict:
         """
         PEPの個別ページのHTML文字列から、基本情報（Title, Createdなど）を抽出する
@@ -196,30 +636,19 @@ class PepHeaderAcquirer(PepAcquirer):
         """
 
         soup = BeautifulSoup(html, "lxml")
-        table_tag = soup.select("table.rfc2822")
-        if not table_tag:
-            return {}
-        tr_tags = table_tag[0].find_all('tr')
-        header_dict = {}
-        for tr_tag in tr_tags:
-            field_name = tr_tag.find('th').text.replace(':', '')
-            field_body = tr_tag.find('td').text.replace(':', '')
-            header_dict[field_name] = field_body
-
-        # Cratedフィールドは日付形式が揃っていないので揃える
-        header_dict['Created_dt'] = self._str2datetime(header_dict['Created'])
-
-        return header_dict
+        return self._scrape_header(soup)
 
 
 class PepLinkDestinationAcquirer(PepAcquirer):
     def __init__(self,
                  should_save_raw_data: bool = False,
                  raw_data_out_root_path: str = 'html',
-                 make_fetch_datetime_dir: bool = True) -> None:
+                 make_fetch_datetime_dir: bool = True,
+                 **kwargs) -> None:
         super().__init__(should_save_raw_data,
                          raw_data_out_root_path,
-                         make_fetch_datetime_dir)
+                         make_fetch_datetime_dir,
+                         **kwargs)
         self._csv_out_file_name_base = 'pep_link_destination'
 
     def _to_dataframe(self, source_dict: dict) -> pd.DataFrame:
@@ -228,11 +657,96 @@ class PepLinkDestinationAcquirer(PepAcquirer):
         df['link_source_pep_id'] = df['index']
         del df['index']
         df = df.set_index('link_source_pep_id')
-        df = df.fillna(0)
-        for column in df.columns:
-            df[column] = df[column].astype(int)
+        df = df.fillna(0).astype(int)
         return df
 
+    def to_edge_list_dataframe(self) -> pd.DataFrame:
+        """
+        リンク数を、リンクごとに(リンク元, リンク先, リンク数)の1行を持つ縦持ちのDataFrameに変換する
+        行数はリンクの数なので、PEPの数の2乗の大きさになる隣接行列の形式より小さい
+        :return: link_source_pep_id, link_destination_pep_id, countを列に持つDataFrame
+        """
+        # TODO: self.dataがNoneのときは、先にacquireを使用するよう例外を投げる
+        edges = [(source_pep_id, destination_pep_id, count)
+                 for source_pep_id, count_dict in self.data.items()
+                 for destination_pep_id, count in sorted(count_dict.items())
+                 if count]
+        df = pd.DataFrame(edges, columns=EDGE_LIST_COLUMN_NAMES)
+        df = df.astype({'link_source_pep_id': str,
+                        'link_destination_pep_id': str,
+                        'count': 'int32'})
+        return df
+
+    def to_edge_list(self, out_root_path: str = '.', file_format: str = 'csv') -> Path:
+        """
+        リンク数を縦持ちの形式で保存する。ファイル名は pep_link_edges_<YYYYmmdd-HHMMSS>.<拡張子>
+        parquet, featherで保存する場合はpyarrowが必要
+        :param out_root_path: 保存先のフォルダのパス
+        :param file_format: 保存形式（csv, parquet, feather）
+        :return: 保存したファイルのパス
+        """
+        if file_format not in EDGE_LIST_FILE_FORMATS:
+            raise ValueError('Unknown edge list format: {} (choose from {})'.format(
+                file_format, ', '.join(EDGE_LIST_FILE_FORMATS)))
+
+        file_name = 'pep_link_edges_{}.{}'.format(self.fetch_start_datetime_str, file_format)
+        path = Path(out_root_path) / file_name
+        os.makedirs(path.parent, exist_ok=True)
+
+        df = self.to_edge_list_dataframe()
+        if file_format == 'csv':
+            df.to_csv(path, encoding='utf-8', index=False)
+        elif file_format == 'parquet':
+            df.to_parquet(path, index=False)
+        else:
+            df.to_feather(path)
+        logger.info('Completed to save edge list file: {}'.format(path))
+        return path
+
+    def _from_dataframe(self, df: pd.DataFrame) -> dict:
+        df = df.astype(int)
+        peps_dict = {}
+        for pep_id, series in df.iterrows():
+            peps_dict[pep_id] = {key: int(value) for key, value in series.items() if value}
+        return peps_dict
+
+    def _load_baseline(self, baseline_raw_dir_path: str,
+                       baseline_csv_path: str = None) -> SnapshotBaseline:
+        # 前回のリンク数を縦持ちの形式で保存している場合は、そちらから復元する
+        if not baseline_csv_path:
+            edge_list_path = self._find_edge_list(baseline_raw_dir_path)
+            if edge_list_path:
+                records = self._from_edge_list_dataframe(read_edge_list(edge_list_path),
+                                                         self._find_source_pep_ids(baseline_raw_dir_path))
+                return SnapshotBaseline(baseline_raw_dir_path, records, self._raw_data_store)
+        return super()._load_baseline(baseline_raw_dir_path, baseline_csv_path)
+
+    def _find_edge_list(self, baseline_raw_dir_path: str) -> Path:
+        # out_root/raw/<YYYYmmdd-HHMMSS>/ に対して out_root/pep_link_edges_<YYYYmmdd-HHMMSS>.<拡張子>
+        raw_dir_path = Path(baseline_raw_dir_path)
+        for file_format in EDGE_LIST_FILE_FORMATS:
+            path = raw_dir_path.parent.parent / 'pep_link_edges_{}.{}'.format(raw_dir_path.name, file_format)
+            if path.exists():
+                return path
+        return None
+
+    def _find_source_pep_ids(self, baseline_raw_dir_path: str) -> list:
+        # 縦持ちの形式にはリンクを1つも持たないPEPが含まれないので、同じスナップショットの基本情報のCSVからPEPの一覧を得る
+        # out_root/raw/<YYYYmmdd-HHMMSS>/ に対して out_root/pep_header_<YYYYmmdd-HHMMSS>.csv
+        raw_dir_path = Path(baseline_raw_dir_path)
+        path = raw_dir_path.parent.parent / 'pep_header_{}.csv'.format(raw_dir_path.name)
+        if not path.exists():
+            logger.warning('Header CSV not found: {} (PEPs without links are treated as added)'.format(path))
+            return []
+        df = pd.read_csv(path, encoding='utf-8', index_col=0, usecols=[0], dtype=str)
+        return list(df.index)
+
+    def _from_edge_list_dataframe(self, df: pd.DataFrame, source_pep_ids: list = ()) -> dict:
+        peps_dict = {pep_id: {} for pep_id in source_pep_ids}
+        for source_pep_id, destination_pep_id, count in df[EDGE_LIST_COLUMN_NAMES].itertuples(index=False):
+            peps_dict.setdefault(source_pep_id, {})[destination_pep_id] = int(count)
+        return peps_dict
+
     def _scrape(self, html: bytes) -> dict:
         """
         PEP一覧のHTMLデータから、リンク数を取得する
@@ -242,3 +756,93 @@ class PepLinkDestinationAcquirer(PepAcquirer):
         link_destination_pep_ids = self._scrape_linked_pep_list(html, allow_duplication=True)
         count_dict = collections.Counter(link_destination_pep_ids)
         return dict(count_dict)
+
+
+class PepHeaderAndLinkAcquirer(PepAcquirer):
+    """
+    PEPの個別ページを1回だけパースして、基本情報とリンク先のPEPのリンク数を同時に取得する
+    結果はPepHeaderAcquirer, PepLinkDestinationAcquirerと同じ形式で
+    header_acquirer, link_acquirerから取り出せる
+    """
+    def __init__(self,
+                 should_save_raw_data: bool = False,
+                 raw_data_out_root_path: str = 'html',
+                 make_fetch_datetime_dir: bool = True,
+                 **kwargs) -> None:
+        super().__init__(should_save_raw_data,
+                         raw_data_out_root_path,
+                         make_fetch_datetime_dir,
+                         **kwargs)
+        self._header_acquirer = PepHeaderAcquirer()
+        self._link_acquirer = PepLinkDestinationAcquirer()
+
+    @property
+    def header_acquirer(self) -> PepHeaderAcquirer:
+        return self._header_acquirer
+
+    @property
+    def link_acquirer(self) -> PepLinkDestinationAcquirer:
+        return self._link_acquirer
+
+    def acquire(self, input_local_dir_path: str = None, pep_ids: list = None,
+                baseline_raw_dir_path: str = None,
+                baseline_csv_path: str = None,
+                workers: int = None,
+                resume: bool = False):
+        """
+        PEPの基本情報とリンク数を取得する
+        差分取得時のCSVは、PepHeaderAcquirerとPepLinkDestinationAcquirerのファイル名規則で探すので
+        baseline_csv_pathは使用しない
+        """
+        data = super().acquire(input_local_dir_path=input_local_dir_path,
+                               pep_ids=pep_ids,
+                               baseline_raw_dir_path=baseline_raw_dir_path,
+                               workers=workers,
+                               resume=resume)
+
+        # 取得結果を基本情報とリンク数に分けて、それぞれのAcquirerに持たせる
+        for acquirer, key in [(self._header_acquirer, 'header'),
+                              (self._link_acquirer, 'link')]:
+            acquirer._fetch_start_datetime = self._fetch_start_datetime
+            acquirer._raw_data_out_dir_path = self._raw_data_out_dir_path
+            acquirer._data = {pep_id: record[key] for pep_id, record in data.items()}
+
+        return data
+
+    def _postprocess(self, peps_dict: dict) -> dict:
+        self._parse_created_dates({pep_id: record['header'] for pep_id, record in peps_dict.items()})
+        return peps_dict
+
+    def _postprocess_record(self, pep_id: str, record: dict) -> dict:
+        self._parse_created_date(pep_id, record['header'])
+        return record
+
+    def _load_baseline(self, baseline_raw_dir_path: str,
+                       baseline_csv_path: str = None) -> SnapshotBaseline:
+        header_baseline = self._header_acquirer._load_baseline(baseline_raw_dir_path)
+        link_baseline = self._link_acquirer._load_baseline(baseline_raw_dir_path)
+        records = {pep_id: dict(header=header_record,
+                                link=link_baseline.records.get(pep_id, {}))
+                   for pep_id, header_record in header_baseline.records.items()}
+        return SnapshotBaseline(baseline_raw_dir_path, records, self._raw_data_store)
+
+    def _to_dataframe(self, source_dict: dict) -> pd.DataFrame:
+        raise NotImplementedError('Use header_acquirer.to_dataframe() or link_acquirer.to_dataframe().')
+
+    def to_csv(self, out_root_path: str = '.') -> None:
+        self._header_acquirer.to_csv(out_root_path)
+        self._link_acquirer.to_csv(out_root_path)
+
+    def _scrape(self, html: bytes) -> dict:
+        """
+        PEPの個別ページのHTMLを1回だけパースして、基本情報とリンク数を抽出する
+        :param html: 抽出元となるHTMLファイルの中身
+        :return: header(基本情報の辞書), link(PEPごとのリンク数の辞書)をキーとした辞書
+        """
+        soup = BeautifulSoup(html, "lxml")
+        header_dict = self._scrape_header(soup)
+        if not header_dict:
+            # 基本情報の表がないページは、レイアウトが変わった可能性がある
+            count('pages_without_header')
+        return dict(header=header_dict,
+                    link=self._scrape_link_counter(soup, html))
@@ -1,3 +1,4 @@
+import logging
 import os
 from pathlib import Path
 
@@ -6,22 +7,37 @@ from bs4.element import Tag
 import pandas as pd
 
 from .acquirer import Acquirer
+from .date_parser import make_release_date_parser
+
+logger = logging.getLogger(__name__)
 
 
 class PythonReleaseAcquirer(Acquirer):
     def __init__(self,
                  should_save_raw_data: bool = False,
                  raw_data_out_root_path: str = 'html',
-                 make_fetch_datetime_dir: bool = True) -> None:
+                 make_fetch_datetime_dir: bool = True,
+                 **kwargs) -> None:
         super().__init__(should_save_raw_data,
                          raw_data_out_root_path,
-                         make_fetch_datetime_dir)
+                         make_fetch_datetime_dir,
+                         **kwargs)
         self._sorted_csv_column_names = ['release_number', 'release_date',
+                                         'release_date_dt',
                                          'major', 'minor', 'micro',
                                          'release_download_url',
                                          'full_change_log_url']
         self._csv_out_file_name_base = 'python_release_info'
         self._raw_out_file_name_base = 'downloads'
+        self._release_date_parser = make_release_date_parser()
+        self._release_date_failures = {}
+
+    @property
+    def release_date_failures(self) -> dict:
+        """
+        リリース日を日付型に変換できなかったリリースと、リリース日の文字列
+        """
+        return self._release_date_failures
 
     def _save_raw_data(self, html,
                        out_dir_path: str) -> None:  # TODO: これをもっと抽象化できないか？
@@ -37,15 +53,30 @@ class PythonReleaseAcquirer(Acquirer):
     def _acquire(self, input_local_root_path: str = None) -> dict:
         html = self._acquire_python_release_top_html(input_local_root_path)
         data = self._scrape(html)
+        self._parse_release_dates(data)
         return data
 
+    def _parse_release_dates(self, release_table_dict: dict) -> None:
+        # リリース日をまとめて日付型に変換し、release_date_dtとして各レコードに追加する
+        release_numbers = list(release_table_dict.keys())
+        release_date_series = pd.Series([release_table_dict[x]['release_date'] for x in release_numbers],
+                                        index=release_numbers, dtype=object)
+        release_date_dt_series, failed_series = self._release_date_parser.parse_series(release_date_series)
+
+        for release_number, release_date_dt in release_date_dt_series.items():
+            release_table_dict[release_number]['release_date_dt'] = release_date_dt
+
+        self._release_date_failures = dict(release_date_series[failed_series])
+        if self._release_date_failures:
+            logger.warning('Failed to convert release_date: {}'.format(self._release_date_failures))
+
     def _acquire_python_release_top_html(self,
                                          input_local_root_path: str = None) -> bytes:
         if input_local_root_path:
             file_name = '{}.html'.format(self._raw_out_file_name_base)
             path = os.path.join(input_local_root_path, file_name)
         else:
-            path = 'https://www.python.org/downloads/'
+            path = '{}/downloads/'.format(self._base_url)
 
         html = self._acquire_html(path)
 
@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    ホストごとのリクエスト予算（同時リクエスト数と1秒あたりのリクエスト数）を守るためのリミッタ
+    複数スレッドから同時に使用されることを前提にしている
+    """
+
+    def __init__(self,
+                 max_in_flight: int = 1,
+                 requests_per_second: float = 1.0) -> None:
+        if max_in_flight < 1:
+            raise ValueError('max_in_flight must be 1 or more: {}'.format(max_in_flight))
+        if requests_per_second <= 0:
+            raise ValueError('requests_per_second must be positive: {}'.format(requests_per_second))
+
+        self._max_in_flight = max_in_flight
+        self._min_interval = 1.0 / requests_per_second
+
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_request_times = {}
+
+    @contextmanager
+    def limit(self, url: str):
+        """
+        urlのホストに対する予算の範囲内になるまで待ってから、ブロック内の処理を実行させる
+        :param url: リクエスト先のURL
+        """
+        host = urlparse(url).netloc
+        semaphore = self._get_semaphore(host)
+
+        with semaphore:
+            self._wait_for_turn(host)
+            yield
+
+    def _get_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self._max_in_flight)
+            return self._semaphores[host]
+
+    def _wait_for_turn(self, host: str) -> None:
+        # 次にリクエストしてよい時刻を予約してから、その時刻まで待つ
+        with self._lock:
+            now = time.monotonic()
+            request_time = max(now, self._next_request_times.get(host, now))
+            self._next_request_times[host] = request_time + self._min_interval
+
+        wait_time = request_time - time.monotonic()
+        if wait_time > 0:
+            time.sleep(wait_time)
@@ -0,0 +1,124 @@
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import threading
+import zlib
+
+
+class ContentAddressedRawDataStore:
+    """
+    取得したHTMLを、内容のハッシュ値をキーにして圧縮して1回だけ保存するストア
+    スナップショット（raw/<YYYYmmdd-HHMMSS>に相当）ごとに、ファイル名とハッシュ値の対応をマニフェストに記録する
+
+    <root>/objects/<ハッシュ値の先頭2文字>/<ハッシュ値>.zz  zlibで圧縮した内容
+    <root>/manifests/<スナップショット名>.tsv           ファイル名<TAB>ハッシュ値 の行（後の行が優先）
+    """
+
+    def __init__(self, root_path: str, compress_level: int = 9) -> None:
+        self._root_path = Path(root_path)
+        self._objects_path = self._root_path / 'objects'
+        self._manifests_path = self._root_path / 'manifests'
+        self._compress_level = compress_level
+        self._manifest_cache = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self._objects_path, exist_ok=True)
+        os.makedirs(self._manifests_path, exist_ok=True)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def root_path(self) -> Path:
+        return self._root_path
+
+    def _object_path(self, content_hash: str) -> Path:
+        return self._objects_path / content_hash[:2] / '{}.zz'.format(content_hash)
+
+    def _manifest_path(self, snapshot_name: str) -> Path:
+        return self._manifests_path / '{}.tsv'.format(snapshot_name)
+
+    def _load_manifest(self, snapshot_name: str) -> dict:
+        with self._lock:
+            if snapshot_name in self._manifest_cache:
+                return self._manifest_cache[snapshot_name]
+
+            manifest = {}
+            path = self._manifest_path(snapshot_name)
+            if path.exists():
+                with path.open(mode='r', encoding='utf-8') as f:
+                    for line in f:
+                        file_name, content_hash = line.rstrip('\n').split('\t')
+                        manifest[file_name] = content_hash
+            self._manifest_cache[snapshot_name] = manifest
+            return manifest
+
+    def list_snapshots(self) -> list:
+        return sorted(path.stem for path in self._manifests_path.glob('*.tsv'))
+
+    def snapshot_mtime(self, snapshot_name: str) -> float:
+        """
+        スナップショットのマニフェストの最終更新日時（UNIX時間）。スナップショットがなければNoneを返す
+        """
+        path = self._manifest_path(snapshot_name)
+        return path.stat().st_mtime if path.exists() else None
+
+    def list_files(self, snapshot_name: str) -> list:
+        return sorted(self._load_manifest(snapshot_name).keys())
+
+    def has(self, snapshot_name: str, file_name: str) -> bool:
+        return file_name in self._load_manifest(snapshot_name)
+
+    def content_hash(self, snapshot_name: str, file_name: str) -> str:
+        """
+        保存済みのファイルの内容のハッシュ値（sha256）を返す。なければNoneを返す
+        """
+        return self._load_manifest(snapshot_name).get(file_name)
+
+    def put(self, snapshot_name: str, file_name: str, data: bytes) -> str:
+        """
+        ファイルをスナップショットに追加する。同じ内容がすでに保存されていれば、内容は保存し直さない
+        :param snapshot_name: スナップショットの名前
+        :param file_name: ファイル名(pep-NNNN.htmlなど)
+        :param data: ファイルの内容
+        :return: 内容のハッシュ値
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(content_hash)
+        if not object_path.exists():
+            os.makedirs(object_path.parent, exist_ok=True)
+            tmp_path = object_path.with_name('{}.{}.{}.tmp'.format(object_path.name, os.getpid(),
+                                                                   threading.get_ident()))
+            tmp_path.write_bytes(zlib.compress(data, self._compress_level))
+            os.replace(str(tmp_path), str(object_path))
+
+        manifest = self._load_manifest(snapshot_name)
+        with self._lock:
+            # 追記のみなので、複数のプロセスから同時に書き込んでも行が壊れない
+            with self._manifest_path(snapshot_name).open(mode='a', encoding='utf-8') as f:
+                f.write('{}\t{}\n'.format(file_name, content_hash))
+            manifest[file_name] = content_hash
+
+        return content_hash
+
+    def get(self, snapshot_name: str, file_name: str) -> bytes:
+        """
+        スナップショットからファイルの内容を読み込む。圧縮された内容はメモリマップして展開する
+        :param snapshot_name: スナップショットの名前
+        :param file_name: ファイル名(pep-NNNN.htmlなど)
+        :return: ファイルの内容
+        """
+        content_hash = self.content_hash(snapshot_name, file_name)
+        if not content_hash:
+            raise FileNotFoundError('{} is not in snapshot {}'.format(file_name, snapshot_name))
+
+        with self._object_path(content_hash).open(mode='rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return zlib.decompress(mapped)
@@ -0,0 +1,82 @@
+import csv
+import os
+from pathlib import Path
+
+# PEP 1で定義されているヘッダのフィールド（PepHeaderAcquirerのレコードのキー）
+PEP_HEADER_FIELD_NAMES = ['PEP', 'Title', 'Version', 'Last-Modified', 'Author',
+                          'BDFL-Delegate', 'Discussions-To', 'Status', 'Type',
+                          'Content-Type', 'Requires', 'Created', 'Python-Version',
+                          'Post-History', 'Replaces', 'Superseded-By', 'Resolution',
+                          'Created_dt']
+
+
+class CsvRowWriter:
+    """
+    iter_acquireで取得したレコードを、1件ずつCSVファイルに追記するライター
+    with文で使用する
+    """
+
+    def __init__(self, path: str, field_names: list) -> None:
+        self._path = Path(path)
+        self._field_names = field_names
+        self._file = None
+        self._writer = None
+        self._row_count = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def row_count(self) -> int:
+        return self._row_count
+
+    def __enter__(self):
+        os.makedirs(self._path.parent, exist_ok=True)
+        self._file = self._path.open(mode='w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self._field_names,
+                                      extrasaction='ignore')
+        self._writer.writeheader()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._file.close()
+
+    def _write_row(self, row: dict) -> None:
+        self._writer.writerow(row)
+        self._row_count += 1
+
+    def write(self, pep_id: str, record: dict) -> None:
+        raise NotImplementedError
+
+
+class PepHeaderCsvRowWriter(CsvRowWriter):
+    """
+    PEPの基本情報を、pep_idを先頭の列として1行ずつ書き込む
+    field_namesにないフィールドは書き込まない
+    """
+
+    def __init__(self, path: str, field_names: list = None) -> None:
+        field_names = field_names if field_names else PEP_HEADER_FIELD_NAMES
+        super().__init__(path, ['pep_id'] + list(field_names))
+
+    def write(self, pep_id: str, record: dict) -> None:
+        # pandasのto_csvと同じく、欠損値(NaN, NaT)は空文字列として書き込む
+        row = {key: ('' if value != value else value) for key, value in record.items()}
+        row['pep_id'] = pep_id
+        self._write_row(row)
+
+
+class PepLinkEdgeCsvRowWriter(CsvRowWriter):
+    """
+    PEPのリンク数を、(リンク元, リンク先, リンク数)の1行ずつ書き込む
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path, ['link_source_pep_id', 'link_destination_pep_id', 'count'])
+
+    def write(self, pep_id: str, record: dict) -> None:
+        for destination_pep_id, count in sorted(record.items()):
+            self._write_row(dict(link_source_pep_id=pep_id,
+                                 link_destination_pep_id=destination_pep_id,
+                                 count=count))
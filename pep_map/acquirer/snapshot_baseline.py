@@ -0,0 +1,80 @@
+import hashlib
+from pathlib import Path
+
+
+def calc_content_hash(html: bytes) -> str:
+    return hashlib.sha256(html).hexdigest()
+
+
+class SnapshotBaseline:
+    """
+    差分取得の基準となる前回のスナップショット
+    raw/<YYYYmmdd-HHMMSS>/pep-NNNN.htmlのHTMLファイルと、前回のCSVから復元したレコードを保持する
+    """
+
+    def __init__(self, raw_dir_path: str, records: dict,
+                 raw_data_store=None) -> None:
+        """
+        :param raw_dir_path: 前回のHTMLファイルを保存したディレクトリのパス
+        :param records: 前回のCSVから復元したPEPごとのレコードの辞書
+        :param raw_data_store: HTMLをContentAddressedRawDataStoreに保存している場合のストア
+        """
+        self._raw_dir_path = Path(raw_dir_path)
+        self._records = records
+        self._raw_data_store = raw_data_store
+        self._content_hashes = {}
+
+    @property
+    def records(self) -> dict:
+        return self._records
+
+    @property
+    def pep_ids(self) -> list:
+        return list(self._records.keys())
+
+    def content_hash(self, pep_id: str) -> str:
+        """
+        前回のHTMLファイルのハッシュ値を返す。ファイルがなければNoneを返す
+        """
+        if pep_id not in self._content_hashes:
+            file_name = 'pep-{}.html'.format(pep_id)
+            path = self._raw_dir_path / file_name
+            content_hash = None
+            if self._raw_data_store:
+                # ストアのマニフェストにはハッシュ値が記録されているので、内容を読む必要はない
+                content_hash = self._raw_data_store.content_hash(self._raw_dir_path.name, file_name)
+            if not content_hash and path.exists():
+                content_hash = calc_content_hash(path.read_bytes())
+            self._content_hashes[pep_id] = content_hash
+        return self._content_hashes[pep_id]
+
+    def is_unchanged(self, pep_id: str, content_hash: str) -> bool:
+        if pep_id not in self._records:
+            return False
+        return self.content_hash(pep_id) == content_hash
+
+    def make_changeset(self, content_hashes: dict, failed_pep_ids: list = (),
+                       requested_pep_ids: list = None) -> dict:
+        """
+        今回取得したHTMLのハッシュ値と比較して、追加・削除・変更されたPEPを分類する
+        取得に失敗したPEPと、取得対象に含めなかったPEPは削除されたとはみなさない
+        :param content_hashes: 今回取得したPEPごとのHTMLのハッシュ値の辞書
+        :param failed_pep_ids: 再試行しても取得できなかったPEPの番号
+        :param requested_pep_ids: 取得するPEPを指定した場合の、PEPの番号のリスト
+        :return: added, removed, changed, unchanged, failedをキーとしたPEPの番号のリストの辞書
+        """
+        failed_pep_ids = set(failed_pep_ids)
+        requested_pep_ids = set(requested_pep_ids) if requested_pep_ids is not None else None
+        changeset = dict(added=[], removed=[], changed=[], unchanged=[], failed=[])
+        for pep_id, content_hash in content_hashes.items():
+            if pep_id not in self._records:
+                changeset['added'].append(pep_id)
+            elif self.is_unchanged(pep_id, content_hash):
+                changeset['unchanged'].append(pep_id)
+            else:
+                changeset['changed'].append(pep_id)
+        changeset['removed'] = [pep_id for pep_id in self._records
+                                if pep_id not in content_hashes and pep_id not in failed_pep_ids
+                                and (requested_pep_ids is None or pep_id in requested_pep_ids)]
+        changeset['failed'] = [pep_id for pep_id in self._records if pep_id in failed_pep_ids]
+        return changeset
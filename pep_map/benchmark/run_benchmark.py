@@ -0,0 +1,456 @@
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+# pep_map直下のモジュール（acquirer, graph, make_pep_graph）を読み込めるようにする
+PEP_MAP_DIR_PATH = Path(__file__).resolve().parent.parent
+sys.path.append(str(PEP_MAP_DIR_PATH))
+
+from acquirer.link_extractor import LINK_EXTRACTORS  # noqa: E402
+from benchmark.synthetic_corpus import MAX_HTML_PEP_COUNT  # noqa: E402
+from benchmark.synthetic_corpus import generate_header_records, generate_link_records, make_pep_ids  # noqa: E402
+from benchmark.synthetic_corpus import serve_corpus, write_corpus, write_python_release_csv  # noqa: E402
+from instrumentation import configure_logging, log_event  # noqa: E402
+
+RESULT_FORMAT_VERSION = 1
+DEFAULT_SIZES = (1000, 10000, 100000)
+# URLのPEPの番号は4桁なので、この数まではHTMLのコーパスをMAX_HTML_PEP_COUNT件に切り詰めてHTTPで取得する
+# （「10k」の段階を、1件少ないだけのコーパスでHTTPの取得から計測するため）
+MAX_HTML_TIER_PEP_COUNT = 10000
+# 隣接行列（PEPの数の2乗）を作る段階を実行するPEPの数の上限
+DEFAULT_DENSE_LIMIT = 5000
+# 比較するときに、この割合を超えて増えた値を悪化とみなす
+DEFAULT_TOLERANCE = 0.2
+COMPARED_METRICS = ('wall_seconds', 'cpu_seconds', 'peak_rss_bytes', 'output_bytes')
+
+logger = logging.getLogger(__name__)
+
+
+def calc_path_size(path: Path) -> int:
+    """
+    ファイルの大きさ、またはフォルダ以下のすべてのファイルの大きさの合計
+    """
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(x.stat().st_size for x in path.rglob('*') if x.is_file())
+
+
+def get_peak_rss_bytes() -> int:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxではキロバイト、macOSではバイト単位
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def _find_one(dir_path: Path, pattern: str) -> Path:
+    paths = sorted(dir_path.glob(pattern))
+    if not paths:
+        raise FileNotFoundError('{} in {}'.format(pattern, dir_path))
+    return paths[-1]
+
+
+# 各段階は別のプロセスで実行し、前の段階の出力ファイルを入力にする。
+# 返り値は(計測する処理, 出力のパス)で、計測する処理の実行時間だけを記録する
+
+def calc_html_pep_count(size: int) -> int:
+    """
+    PEPの数に対して、HTMLのコーパスとして生成するPEPの数。HTMLにできない大きさではNone
+    """
+    if size > MAX_HTML_TIER_PEP_COUNT:
+        return None
+    return min(size, MAX_HTML_PEP_COUNT)
+
+
+def _stage_generate_corpus(work_dir_path: Path, size: int, options: dict):
+    corpus_dir_path = work_dir_path / 'corpus'
+    pep_count = calc_html_pep_count(size)
+    return (lambda: dict(pep_count=len(write_corpus(corpus_dir_path, pep_count, options['seed'])))), corpus_dir_path
+
+
+def _stage_synthesize_records(work_dir_path: Path, size: int, options: dict):
+    # HTMLにできない大きさでは、取得結果と同じ形式のCSVを直接生成する
+    import pandas as pd
+    out_dir_path = work_dir_path / 'out'
+
+    def run() -> dict:
+        os.makedirs(out_dir_path, exist_ok=True)
+        pep_ids = make_pep_ids(size)
+        link_records = generate_link_records(pep_ids, options['seed'])
+        edges = [(source, destination, count) for source, counter in link_records.items()
+                 for destination, count in counter.items()]
+        pd.DataFrame(edges, columns=['link_source_pep_id', 'link_destination_pep_id', 'count']).to_csv(
+            out_dir_path / 'pep_link_edges_synthetic.csv', encoding='utf-8', index=False)
+        header_df = pd.DataFrame.from_dict(generate_header_records(pep_ids, options['seed']), orient='index')
+        header_df.index.name = 'pep_id'
+        header_df.to_csv(out_dir_path / 'pep_header_synthetic.csv', encoding='utf-8')
+        return dict(pep_count=size, edge_count=len(edges))
+
+    return run, out_dir_path
+
+
+def _stage_acquire(work_dir_path: Path, size: int, options: dict):
+    from acquirer.pep_acquirer import PepHeaderAndLinkAcquirer
+    out_dir_path = work_dir_path / 'out'
+    acquirer = PepHeaderAndLinkAcquirer(raw_data_out_root_path=str(out_dir_path / 'raw'),
+                                        should_save_raw_data=True,
+                                        base_url=options['base_url'],
+                                        max_workers=options['workers'],
+                                        requests_per_second=options['requests_per_second'],
+                                        link_extractor=options['link_extractor'])
+
+    def run() -> dict:
+        acquirer.acquire()
+        acquirer.header_acquirer.to_csv(out_root_path=str(out_dir_path))
+        acquirer.link_acquirer.to_edge_list(out_root_path=str(out_dir_path))
+        if size <= options['dense_limit']:
+            acquirer.link_acquirer.to_csv(out_root_path=str(out_dir_path))
+        return dict(pep_count=len(acquirer.data), failures=len(acquirer.failures))
+
+    return run, out_dir_path
+
+
+def _stage_to_adjacency_matrix(work_dir_path: Path, size: int, options: dict):
+    import pandas as pd
+    from make_pep_graph import to_adjacency_matrix
+    link_df = pd.read_csv(_find_one(work_dir_path / 'out', 'pep_link_destination_*.csv'), encoding='utf-8',
+                          index_col=0, dtype=str).astype(int)
+    result = {}
+
+    def run() -> dict:
+        result['df'] = to_adjacency_matrix(link_df)
+        return dict(shape=list(result['df'].shape))
+
+    return run, None
+
+
+def _stage_make_pep_graph(work_dir_path: Path, size: int, options: dict):
+    # 隣接行列のDataFrameを入力とする従来のAPI
+    import pandas as pd
+    from make_pep_graph import make_pep_graph
+    out_dir_path = work_dir_path / 'out'
+    link_df = pd.read_csv(_find_one(out_dir_path, 'pep_link_destination_*.csv'), encoding='utf-8',
+                          index_col=0, dtype=str).astype(int)
+    header_df = pd.read_csv(_find_one(out_dir_path, 'pep_header_*.csv'), encoding='utf-8',
+                            index_col=0, dtype=str)
+
+    def run() -> dict:
+        pep_graph = make_pep_graph(link_df, header_df)
+        return dict(nodes=pep_graph.number_of_nodes(), edges=pep_graph.number_of_edges())
+
+    return run, None
+
+
+def _stage_make_pep_graph_from_edge_list(work_dir_path: Path, size: int, options: dict):
+    # make_pep_graph.mainと同じく、0でないリンク数だけからグラフを作成して保存する
+    import pandas as pd
+    from acquirer.pep_acquirer import read_edge_list
+    from graph.graph_artifact import save_pep_graph
+    from graph.graph_builder import make_pep_graph_from_edge_list
+    out_dir_path = work_dir_path / 'out'
+    edge_df = read_edge_list(str(_find_one(out_dir_path, 'pep_link_edges_*.csv')))
+    header_df = pd.read_csv(_find_one(out_dir_path, 'pep_header_*.csv'), encoding='utf-8',
+                            index_col=0, dtype=str)
+    graph_dir_path = out_dir_path / 'pep_graph'
+
+    def run() -> dict:
+        pep_graph = make_pep_graph_from_edge_list(edge_df, header_df, datetime(2000, 1, 1))
+        save_pep_graph(pep_graph, graph_dir_path)
+        return dict(nodes=pep_graph.number_of_nodes(), edges=pep_graph.number_of_edges())
+
+    return run, graph_dir_path
+
+
+def _stage_make_timeline_html(work_dir_path: Path, size: int, options: dict):
+    sys.path.append(str(PEP_MAP_DIR_PATH / 'html_generator'))
+    from generate_html import make_timeline_html
+    out_dir_path = work_dir_path / 'out'
+    write_python_release_csv(out_dir_path)
+    html_path = work_dir_path / 'html' / 'timeline.html'
+    os.makedirs(html_path.parent, exist_ok=True)
+
+    def run() -> dict:
+        make_timeline_html(str(out_dir_path), str(html_path), compact=options['compact'])
+        return {}
+
+    return run, html_path
+
+
+STAGES = {'generate_corpus': _stage_generate_corpus,
+          'synthesize_records': _stage_synthesize_records,
+          'acquire': _stage_acquire,
+          'to_adjacency_matrix': _stage_to_adjacency_matrix,
+          'make_pep_graph': _stage_make_pep_graph,
+          'make_pep_graph_from_edge_list': _stage_make_pep_graph_from_edge_list,
+          'make_timeline_html': _stage_make_timeline_html}
+
+
+def run_stage(stage: str, work_dir_path: Path, size: int, options: dict) -> dict:
+    """
+    子プロセスの中で1つの段階を実行し、実行時間・CPU時間・ピークのRSS・出力の大きさを計測する
+    """
+    baseline_rss_bytes = get_peak_rss_bytes()
+    run, output_path = STAGES[stage](work_dir_path, size, options)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    detail = run()
+    wall_seconds, cpu_seconds = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    return dict(status='ok',
+                wall_seconds=wall_seconds,
+                cpu_seconds=cpu_seconds,
+                peak_rss_bytes=get_peak_rss_bytes(),
+                baseline_rss_bytes=baseline_rss_bytes,
+                output_bytes=calc_path_size(output_path) if output_path else None,
+                detail=detail)
+
+
+def _run_stage_in_subprocess(stage: str, work_dir_path: Path, size: int, options: dict) -> dict:
+    result_path = work_dir_path / 'results' / '{}.json'.format(stage)
+    log_path = work_dir_path / 'logs' / '{}.log'.format(stage)
+    os.makedirs(result_path.parent, exist_ok=True)
+    os.makedirs(log_path.parent, exist_ok=True)
+    command = [sys.executable, str(Path(__file__).resolve()), '--run-stage', stage,
+               '--work-dir', str(work_dir_path), '--size', str(size),
+               '--options', json.dumps(options), '--result-path', str(result_path)]
+    with log_path.open(mode='w', encoding='utf-8') as log_file:
+        completed = subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT)
+
+    if completed.returncode != 0 or not result_path.exists():
+        # 最後の数行を、失敗の理由として記録する
+        lines = log_path.read_text(encoding='utf-8', errors='replace').strip().splitlines()
+        return dict(status='error', detail=dict(log_path=str(log_path), message=' | '.join(lines[-3:])))
+    with result_path.open(mode='r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def plan_stages(size: int, dense_limit: int) -> list:
+    """
+    PEPの数に応じて実行する段階と、実行しない段階の理由
+    :return: (段階の名前, 実行しない理由またはNone)のリスト
+    """
+    html = calc_html_pep_count(size) is not None
+    dense = html and size <= dense_limit
+    html_reason = None if html else 'PEP numbers in URLs have 4 digits (at most {} PEPs)'.format(MAX_HTML_PEP_COUNT)
+    dense_reason = None if dense else (html_reason or 'dense adjacency matrix above --dense-limit {}'.format(
+        dense_limit))
+    return [('generate_corpus', html_reason),
+            ('acquire', html_reason),
+            ('synthesize_records', None if not html else 'corpus is acquired over HTTP'),
+            ('to_adjacency_matrix', dense_reason),
+            ('make_pep_graph', dense_reason),
+            ('make_pep_graph_from_edge_list', None),
+            ('make_timeline_html', None)]
+
+
+def run_benchmark(sizes: list, work_root_path: str, options: dict, keep: bool = False) -> dict:
+    """
+    PEPの数ごとに合成データを作成し、取得からページの生成までの各段階を計測する
+    :param sizes: PEPの数のリスト
+    :param work_root_path: 合成データと出力を書き出すフォルダのパス
+    :param options: 段階に渡す設定（seed, workers, requests_per_second, link_extractor, dense_limit, compact）
+    :param keep: Falseの場合は、PEPの数ごとの計測が終わったら合成データと出力を削除する
+    :return: 計測結果
+    """
+    results = []
+    for size in sizes:
+        work_dir_path = Path(work_root_path) / 'size_{}'.format(size)
+        if work_dir_path.exists():
+            shutil.rmtree(work_dir_path)
+        os.makedirs(work_dir_path)
+
+        server = None
+        try:
+            for stage, skip_reason in plan_stages(size, options['dense_limit']):
+                if skip_reason:
+                    results.append(dict(size=size, stage=stage, status='skipped', detail=dict(reason=skip_reason)))
+                    continue
+                if stage == 'acquire':
+                    server, base_url = serve_corpus(work_dir_path / 'corpus')
+                    options = dict(options, base_url=base_url)
+                result = _run_stage_in_subprocess(stage, work_dir_path, size, options)
+                if stage == 'acquire':
+                    server.shutdown()
+                    server = None
+                results.append(dict(result, size=size, stage=stage))
+                log_event(logger, 'benchmark_stage',
+                          level=logging.INFO if result['status'] == 'ok' else logging.WARNING,
+                          message='[size {}] {}: {}'.format(size, stage, _format_result(result)),
+                          size=size, stage=stage, status=result['status'])
+        finally:
+            if server:
+                server.shutdown()
+            if not keep:
+                shutil.rmtree(work_dir_path, ignore_errors=True)
+
+    return dict(format_version=RESULT_FORMAT_VERSION,
+                created=datetime.now().isoformat(),
+                environment=_describe_environment(),
+                options={key: value for key, value in options.items() if key != 'base_url'},
+                results=results)
+
+
+def _describe_environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=str(PEP_MAP_DIR_PATH),
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(python=platform.python_version(), platform=platform.platform(),
+                cpu_count=os.cpu_count(), git_commit=commit)
+
+
+def _format_result(result: dict) -> str:
+    if result['status'] != 'ok':
+        return '{} ({})'.format(result['status'], result.get('detail'))
+    output_bytes = result['output_bytes']
+    return '{:.2f}s wall, {:.2f}s cpu, {:.0f} MiB peak RSS{}'.format(
+        result['wall_seconds'], result['cpu_seconds'], result['peak_rss_bytes'] / 2 ** 20,
+        ', {:.1f} MiB output'.format(output_bytes / 2 ** 20) if output_bytes is not None else '')
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    同じPEPの数・段階の計測値を、基準の結果と比較する
+    :param tolerance: 基準よりこの割合を超えて増えた値を悪化とみなす
+    :return: size, stage, metric, baseline, current, ratio, regressedをキーとした辞書のリスト
+    """
+    baseline_results = {(x['size'], x['stage']): x for x in baseline['results'] if x['status'] == 'ok'}
+    comparisons = []
+    for result in current['results']:
+        base = baseline_results.get((result['size'], result['stage']))
+        if result['status'] != 'ok' or not base:
+            continue
+        for metric in COMPARED_METRICS:
+            if result.get(metric) is None or not base.get(metric):
+                continue
+            ratio = result[metric] / base[metric]
+            comparisons.append(dict(size=result['size'], stage=result['stage'], metric=metric,
+                                    baseline=base[metric], current=result[metric], ratio=ratio,
+                                    regressed=ratio > 1 + tolerance))
+    return comparisons
+
+
+def print_comparisons(comparisons: list) -> None:
+    print('{:>7} {:<32}{:<16}{:>14}{:>14}{:>9}'.format('size', 'stage', 'metric', 'baseline', 'current', 'ratio'))
+    for x in comparisons:
+        print('{:>7} {:<32}{:<16}{:>14.4g}{:>14.4g}{:>8.2f}x{}'.format(
+            x['size'], x['stage'], x['metric'], x['baseline'], x['current'], x['ratio'],
+            '  REGRESSED' if x['regressed'] else ''))
+
+
+def load_results(path: str) -> dict:
+    with open(path, mode='r', encoding='utf-8') as f:
+        results = json.load(f)
+    if results.get('format_version') != RESULT_FORMAT_VERSION:
+        raise ValueError('Unsupported benchmark result format version: {} (expected {})'.format(
+            results.get('format_version'), RESULT_FORMAT_VERSION))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='合成したPEPのコーパスで、取得からページの生成までの各段階を計測します。')
+    parser.add_argument('-n',
+                        '--sizes',
+                        type=int,
+                        nargs='+',
+                        default=list(DEFAULT_SIZES),
+                        help='計測するPEPの数。10000はHTMLのコーパスを{}件に切り詰めてHTTPで取得する。'
+                             '{}を超える数は、HTTPの取得を行わずに合成したCSVから計測する。'
+                             'デフォルトでは1000 10000 100000'.format(MAX_HTML_PEP_COUNT, MAX_HTML_TIER_PEP_COUNT))
+    parser.add_argument('-o',
+                        '--output',
+                        type=str,
+                        default='benchmark_results.json',
+                        help='計測結果のJSONファイルのパス')
+    parser.add_argument('-b',
+                        '--baseline',
+                        type=str,
+                        default=None,
+                        help='比較する基準の計測結果のJSONファイルのパス。悪化した値があれば終了コード1で終了する')
+    parser.add_argument('--compare',
+                        type=str,
+                        nargs=2,
+                        metavar=('CURRENT_JSON', 'BASELINE_JSON'),
+                        default=None,
+                        help='計測せずに、2つの計測結果を比較して終了する')
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help='基準よりこの割合を超えて増えた値を悪化とみなす。デフォルトでは0.2')
+    parser.add_argument('--work-dir',
+                        type=str,
+                        default='benchmark_work',
+                        help='合成データと出力を書き出すフォルダのパス')
+    parser.add_argument('--keep',
+                        action='store_true',
+                        help='計測後に合成データと出力を削除しない')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='合成データの乱数のシード')
+    parser.add_argument('-w',
+                        '--workers',
+                        type=int,
+                        default=8,
+                        help='取得の段階で並行して取得するスレッド数。デフォルトでは8')
+    parser.add_argument('--requests-per-second',
+                        type=float,
+                        default=1000.0,
+                        help='取得の段階の1秒あたりのリクエスト数の上限。デフォルトでは1000')
+    parser.add_argument('--link-extractor',
+                        type=str,
+                        default='bs4',
+                        choices=sorted(LINK_EXTRACTORS),
+                        help='取得の段階で、個別ページのリンク数の抽出に使う方法。デフォルトではbs4')
+    parser.add_argument('--dense-limit',
+                        type=int,
+                        default=DEFAULT_DENSE_LIMIT,
+                        help='隣接行列を作る段階を実行するPEPの数の上限。デフォルトでは{}'.format(DEFAULT_DENSE_LIMIT))
+    parser.add_argument('--compact',
+                        action='store_true',
+                        help='タイムラインのページを--compactで生成する')
+    # 以下は子プロセスで1つの段階を実行するときの引数
+    parser.add_argument('--run-stage', type=str, choices=sorted(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--options', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('--result-path', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        stage_result = run_stage(args.run_stage, Path(args.work_dir), args.size, json.loads(args.options))
+        with open(args.result_path, mode='w', encoding='utf-8') as f:
+            json.dump(stage_result, f, indent=2)
+        raise SystemExit(0)
+
+    # 段階を実行する子プロセスでは、ログの出力が計測に含まれないように設定しない
+    configure_logging()
+
+    if args.compare:
+        stage_comparisons = compare_results(load_results(args.compare[0]), load_results(args.compare[1]),
+                                            args.tolerance)
+        print_comparisons(stage_comparisons)
+        raise SystemExit(1 if any(x['regressed'] for x in stage_comparisons) else 0)
+
+    benchmark_results = run_benchmark(args.sizes, args.work_dir,
+                                      dict(seed=args.seed,
+                                           workers=args.workers,
+                                           requests_per_second=args.requests_per_second,
+                                           link_extractor=args.link_extractor,
+                                           dense_limit=args.dense_limit,
+                                           compact=args.compact),
+                                      keep=args.keep)
+    with open(args.output, mode='w', encoding='utf-8') as f:
+        json.dump(benchmark_results, f, indent=2)
+    logger.info('Completed to save benchmark results: {}'.format(args.output))
+
+    if args.baseline:
+        stage_comparisons = compare_results(benchmark_results, load_results(args.baseline), args.tolerance)
+        print_comparisons(stage_comparisons)
+        raise SystemExit(1 if any(x['regressed'] for x in stage_comparisons) else 0)
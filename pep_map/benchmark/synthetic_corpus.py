@@ -0,0 +1,258 @@
+import argparse
+from datetime import date, timedelta
+from html import escape
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# URLのPEPの番号は4桁（/dev/peps/pep-NNNN）なので、HTMLのコーパスにできるのはPEP 9999まで
+MAX_HTML_PEP_COUNT = 9999
+
+_WORDS = ('python', 'module', 'syntax', 'type', 'annotation', 'generator', 'coroutine', 'import',
+          'package', 'unicode', 'string', 'format', 'exception', 'context', 'manager', 'decorator',
+          'iterator', 'protocol', 'buffer', 'interpreter', 'garbage', 'collector', 'dictionary',
+          'keyword', 'argument', 'function', 'class', 'method', 'attribute', 'descriptor', 'slot',
+          'standard', 'library', 'release', 'schedule', 'version', 'compatibility', 'deprecation',
+          'specification', 'rationale', 'motivation', 'implementation', 'reference', 'backwards',
+          'security', 'performance', 'memory', 'thread', 'async', 'await', 'pattern', 'matching')
+_AUTHORS = ('Guido van Rossum', 'Barry Warsaw', 'Nick Coghlan', 'Brett Cannon', 'Victor Stinner',
+            'Raymond Hettinger', 'Eric Snow', 'Ivan Levkivskyi', 'Łukasz Langa', 'Yury Selivanov')
+# 実際のPEPの分布に近い割合
+_STATUSES = (('Final', 0.45), ('Rejected', 0.15), ('Withdrawn', 0.1), ('Draft', 0.1),
+             ('Deferred', 0.05), ('Superseded', 0.05), ('Active', 0.05), ('Accepted', 0.05))
+_TYPES = (('Standards Track', 0.7), ('Informational', 0.2), ('Process', 0.1))
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>PEP {pep_number} -- {title} | Python.org</title></head>
+<body class="python pages">
+<nav id="mainnav">{navigation}</nav>
+<div id="content" class="content-wrapper">
+<article class="text">
+<h1 class="page-title">PEP {pep_number} -- {title}</h1>
+<table class="rfc2822 docutils field-list" frame="void" rules="none">
+<tbody valign="top">
+{header_rows}
+</tbody>
+</table>
+<div id="pep-content">
+{body}
+</div>
+</article>
+</div>
+<footer id="site-map">{navigation}</footer>
+</body>
+</html>
+'''
+
+# python.orgの共通部分（ナビゲーション）のリンク。パースの負荷を実際のページに近づける
+_NAVIGATION = ''.join('<li><a href="/{0}/">{0}</a></li>'.format(x)
+                      for x in ('about', 'downloads', 'doc', 'community', 'success-stories', 'news',
+                                'events', 'jobs', 'psf', 'dev', 'dev/peps', 'blogs', 'shop') * 6)
+
+logger = logging.getLogger(__name__)
+
+
+def make_pep_ids(pep_count: int) -> list:
+    """
+    PEP 1からpep_count件のPEPの番号。PEP 9999までは4桁、それより多い場合は同じ桁数に揃える
+    """
+    width = max(4, len(str(pep_count)))
+    return [str(i).zfill(width) for i in range(1, pep_count + 1)]
+
+
+def generate_link_records(pep_ids: list, seed: int = 0,
+                          mean_out_degree: float = 4.0, max_out_degree: int = 60) -> dict:
+    """
+    実際のPEPに近いリンクの分布（一部のPEPに被リンクが集中し、リンク先の数は少数）のリンク数を生成する
+    被リンクのされやすさは順位のべき乗(Zipf)に比例させ、リンク先の数は幾何分布にする
+    :return: PEPの番号ごとの、リンク先のPEPの番号とリンク数の辞書（PepLinkDestinationAcquirer.dataの形式）
+    """
+    rng = np.random.RandomState(seed)
+    pep_count = len(pep_ids)
+    popularity = 1 / np.arange(1, pep_count + 1) ** 1.1
+    popularity = popularity[rng.permutation(pep_count)]
+    cumulative = np.cumsum(popularity) / popularity.sum()
+    out_degrees = np.minimum(rng.geometric(1 / (mean_out_degree + 1), size=pep_count) - 1, max_out_degree)
+
+    link_records = {}
+    for i, pep_id in enumerate(pep_ids):
+        targets = np.searchsorted(cumulative, rng.rand(out_degrees[i]))
+        targets = np.minimum(targets, pep_count - 1)
+        link_records[pep_id] = {pep_ids[j]: int(rng.geometric(0.6)) for j in set(targets.tolist()) if j != i}
+    return link_records
+
+
+def generate_header_records(pep_ids: list, seed: int = 0) -> dict:
+    """
+    rfc2822の表に載せる基本情報を生成する。Createdは番号順にほぼ増えていく日付にする
+    :return: PEPの番号ごとの、フィールド名と値の辞書（PepHeaderAcquirerのCSVと同じフィールド名）
+    """
+    rng = np.random.RandomState(seed + 1)
+    statuses, status_weights = zip(*_STATUSES)
+    types, type_weights = zip(*_TYPES)
+    first_date = date(2000, 6, 13)
+    days_per_pep = 7000 / len(pep_ids)
+
+    header_records = {}
+    for i, pep_id in enumerate(pep_ids):
+        created = first_date + timedelta(days=int(i * days_per_pep + rng.randint(0, 30)))
+        header_dict = {'PEP': str(int(pep_id)),
+                       'Title': ' '.join(rng.choice(_WORDS, size=rng.randint(2, 8))).capitalize(),
+                       'Author': ', '.join(rng.choice(_AUTHORS, size=rng.randint(1, 3), replace=False)),
+                       'Status': rng.choice(statuses, p=status_weights),
+                       'Type': rng.choice(types, p=type_weights),
+                       'Created': created.strftime('%d-%b-%Y')}
+        if rng.rand() < 0.6:
+            header_dict['Python-Version'] = '{}.{}'.format(rng.choice([2, 3]), rng.randint(0, 12))
+        if rng.rand() < 0.5:
+            header_dict['Post-History'] = ', '.join((created + timedelta(days=int(x))).strftime('%d-%b-%Y')
+                                                    for x in sorted(rng.randint(1, 400, size=rng.randint(1, 4))))
+        header_records[pep_id] = header_dict
+    return header_records
+
+
+def render_pep_page(pep_id: str, header_dict: dict, link_counter: dict, rng: np.random.RandomState,
+                    mean_paragraph_count: int = 20) -> str:
+    """
+    PEPの個別ページ（pep-NNNN.html）と同じ構造のHTMLを生成する
+    リンク先のPEPへのリンクは、リンク数の回数だけ本文の段落に散らばらせる
+    """
+    header_rows = '\n'.join('<tr class="field"><th class="field-name">{}:</th>'
+                            '<td class="field-body">{}</td></tr>'.format(escape(name), escape(value))
+                            for name, value in header_dict.items())
+
+    paragraph_count = max(1, int(rng.poisson(mean_paragraph_count)))
+    paragraphs = [' '.join(rng.choice(_WORDS, size=rng.randint(40, 120))) for _ in range(paragraph_count)]
+    for destination_pep_id, count in link_counter.items():
+        for _ in range(count):
+            i = rng.randint(paragraph_count)
+            paragraphs[i] += (' see <a class="reference external" href="/dev/peps/pep-{0}/">PEP {1}</a>'
+                              .format(destination_pep_id, int(destination_pep_id)))
+    for _ in range(rng.poisson(3)):
+        i = rng.randint(paragraph_count)
+        paragraphs[i] += ' (<a class="reference external" href="https://docs.python.org/3/">docs</a>)'
+
+    body = '\n'.join('<div class="section"><h2>{}</h2><p>{}</p></div>'.format(
+        escape(paragraph.split(' ', 1)[0].capitalize()), paragraph) for paragraph in paragraphs)
+    return PAGE_TEMPLATE.format(pep_number=int(pep_id), title=escape(header_dict['Title']),
+                                navigation=_NAVIGATION, header_rows=header_rows, body=body)
+
+
+def render_index_page(pep_ids: list) -> str:
+    """
+    すべてのPEPにリンクするPEP 0（目次）のページを生成する
+    """
+    rows = '\n'.join('<tr><td><a class="reference external" href="/dev/peps/pep-{0}/">{1}</a></td></tr>'
+                     .format(pep_id, int(pep_id)) for pep_id in pep_ids)
+    return PAGE_TEMPLATE.format(pep_number=0, title='Index of Python Enhancement Proposals (PEPs)',
+                                navigation=_NAVIGATION,
+                                header_rows='<tr class="field"><th class="field-name">PEP:</th>'
+                                            '<td class="field-body">0</td></tr>',
+                                body='<table>{}</table>'.format(rows))
+
+
+def write_corpus(out_dir_path: str, pep_count: int, seed: int = 0,
+                 mean_paragraph_count: int = 20) -> dict:
+    """
+    pep-0000.html（目次）とpep-NNNN.htmlのコーパスを書き出す
+    :return: 生成したリンク数（PEPの番号ごとの辞書）。ベンチマークの結果の確認に使う
+    """
+    if pep_count > MAX_HTML_PEP_COUNT:
+        raise ValueError('PEP numbers in URLs have 4 digits; at most {} PEPs can be written as HTML: {}'.format(
+            MAX_HTML_PEP_COUNT, pep_count))
+
+    os.makedirs(out_dir_path, exist_ok=True)
+    pep_ids = make_pep_ids(pep_count)
+    link_records = generate_link_records(pep_ids, seed)
+    header_records = generate_header_records(pep_ids, seed)
+    rng = np.random.RandomState(seed + 2)
+
+    (Path(out_dir_path) / 'pep-0000.html').write_text(render_index_page(pep_ids), encoding='utf-8')
+    for pep_id in pep_ids:
+        html = render_pep_page(pep_id, header_records[pep_id], link_records[pep_id], rng,
+                               mean_paragraph_count)
+        (Path(out_dir_path) / 'pep-{}.html'.format(pep_id)).write_text(html, encoding='utf-8')
+    return link_records
+
+
+def write_python_release_csv(out_dir_path: str) -> Path:
+    """
+    generate_html.make_timeline_htmlが読み込むpython_release_info.csvを、主なリリースだけで書き出す
+    """
+    releases = [('Python 2.0.0', '2000-10-16'), ('Python 2.7.0', '2010-07-03'),
+                ('Python 3.0.0', '2008-12-03'), ('Python 3.6.0', '2016-12-23'),
+                ('Python 3.7.0', '2018-06-27')]
+    rows = []
+    for release_number, release_date in releases:
+        major, minor, micro = (int(x) for x in release_number.split(' ')[1].split('.'))
+        rows.append(dict(release_number=release_number, release_date=release_date,
+                         release_date_dt=release_date, major=major, minor=minor, micro=micro,
+                         release_download_url='', full_change_log_url=''))
+    path = Path(out_dir_path) / 'python_release_info.csv'
+    pd.DataFrame(rows).to_csv(path, encoding='utf-8', index=False)
+    return path
+
+
+class CorpusRequestHandler(SimpleHTTPRequestHandler):
+    """
+    python.orgのURL（/dev/peps/pep-NNNN/）を、コーパスのpep-NNNN.htmlに対応させて返す
+    """
+    _PEP_PATH_PATTERN = re.compile(r'/dev/peps/pep-(\d{4})/?$')
+
+    def translate_path(self, path: str) -> str:
+        match = self._PEP_PATH_PATTERN.match(path.split('?', 1)[0])
+        if match:
+            path = '/pep-{}.html'.format(match.group(1))
+        return super().translate_path(path)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def serve_corpus(corpus_dir_path: str, port: int = 0) -> (ThreadingHTTPServer, str):
+    """
+    コーパスをローカルのHTTPサーバで公開する。Acquirerのbase_urlに返り値のURLを指定して取得する
+    :param port: 0の場合は空いているポートを使う
+    :return: サーバ（終了するときはshutdown()を呼ぶ）と、base_url
+    """
+    handler = lambda *args, **kwargs: CorpusRequestHandler(*args, directory=str(corpus_dir_path),  # noqa: E731
+                                                           **kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ベンチマーク用に、PEPの個別ページと同じ構造の合成HTMLを生成します。')
+    parser.add_argument('-d',
+                        '--destination',
+                        type=str,
+                        required=True,
+                        help='pep-NNNN.htmlを書き出すフォルダのパス')
+    parser.add_argument('-n',
+                        '--pep-count',
+                        type=int,
+                        default=1000,
+                        help='生成するPEPの数（{}まで）。デフォルトでは1000'.format(MAX_HTML_PEP_COUNT))
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='乱数のシード')
+    parser.add_argument('--serve',
+                        action='store_true',
+                        help='生成後に、ローカルのHTTPサーバで公開し続ける')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    write_corpus(args.destination, args.pep_count, args.seed)
+    if args.serve:
+        server, base_url = serve_corpus(args.destination)
+        logger.info('Serving {} at {}'.format(args.destination, base_url))
+        threading.Event().wait()
@@ -0,0 +1,163 @@
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+from graph.graph_artifact import PepGraphSnapshot
+
+METRIC_NAMES = ('in_degree', 'out_degree', 'pagerank', 'hub', 'authority', 'betweenness')
+
+
+def to_csr_matrix(pep_graph) -> (list, sp.csr_matrix):
+    """
+    グラフを、リンク数を値に持つSciPyの疎行列（行がリンク元、列がリンク先）に変換する
+    :param pep_graph: networkxのグラフかPepGraphSnapshot
+    :return: 行・列の順のPEPの番号のリストと、疎行列
+    """
+    if isinstance(pep_graph, PepGraphSnapshot):
+        node_ids = [str(x) for x in pep_graph.node_ids]
+        matrix = sp.csr_matrix((np.asarray(pep_graph.weights, dtype=np.float64),
+                                np.asarray(pep_graph.indices),
+                                np.asarray(pep_graph.indptr)),
+                               shape=(len(node_ids), len(node_ids)))
+        return node_ids, matrix
+
+    node_ids = list(pep_graph.nodes)
+    if not node_ids:
+        # networkxは空のグラフを疎行列に変換できないので、0x0の疎行列を返す
+        return node_ids, sp.csr_matrix((0, 0), dtype=np.float64)
+    matrix = sp.csr_matrix(nx.to_scipy_sparse_array(pep_graph, nodelist=node_ids,
+                                                    weight='weight', dtype=np.float64, format='csr'))
+    return node_ids, matrix
+
+
+def calc_pagerank(matrix: sp.csr_matrix, alpha: float = 0.85,
+                  max_iter: int = 100, tol: float = 1.0e-6) -> np.ndarray:
+    """
+    リンク数を重みとしたPageRankを、べき乗法で計算する。networkx.pagerankと同じ定義
+    リンク先のないPEPからは、すべてのPEPに均等に遷移するものとする
+    """
+    node_count = matrix.shape[0]
+    out_strength = np.asarray(matrix.sum(axis=1)).ravel()
+    is_dangling = out_strength == 0
+    inverse_strength = np.where(is_dangling, 0, 1 / np.where(is_dangling, 1, out_strength))
+    transition = sp.diags(inverse_strength) @ matrix
+
+    x = np.full(node_count, 1 / node_count)
+    for _ in range(max_iter):
+        previous = x
+        x = alpha * (transition.T @ x + x[is_dangling].sum() / node_count) + (1 - alpha) / node_count
+        if np.abs(x - previous).sum() < node_count * tol:
+            break
+    return x / x.sum()
+
+
+def calc_hits(matrix: sp.csr_matrix, max_iter: int = 100, tol: float = 1.0e-8) -> (np.ndarray, np.ndarray):
+    """
+    HITSのハブ・オーソリティのスコアを、べき乗法で計算する。それぞれ合計が1になるように正規化する
+    """
+    node_count = matrix.shape[0]
+    hub = np.full(node_count, 1 / node_count)
+    for _ in range(max_iter):
+        previous = hub
+        authority = matrix.T @ hub
+        hub = matrix @ authority
+        if not hub.any():
+            break
+        hub = hub / hub.max()
+        if np.abs(hub - previous).sum() < tol:
+            break
+    authority = matrix.T @ hub
+    hub_total, authority_total = hub.sum(), authority.sum()
+    return (hub / hub_total if hub_total else hub,
+            authority / authority_total if authority_total else authority)
+
+
+def calc_betweenness(matrix: sp.csr_matrix, samples: int = None,
+                     batch_size: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    リンクの向きを考慮した媒介中心性を、Brandesのアルゴリズムで計算する
+    複数の始点の幅優先探索を、疎行列と密行列の積でまとめて進める
+    :param samples: 始点にするPEPの数。省略した場合やPEPの数以上の場合はすべてのPEPを始点とした正確な値になる
+    :return: networkx.betweenness_centrality(normalized=True)と同じ尺度の値
+    """
+    node_count = matrix.shape[0]
+    adjacency = (matrix != 0).astype(np.float64).tolil()
+    adjacency.setdiag(0)
+    adjacency = adjacency.tocsr()
+    adjacency.eliminate_zeros()
+    adjacency_t = adjacency.T.tocsr()
+
+    if samples is None or samples >= node_count:
+        sources = np.arange(node_count)
+    else:
+        sources = np.random.RandomState(seed).choice(node_count, samples, replace=False)
+
+    betweenness = np.zeros(node_count)
+    for batch_start in range(0, len(sources), batch_size):
+        batch = sources[batch_start:batch_start + batch_size]
+        rows = np.arange(len(batch))
+        sigma = np.zeros((len(batch), node_count))
+        sigma[rows, batch] = 1
+        distance = np.full((len(batch), node_count), -1, dtype=np.int64)
+        distance[rows, batch] = 0
+
+        # 幅優先探索で、始点からの距離と最短経路の数を数える
+        frontier = sigma.copy()
+        level = 0
+        while frontier.any():
+            reached = (adjacency_t @ frontier.T).T
+            reached[distance >= 0] = 0
+            is_reached = reached > 0
+            level += 1
+            distance[is_reached] = level
+            sigma += reached
+            frontier = reached
+
+        # 遠いPEPから順に、依存度を足し上げる
+        delta = np.zeros((len(batch), node_count))
+        safe_sigma = np.where(sigma > 0, sigma, 1)
+        for current_level in range(level - 1, 0, -1):
+            coefficient = np.where(distance == current_level + 1, (1 + delta) / safe_sigma, 0)
+            contribution = (adjacency @ coefficient.T).T
+            delta += np.where(distance == current_level, sigma * contribution, 0)
+        betweenness += delta.sum(axis=0)
+
+    if node_count > 2:
+        betweenness *= 1 / ((node_count - 1) * (node_count - 2))
+    return betweenness * (node_count / len(sources)) if len(sources) else betweenness
+
+
+def calc_pep_graph_metrics(pep_graph, betweenness_samples: int = 256, seed: int = 0) -> dict:
+    """
+    グラフの疎行列から、METRIC_NAMESの指標をまとめて計算する
+    :param pep_graph: networkxのグラフかPepGraphSnapshot
+    :param betweenness_samples: 媒介中心性の計算で始点にするPEPの数。Noneの場合はすべてのPEP
+    :param seed: 媒介中心性の始点を選ぶ乱数のシード
+    :return: 指標の名前ごとの、PEPの番号と値の辞書
+    """
+    node_ids, matrix = to_csr_matrix(pep_graph)
+    if not node_ids:
+        return {name: {} for name in METRIC_NAMES}
+
+    hub, authority = calc_hits(matrix)
+    metrics = dict(in_degree=np.diff(matrix.tocsc().indptr).astype(np.float64),
+                   out_degree=np.diff(matrix.indptr).astype(np.float64),
+                   pagerank=calc_pagerank(matrix),
+                   hub=hub,
+                   authority=authority,
+                   betweenness=calc_betweenness(matrix, betweenness_samples, seed=seed))
+    return {name: dict(zip(node_ids, values.tolist())) for name, values in metrics.items()}
+
+
+def add_pep_graph_metrics(pep_graph: nx.DiGraph, **kwargs) -> dict:
+    """
+    calc_pep_graph_metricsの指標を、ノードの属性に設定する
+    graph.graph['metric_names']に名前を記録するので、save_pep_graphでは基本情報とは別の列として保存される
+    :param kwargs: calc_pep_graph_metricsに渡す引数
+    :return: 指標の名前ごとの、PEPの番号と値の辞書
+    """
+    metrics = calc_pep_graph_metrics(pep_graph, **kwargs)
+    for name, values in metrics.items():
+        nx.set_node_attributes(pep_graph, values, name)
+    pep_graph.graph['metric_names'] = list(METRIC_NAMES)
+    return metrics
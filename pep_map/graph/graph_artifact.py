@@ -0,0 +1,304 @@
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# 保存形式を変更したときは、この値を増やしてload_pep_graph_snapshotで読み分ける
+FORMAT_VERSION = 1
+META_FILE_NAME = 'meta.json'
+# graph_layoutで計算したノードの座標(x, y)の属性名。基本情報とは別に、座標の配列として保存する
+POSITION_ATTRIBUTE_NAME = 'position'
+
+
+def _is_missing(value) -> bool:
+    return value is None or value != value  # NaN, NaT
+
+
+def _is_datetime_column(values: list) -> bool:
+    present_values = [x for x in values if not _is_missing(x)]
+    return bool(present_values) and all(isinstance(x, (datetime, np.datetime64)) for x in present_values)
+
+
+class PepGraphSnapshot:
+    """
+    save_pep_graphで保存したグラフを、networkxのグラフに変換せずに参照するための読み取り専用のビュー
+    エッジはCSR形式（indptr, indices, weights）、ノードの属性は列ごとの配列で持つ
+    配列はメモリマップで読み込むので、読み込みは一瞬で終わり、複数のプロセスで同じファイルを開いてもコピーされない
+    """
+
+    def __init__(self, dir_path: str, meta: dict, arrays: dict) -> None:
+        self._dir_path = Path(dir_path)
+        self._meta = meta
+        self._arrays = arrays
+        self._node_index = None
+
+    @property
+    def dir_path(self) -> Path:
+        return self._dir_path
+
+    @property
+    def fetch_start_datetime(self) -> datetime:
+        value = self._meta['fetch_start_datetime']
+        return datetime.fromisoformat(value) if value else None
+
+    @property
+    def node_ids(self) -> np.ndarray:
+        return self._arrays['node_ids']
+
+    @property
+    def indptr(self) -> np.ndarray:
+        return self._arrays['indptr']
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self._arrays['indices']
+
+    @property
+    def weights(self) -> np.ndarray:
+        return self._arrays['weights']
+
+    @property
+    def has_attributes(self) -> np.ndarray:
+        """
+        基本情報を持つノード（属性が設定されているノード）かどうかの配列
+        """
+        return self._arrays['has_attributes']
+
+    @property
+    def attribute_names(self) -> list:
+        return [column['name'] for column in self._meta['attributes']]
+
+    @property
+    def metric_names(self) -> list:
+        """
+        すべてのノードが持つ数値の指標（graph_analyticsで計算した次数やPageRankなど）の名前
+        """
+        return self._meta.get('metrics', [])
+
+    @property
+    def positions(self) -> np.ndarray:
+        """
+        ノードの座標(x, y)の配列。座標のないノードはNaN、座標を保存していない場合はNone
+        """
+        return self._arrays.get('positions')
+
+    def number_of_nodes(self) -> int:
+        return self._meta['node_count']
+
+    def number_of_edges(self) -> int:
+        return self._meta['edge_count']
+
+    def attribute(self, name: str) -> np.ndarray:
+        """
+        ノードの属性の配列を返す。文字列の欠損は空文字列、日付の欠損はNaTになっている
+        欠損かどうかはattribute_missing(name)で判定する
+        """
+        return self._arrays['attribute_{}'.format(self.attribute_names.index(name))]
+
+    def attribute_missing(self, name: str) -> np.ndarray:
+        return self._arrays['attribute_{}_missing'.format(self.attribute_names.index(name))]
+
+    def metric(self, name: str) -> np.ndarray:
+        return self._arrays['metric_{}'.format(self.metric_names.index(name))]
+
+    def node_index(self, pep_id: str) -> int:
+        if self._node_index is None:
+            self._node_index = {str(x): i for i, x in enumerate(self.node_ids)}
+        return self._node_index[pep_id]
+
+    def successors(self, pep_id: str) -> list:
+        i = self.node_index(pep_id)
+        return [str(x) for x in self.node_ids[self.indices[self.indptr[i]:self.indptr[i + 1]]]]
+
+    def node_attributes(self, pep_id: str) -> dict:
+        i = self.node_index(pep_id)
+        if not self.has_attributes[i]:
+            return {}
+        return {name: self._attribute_value(column_index, i)
+                for column_index, name in enumerate(self.attribute_names)}
+
+    def _attribute_value(self, column_index: int, i: int):
+        column = self._meta['attributes'][column_index]
+        is_datetime = column['kind'] == 'datetime'
+        if self._arrays['attribute_{}_missing'.format(column_index)][i]:
+            return pd.NaT if is_datetime else np.nan
+        value = self._arrays['attribute_{}'.format(column_index)][i]
+        return pd.Timestamp(value) if is_datetime else str(value)
+
+    def to_networkx(self, include_metrics: bool = True, include_positions: bool = True) -> nx.DiGraph:
+        """
+        make_pep_graphで作成したものと同じnetworkxのグラフに変換する
+        :param include_metrics: Trueの場合は、指標もノードの属性に設定する
+        :param include_positions: Trueの場合は、座標もノードの属性positionに設定する
+        """
+        graph = nx.DiGraph()
+        node_ids = [str(x) for x in self.node_ids]
+        for i, pep_id in enumerate(node_ids):
+            if self.has_attributes[i]:
+                graph.add_node(pep_id, **{name: self._attribute_value(column_index, i)
+                                          for column_index, name in enumerate(self.attribute_names)})
+            else:
+                graph.add_node(pep_id)
+
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        for i, source_pep_id in enumerate(node_ids):
+            for j in range(indptr[i], indptr[i + 1]):
+                graph.add_edge(source_pep_id, node_ids[indices[j]], weight=int(weights[j]))
+
+        if include_metrics and self.metric_names:
+            for name in self.metric_names:
+                nx.set_node_attributes(graph, dict(zip(node_ids, self.metric(name).tolist())), name)
+            graph.graph['metric_names'] = list(self.metric_names)
+
+        if include_positions and self.positions is not None:
+            nx.set_node_attributes(graph, {pep_id: (float(x), float(y))
+                                           for pep_id, (x, y) in zip(node_ids, self.positions.tolist())
+                                           if x == x and y == y}, POSITION_ATTRIBUTE_NAME)
+
+        graph.graph['fetch_start_datetime'] = self.fetch_start_datetime
+        return graph
+
+
+def save_pep_graph(graph: nx.DiGraph, dir_path: str) -> Path:
+    """
+    グラフを、メモリマップで読み込める配列(.npy)とメタ情報(meta.json)のディレクトリとして保存する
+    graph.graph['metric_names']に名前のある属性は、基本情報とは別に指標の列として保存する
+    ノードの属性positionの座標も、基本情報とは別に座標の配列として保存する
+    :param graph: make_pep_graphで作成したグラフ
+    :param dir_path: 保存先のディレクトリのパス
+    :return: 保存先のディレクトリのパス
+    """
+    dir_path = Path(dir_path)
+    node_ids = list(graph.nodes)
+    metric_names = list(graph.graph.get('metric_names', []))
+    non_attribute_names = set(metric_names) | {POSITION_ATTRIBUTE_NAME}
+    node_index = {pep_id: i for i, pep_id in enumerate(node_ids)}
+
+    # エッジをCSR形式に変換する
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    indices = []
+    weights = []
+    for i, pep_id in enumerate(node_ids):
+        successors = sorted(graph.successors(pep_id), key=lambda x: node_index[x])
+        indices.extend(node_index[x] for x in successors)
+        weights.extend(graph.edges[pep_id, x].get('weight', 1) for x in successors)
+        indptr[i + 1] = len(indices)
+
+    arrays = dict(node_ids=np.array(node_ids, dtype=str),
+                  indptr=indptr,
+                  indices=np.array(indices, dtype=np.int32),
+                  weights=np.array(weights, dtype=np.int32),
+                  has_attributes=np.array([any(name not in non_attribute_names for name in graph.nodes[x])
+                                           for x in node_ids], dtype=bool))
+
+    # ノードの属性を列ごとの配列に変換する。属性名は最初に現れた順に並べる
+    attribute_names = []
+    for pep_id in node_ids:
+        for name in graph.nodes[pep_id]:
+            if name not in attribute_names and name not in non_attribute_names:
+                attribute_names.append(name)
+
+    attribute_columns = []
+    for column_index, name in enumerate(attribute_names):
+        values = [graph.nodes[x].get(name) for x in node_ids]
+        missing = np.array([_is_missing(x) for x in values], dtype=bool)
+        if _is_datetime_column(values):
+            kind = 'datetime'
+            array = pd.to_datetime(pd.Series(values, dtype=object)).to_numpy(dtype='datetime64[ns]')
+        else:
+            kind = 'str'
+            array = np.array(['' if _is_missing(x) else str(x) for x in values], dtype=str)
+        arrays['attribute_{}'.format(column_index)] = array
+        arrays['attribute_{}_missing'.format(column_index)] = missing
+        attribute_columns.append(dict(name=name, kind=kind))
+
+    for metric_index, name in enumerate(metric_names):
+        arrays['metric_{}'.format(metric_index)] = np.array([graph.nodes[x].get(name, np.nan) for x in node_ids],
+                                                            dtype=np.float64)
+
+    positions = [graph.nodes[x].get(POSITION_ATTRIBUTE_NAME) for x in node_ids]
+    if any(x is not None for x in positions):
+        arrays['positions'] = np.array([x if x is not None else (np.nan, np.nan) for x in positions],
+                                       dtype=np.float64).reshape(-1, 2)
+
+    fetch_start_datetime = graph.graph.get('fetch_start_datetime')
+    meta = dict(format_version=FORMAT_VERSION,
+                fetch_start_datetime=fetch_start_datetime.isoformat() if fetch_start_datetime else None,
+                node_count=len(node_ids),
+                edge_count=len(indices),
+                attributes=attribute_columns,
+                metrics=metric_names)
+
+    return write_array_dir(arrays, meta, dir_path)
+
+
+def write_array_dir(arrays: dict, meta: dict, dir_path: str) -> Path:
+    """
+    配列を<名前>.npy、メタ情報をmeta.jsonとしてディレクトリに保存する
+    一時ディレクトリに書き込んでから置き換えるので、書き込み途中のディレクトリが読まれることはない
+    """
+    dir_path = Path(dir_path)
+    os.makedirs(dir_path.parent, exist_ok=True)
+    work_dir_path = Path(tempfile.mkdtemp(prefix='.{}.'.format(dir_path.name), dir=dir_path.parent))
+    try:
+        for name, array in arrays.items():
+            np.save(work_dir_path / '{}.npy'.format(name), array, allow_pickle=False)
+        with (work_dir_path / META_FILE_NAME).open(mode='w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        if dir_path.exists():
+            shutil.rmtree(dir_path)
+        os.replace(work_dir_path, dir_path)
+    except BaseException:
+        shutil.rmtree(work_dir_path, ignore_errors=True)
+        raise
+
+    return dir_path
+
+
+def read_array_dir(dir_path: str, format_version: int, mmap: bool = True) -> (dict, dict):
+    """
+    write_array_dirで保存したディレクトリから、メタ情報と配列を読み込む
+    :param format_version: 想定する保存形式のバージョン。meta.jsonのformat_versionと異なる場合は例外を投げる
+    :param mmap: Trueの場合は配列をメモリマップで読み込む
+    :return: メタ情報と、名前ごとの配列の辞書
+    """
+    dir_path = Path(dir_path)
+    with (dir_path / META_FILE_NAME).open(mode='r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    if meta.get('format_version') != format_version:
+        raise ValueError('Unsupported format version: {} (expected {})'.format(
+            meta.get('format_version'), format_version))
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {path.stem: np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+              for path in dir_path.glob('*.npy')}
+    return meta, arrays
+
+
+def load_pep_graph_snapshot(dir_path: str, mmap: bool = True) -> PepGraphSnapshot:
+    """
+    save_pep_graphで保存したグラフを、読み取り専用のビューとして読み込む
+    :param dir_path: 保存先のディレクトリのパス
+    :param mmap: Trueの場合は配列をメモリマップで読み込む
+    :return: グラフのビュー
+    """
+    meta, arrays = read_array_dir(dir_path, FORMAT_VERSION, mmap)
+    return PepGraphSnapshot(dir_path, meta, arrays)
+
+
+def load_pep_graph(dir_path: str, include_metrics: bool = True,
+                   include_positions: bool = True) -> nx.DiGraph:
+    """
+    save_pep_graphで保存したグラフを、networkxのグラフとして読み込む
+    :param include_metrics: Trueの場合は、指標もノードの属性に設定する
+    :param include_positions: Trueの場合は、座標もノードの属性positionに設定する
+    """
+    return load_pep_graph_snapshot(dir_path).to_networkx(include_metrics, include_positions)
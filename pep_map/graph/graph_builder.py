@@ -0,0 +1,182 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# PEP 0 は目次なので除外する
+EXCLUDED_PEP_IDS = ('0000',)
+
+
+class StreamingPepGraphBuilder:
+    """
+    iter_acquireで取得したレコードが届くたびに、ノードとエッジをグラフに追加するビルダー
+    build()で、make_pep_graph.make_pep_graphと同じ形のグラフを返す
+    """
+
+    def __init__(self, excluded_pep_ids: tuple = EXCLUDED_PEP_IDS) -> None:
+        self._excluded_pep_ids = set(excluded_pep_ids)
+        self._graph = nx.DiGraph()
+        self._header_pep_ids = []
+        self._attribute_names = []
+
+    @property
+    def graph(self) -> nx.DiGraph:
+        return self._graph
+
+    def add_record(self, pep_id: str, record: dict) -> None:
+        """
+        PepHeaderAndLinkAcquirerのレコード（headerとlinkを持つ辞書）を追加する
+        """
+        self.add_header(pep_id, record['header'])
+        self.add_links(pep_id, record['link'])
+
+    def add_header(self, pep_id: str, header_dict: dict) -> None:
+        """
+        PepHeaderAcquirerのレコードを、ノードの属性として追加する
+        """
+        if pep_id in self._excluded_pep_ids:
+            return
+        self._graph.add_node(pep_id, **header_dict)
+        self._header_pep_ids.append(pep_id)
+        for attribute_name in header_dict:
+            if attribute_name not in self._attribute_names:
+                self._attribute_names.append(attribute_name)
+
+    def add_links(self, pep_id: str, link_counter: dict) -> None:
+        """
+        PepLinkDestinationAcquirerのレコードを、リンク数を重みとしたエッジとして追加する
+        """
+        if pep_id in self._excluded_pep_ids:
+            return
+        self._graph.add_node(pep_id)
+        for destination_pep_id, count in link_counter.items():
+            if destination_pep_id in self._excluded_pep_ids or not count:
+                continue
+            self._graph.add_edge(pep_id, destination_pep_id, weight=int(count))
+
+    def build(self, fetch_start_datetime=None) -> nx.DiGraph:
+        """
+        ノードをPEPの番号順に並べ直し、基本情報がないフィールドを欠損値で埋めたグラフを返す
+        :param fetch_start_datetime: グラフの属性に設定するデータ取得日時
+        :return: PEPのグラフ
+        """
+        graph = nx.DiGraph()
+        header_pep_ids = set(self._header_pep_ids)
+        for pep_id in sorted(self._graph.nodes):
+            attributes = dict(self._graph.nodes[pep_id])
+            if pep_id in header_pep_ids:
+                # DataFrameを経由した場合と同じく、基本情報を持つノードにはすべての列を設定する
+                for attribute_name in self._attribute_names:
+                    if attribute_name not in attributes:
+                        attributes[attribute_name] = pd.NaT if attribute_name == 'Created_dt' else np.nan
+            graph.add_node(pep_id, **attributes)
+
+        for source, target in sorted(self._graph.edges):
+            graph.add_edge(source, target, **self._graph.edges[source, target])
+
+        graph.graph['fetch_start_datetime'] = fetch_start_datetime
+        return graph
+
+
+def make_pep_graph_from_records(link_records: dict,
+                                header_records: dict = None,
+                                fetch_start_datetime=None) -> nx.DiGraph:
+    """
+    PEPごとのリンク数の辞書から、隣接行列を経由せずにグラフを作成する
+    ノード・エッジ・属性はmake_pep_graph.to_adjacency_matrixを経由した場合と同じになる
+    （PEP 0を除き、リンク元とリンク先のすべてのPEPをノードとし、リンク数をエッジの重みとする）
+    :param link_records: PepLinkDestinationAcquirerのdata（リンク元のPEPごとの、リンク先のPEPとリンク数の辞書）
+    :param header_records: PepHeaderAcquirerのdata（PEPごとの基本情報の辞書）
+    :param fetch_start_datetime: グラフの属性に設定するデータ取得日時
+    :return: PEPのグラフ
+    """
+    builder = StreamingPepGraphBuilder()
+    for pep_id, link_counter in link_records.items():
+        builder.add_links(pep_id, link_counter)
+
+    # 基本情報は、リンク元かリンク先としてグラフに含まれるPEPにだけ設定する
+    for pep_id, header_dict in (header_records or {}).items():
+        if pep_id in builder.graph:
+            builder.add_header(pep_id, header_dict)
+
+    return builder.build(fetch_start_datetime)
+
+
+def make_pep_graph_from_edge_list(edge_df: pd.DataFrame,
+                                  header_df: pd.DataFrame = None,
+                                  fetch_start_datetime=None) -> nx.DiGraph:
+    """
+    縦持ちのリンク数(link_source_pep_id, link_destination_pep_id, count)からグラフを作成する
+    リンクを1つも持たないPEPは縦持ちの形式に含まれないので、基本情報のあるPEPもノードとして追加する
+    :param edge_df: PepLinkDestinationAcquirer.to_edge_list_dataframeの形式のDataFrame
+    :param header_df: PepHeaderAcquirer.to_dataframeの形式のDataFrame
+    :param fetch_start_datetime: グラフの属性に設定するデータ取得日時
+    :return: PEPのグラフ
+    """
+    header_records = header_records_from_dataframe(header_df) if header_df is not None else {}
+    link_records = {pep_id: {} for pep_id in header_records}
+    for source_pep_id, destination_pep_id, count in edge_df[['link_source_pep_id',
+                                                             'link_destination_pep_id',
+                                                             'count']].itertuples(index=False):
+        link_records.setdefault(source_pep_id, {})[destination_pep_id] = count
+
+    return make_pep_graph_from_records(link_records, header_records, fetch_start_datetime)
+
+
+def link_records_from_dataframe(link_df: pd.DataFrame) -> dict:
+    """
+    隣接行列の形式のリンク数のDataFrameから、0でないセルだけを取り出してPEPごとの辞書に戻す
+    """
+    link_records = {pep_id: {} for pep_id in link_df.index}
+    stacked = link_df.fillna(0).stack()
+    for (source_pep_id, destination_pep_id), count in stacked[stacked != 0].items():
+        link_records[source_pep_id][destination_pep_id] = int(count)
+    return link_records
+
+
+def header_records_from_dataframe(header_df: pd.DataFrame) -> dict:
+    """
+    基本情報のDataFrameから、PEPごとの辞書に戻す。欠損値はそのまま残す
+    """
+    return header_df.to_dict(orient='index')
+
+
+def diff_pep_graphs(expected: nx.DiGraph, actual: nx.DiGraph,
+                    ignore_node_order: bool = False) -> list:
+    """
+    2つのグラフのノード・エッジの重み・ノードの属性を比較する
+    :param ignore_node_order: Trueの場合はノードの並び順の違いを差分としない
+    :return: 差分の説明のリスト。同じグラフであれば空のリスト
+    """
+    def is_same_value(x, y) -> bool:
+        if x != x and y != y:  # NaN, NaT同士は同じとみなす
+            return True
+        return x == y
+
+    differences = []
+    if list(expected.nodes) != list(actual.nodes):
+        missing = sorted(set(expected.nodes) - set(actual.nodes))
+        unexpected = sorted(set(actual.nodes) - set(expected.nodes))
+        if missing or unexpected:
+            differences.append('nodes: missing {}, unexpected {}'.format(missing, unexpected))
+        elif not ignore_node_order:
+            differences.append('nodes: order differs')
+
+    expected_edges = {(u, v): data.get('weight') for u, v, data in expected.edges(data=True)}
+    actual_edges = {(u, v): data.get('weight') for u, v, data in actual.edges(data=True)}
+    for edge in sorted(set(expected_edges) | set(actual_edges)):
+        if expected_edges.get(edge) != actual_edges.get(edge):
+            differences.append('edge {}: weight {} != {}'.format(
+                edge, expected_edges.get(edge), actual_edges.get(edge)))
+
+    for pep_id in expected.nodes:
+        if pep_id not in actual.nodes:
+            continue
+        expected_attributes = expected.nodes[pep_id]
+        actual_attributes = actual.nodes[pep_id]
+        for name in sorted(set(expected_attributes) | set(actual_attributes)):
+            x = expected_attributes.get(name, 'missing')
+            y = actual_attributes.get(name, 'missing')
+            if not is_same_value(x, y):
+                differences.append('node {} attribute {}: {!r} != {!r}'.format(pep_id, name, x, y))
+
+    return differences
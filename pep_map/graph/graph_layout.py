@@ -0,0 +1,315 @@
+import hashlib
+import os
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+
+from graph.graph_artifact import PepGraphSnapshot
+
+# 計算方法やパラメータの既定値を変えたときは、この値を増やして古いキャッシュを使わないようにする
+LAYOUT_VERSION = 1
+
+# 1つ上の階層の近傍3x3セルの子セル（6x6）。ここから自分の近傍3x3セルを除いたものが相互作用リストになる
+_CHILD_OFFSETS = np.array([(2 * dx + ox, 2 * dy + oy)
+                           for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                           for ox in (0, 1) for oy in (0, 1)])
+_NEIGHBOR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+
+
+def _graph_arrays(pep_graph) -> (list, np.ndarray, np.ndarray, np.ndarray):
+    """
+    networkxのグラフかPepGraphSnapshotから、ノードの番号のリストと、エッジのリンク元・リンク先・重みの配列を取り出す
+    """
+    if isinstance(pep_graph, PepGraphSnapshot):
+        node_ids = [str(x) for x in pep_graph.node_ids]
+        sources = np.repeat(np.arange(len(node_ids)), np.diff(pep_graph.indptr))
+        return node_ids, sources, np.asarray(pep_graph.indices), np.asarray(pep_graph.weights)
+
+    node_ids = list(pep_graph.nodes)
+    node_index = {pep_id: i for i, pep_id in enumerate(node_ids)}
+    edges = [(node_index[u], node_index[v], data.get('weight', 1)) for u, v, data in pep_graph.edges(data=True)]
+    edge_array = np.array(edges, dtype=np.int64).reshape(-1, 3)
+    return node_ids, edge_array[:, 0], edge_array[:, 1], edge_array[:, 2]
+
+
+def calc_graph_hash(pep_graph) -> str:
+    """
+    ノードとエッジ（重みを含む）から、グラフの構造のハッシュ値を計算する。ノードの属性や並び順は含めない
+    :param pep_graph: networkxのグラフかPepGraphSnapshot
+    :return: SHA-1の16進数の文字列
+    """
+    node_ids, sources, targets, weights = _graph_arrays(pep_graph)
+    h = hashlib.sha1()
+    h.update('\n'.join(sorted(str(x) for x in node_ids)).encode('utf-8'))
+    edges = sorted((node_ids[u], node_ids[v], int(w)) for u, v, w in zip(sources, targets, weights))
+    for source, target, weight in edges:
+        h.update('\n{} {} {}'.format(source, target, weight).encode('utf-8'))
+    return h.hexdigest()
+
+
+class LayoutCache:
+    """
+    グラフのハッシュ値ごとに、計算済みのノードの座標を保存するディスクキャッシュ
+    キーごとに、ノードの番号と座標の配列を.npzとして保存する
+    """
+
+    def __init__(self, cache_dir_path: str) -> None:
+        self._cache_dir_path = Path(cache_dir_path)
+        os.makedirs(self._cache_dir_path, exist_ok=True)
+
+    @property
+    def cache_dir_path(self) -> Path:
+        return self._cache_dir_path
+
+    def _entry_path(self, key: str) -> Path:
+        return self._cache_dir_path / '{}.npz'.format(key)
+
+    def load(self, key: str) -> dict:
+        """
+        :return: PEPの番号ごとの座標(x, y)の辞書。キャッシュがなければNone
+        """
+        path = self._entry_path(key)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as npz:
+            return {str(pep_id): (float(x), float(y))
+                    for pep_id, (x, y) in zip(npz['node_ids'], npz['positions'])}
+
+    def store(self, key: str, positions: dict) -> None:
+        path = self._entry_path(key)
+        node_ids = list(positions)
+        # 並行して読まれても壊れないように、一時ファイルに書いてから置き換える
+        tmp_path = path.with_name('{}.{}.tmp.npz'.format(path.stem, os.getpid()))
+        np.savez(tmp_path,
+                 node_ids=np.array(node_ids, dtype=str),
+                 positions=np.array([positions[x] for x in node_ids], dtype=np.float64).reshape(-1, 2))
+        os.replace(str(tmp_path), str(path))
+
+
+def _occupied_cells(unit_positions: np.ndarray, grid_size: int) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """
+    ノードが入っているセルだけを列挙する。細かい格子でもセルの数の配列を作らないで済む
+    :return: ノードごとのセルの座標、セルのキー（昇順）、ノードごとのセルの位置、セルごとのノードの数
+    """
+    cells = np.minimum((unit_positions * grid_size).astype(np.int64), grid_size - 1)
+    keys = cells[:, 0] * grid_size + cells[:, 1]
+    cell_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return cells, cell_keys, inverse.reshape(-1), counts
+
+
+def _lookup_cells(cell_keys: np.ndarray, candidate_x: np.ndarray, candidate_y: np.ndarray,
+                  grid_size: int) -> np.ndarray:
+    """
+    セルの座標の配列から、_occupied_cellsのセルの位置を引く。格子の外のセルと空のセルは-1にする
+    """
+    in_grid = (candidate_x >= 0) & (candidate_x < grid_size) & (candidate_y >= 0) & (candidate_y < grid_size)
+    keys = candidate_x * grid_size + candidate_y
+    found = np.minimum(np.searchsorted(cell_keys, keys), len(cell_keys) - 1)
+    return np.where(in_grid & (cell_keys[found] == keys), found, -1)
+
+
+def _sum_forces(positions: np.ndarray, other_x: np.ndarray, other_y: np.ndarray,
+                strength: np.ndarray) -> np.ndarray:
+    """
+    ノードごとに、相手の座標(other_x, other_y)から受ける斥力 strength / 距離^2 * 差分 を合計する
+    """
+    delta_x = positions[:, 0, None] - other_x
+    delta_y = positions[:, 1, None] - other_y
+    scale = strength / np.maximum(delta_x * delta_x + delta_y * delta_y, 1e-12)
+    return np.stack([(scale * delta_x).sum(axis=1), (scale * delta_y).sum(axis=1)], axis=1)
+
+
+def _calc_repulsion(positions: np.ndarray, k: float, depth: int,
+                    max_cell_size: int = 8, max_depth: int = 16) -> np.ndarray:
+    """
+    すべてのノードの組の斥力(k^2/距離)を、格子によるBarnes–Hut近似で計算する
+    粗い格子から順に、離れたセルからの斥力はセルの重心にまとめて計算し、
+    最も細かい格子で隣接するセルのノードとの斥力だけを1組ずつ計算する
+    ノードが密集して1つのセルに入るノードが多すぎる場合は、格子をさらに細かくする
+    """
+    node_count = len(positions)
+    lower = positions.min(axis=0)
+    extent = max(float((positions.max(axis=0) - lower).max()), 1e-9) * (1 + 1e-9)
+    unit_positions = (positions - lower) / extent
+    force = np.zeros_like(positions)
+
+    while depth < max_depth and _occupied_cells(unit_positions, 2 ** depth)[3].max() > max_cell_size:
+        depth += 1
+
+    for level in range(2, depth + 1):
+        grid_size = 2 ** level
+        cells, cell_keys, inverse, counts = _occupied_cells(unit_positions, grid_size)
+        centroids = np.stack([np.bincount(inverse, weights=positions[:, axis])
+                              for axis in (0, 1)], axis=1) / counts[:, None]
+
+        candidate_x = (cells[:, 0, None] // 2) * 2 + _CHILD_OFFSETS[None, :, 0]
+        candidate_y = (cells[:, 1, None] // 2) * 2 + _CHILD_OFFSETS[None, :, 1]
+        found = _lookup_cells(cell_keys, candidate_x, candidate_y, grid_size)
+        is_far = ((np.abs(candidate_x - cells[:, 0, None]) > 1)
+                  | (np.abs(candidate_y - cells[:, 1, None]) > 1))
+        valid = (found >= 0) & is_far
+        found = np.maximum(found, 0)
+        force += _sum_forces(positions, centroids[found, 0], centroids[found, 1],
+                             np.where(valid, k * k * counts[found], 0))
+
+    # 最も細かい格子の近傍3x3セルにあるノードとは、1組ずつ計算する
+    grid_size = 2 ** depth
+    cells, cell_keys, inverse, counts = _occupied_cells(unit_positions, grid_size)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    # セルごとのノードの表。空のセル(-1)は、常に空の最後の行を参照する
+    table = np.full((len(cell_keys) + 1, counts.max()), -1, dtype=np.int64)
+    table[inverse[order], np.arange(node_count) - starts[inverse[order]]] = order
+
+    found = _lookup_cells(cell_keys,
+                          cells[:, 0, None] + _NEIGHBOR_OFFSETS[None, :, 0],
+                          cells[:, 1, None] + _NEIGHBOR_OFFSETS[None, :, 1],
+                          grid_size)
+    others = table[found].reshape(node_count, -1)
+    valid = (others >= 0) & (others != np.arange(node_count)[:, None])
+    others = np.maximum(others, 0)
+    force += _sum_forces(positions, positions[others, 0], positions[others, 1],
+                         np.where(valid, k * k, 0))
+    return force
+
+
+def barnes_hut_layout(node_count: int,
+                      sources: np.ndarray,
+                      targets: np.ndarray,
+                      weights: np.ndarray = None,
+                      initial_positions: np.ndarray = None,
+                      iterations: int = 100,
+                      initial_temperature: float = 0.1,
+                      gravity: float = 1.0,
+                      seed: int = 0) -> np.ndarray:
+    """
+    Fruchterman–Reingold法の力学モデルで、ノードの座標を計算する
+    斥力は格子によるBarnes–Hut近似で計算するので、1回の反復はO(N log N)で済む
+    :param node_count: ノードの数
+    :param sources: エッジのリンク元のノードの位置の配列
+    :param targets: エッジのリンク先のノードの位置の配列
+    :param weights: エッジの重み（リンク数）の配列。引力は1 + log(重み)倍にする
+    :param initial_positions: (ノードの数, 2)の初期座標。省略した場合は乱数で配置する
+    :param iterations: 反復回数
+    :param initial_temperature: 1回の反復で動かす距離の上限の初期値。反復ごとに0まで線形に下げる
+    :param gravity: ノードを中心に引き寄せる力の強さ。つながっていないノードが離れていかないようにする
+    :param seed: 乱数のシード
+    :return: (ノードの数, 2)の座標の配列
+    """
+    rng = np.random.RandomState(seed)
+    if initial_positions is None:
+        positions = rng.rand(node_count, 2)
+    else:
+        positions = np.array(initial_positions, dtype=np.float64)
+    if node_count < 2:
+        return positions
+
+    k = 1 / np.sqrt(node_count)
+    # 最も細かい格子で、1つのセルに平均1個程度のノードが入るようにする
+    depth = int(min(max(2, np.ceil(np.log(node_count) / np.log(4))), 10))
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    not_loop = sources != targets
+    sources, targets = sources[not_loop], targets[not_loop]
+    edge_factors = (np.ones(len(sources)) if weights is None
+                    else 1 + np.log(np.maximum(np.asarray(weights, dtype=np.float64)[not_loop], 1)))
+
+    # 同じ座標のノードがあると斥力の向きが決まらないので、わずかにずらしておく
+    positions += rng.normal(scale=k * 1e-3, size=positions.shape)
+
+    for temperature in np.linspace(initial_temperature, 0, iterations, endpoint=False):
+        force = _calc_repulsion(positions, k, depth)
+
+        delta = positions[sources] - positions[targets]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+        attraction = (distance * edge_factors / k)[:, None] * delta
+        for axis in (0, 1):
+            force[:, axis] -= np.bincount(sources, weights=attraction[:, axis], minlength=node_count)
+            force[:, axis] += np.bincount(targets, weights=attraction[:, axis], minlength=node_count)
+
+        force -= gravity * (positions - positions.mean(axis=0)) / k * 0.01
+
+        length = np.maximum(np.sqrt((force ** 2).sum(axis=1)), 1e-9)
+        positions += force * (np.minimum(length, temperature) / length)[:, None]
+
+    return positions
+
+
+def _warm_start_positions(node_ids: list, sources: np.ndarray, targets: np.ndarray,
+                          previous_positions: dict, seed: int) -> np.ndarray:
+    """
+    前回の座標を初期座標にする。新しいノードは、前回の座標があるノードのうち隣接するものの重心に置く
+    """
+    rng = np.random.RandomState(seed)
+    positions = np.full((len(node_ids), 2), np.nan)
+    for i, pep_id in enumerate(node_ids):
+        if pep_id in previous_positions:
+            positions[i] = previous_positions[pep_id]
+
+    placed = ~np.isnan(positions[:, 0])
+    if not placed.any():
+        return rng.rand(len(node_ids), 2)
+    lower = positions[placed].min(axis=0)
+    upper = positions[placed].max(axis=0)
+    scale = max(float((upper - lower).max()), 1e-9)
+
+    neighbor_sum = np.zeros((len(node_ids), 2))
+    neighbor_count = np.zeros(len(node_ids))
+    for u, v in ((sources, targets), (targets, sources)):
+        known = placed[v]
+        np.add.at(neighbor_sum, u[known], positions[v[known]])
+        np.add.at(neighbor_count, u[known], 1)
+
+    for i in np.flatnonzero(~placed):
+        if neighbor_count[i]:
+            positions[i] = neighbor_sum[i] / neighbor_count[i]
+        else:
+            positions[i] = lower + rng.rand(2) * (upper - lower)
+        positions[i] += rng.normal(scale=scale * 0.01, size=2)
+    return positions
+
+
+def layout_pep_graph(pep_graph,
+                     previous_positions: dict = None,
+                     cache: LayoutCache = None,
+                     iterations: int = None,
+                     seed: int = 0) -> dict:
+    """
+    グラフのノードの座標を計算する。networkxのグラフの場合は、ノードの属性positionにも設定する
+    :param pep_graph: networkxのグラフかPepGraphSnapshot
+    :param previous_positions: 前回のスナップショットのPEPの番号ごとの座標の辞書
+                               指定した場合は、前回の座標から少しだけ動かすので、配置がほぼ変わらない
+    :param cache: 指定した場合は、同じ構造のグラフの計算結果を再利用し、計算結果を保存する
+    :param iterations: 反復回数。省略した場合は、新しく配置するときは100回、前回の座標から始めるときは30回
+    :param seed: 乱数のシード
+    :return: PEPの番号ごとの座標(x, y)の辞書
+    """
+    node_ids, sources, targets, weights = _graph_arrays(pep_graph)
+    if not node_ids:
+        # 前回の座標から始める場合は、空の配列の大きさを求められないので、計算せずに返す
+        return {}
+    key = '{}-v{}-{}'.format(calc_graph_hash(pep_graph), LAYOUT_VERSION, seed) if cache else None
+    positions = cache.load(key) if cache else None
+
+    if positions is None or set(positions) != set(node_ids):
+        if previous_positions:
+            initial_positions = _warm_start_positions(node_ids, sources, targets, previous_positions, seed)
+            # 前回の配置の大きさに合わせて、動かす距離を小さくする
+            scale = float(np.ptp(initial_positions, axis=0).max()) or 1.0
+            position_array = barnes_hut_layout(len(node_ids), sources, targets, weights,
+                                               initial_positions=initial_positions,
+                                               iterations=iterations or 30,
+                                               initial_temperature=0.01 * scale,
+                                               seed=seed)
+        else:
+            position_array = barnes_hut_layout(len(node_ids), sources, targets, weights,
+                                               iterations=iterations or 100,
+                                               seed=seed)
+        positions = {pep_id: (float(x), float(y)) for pep_id, (x, y) in zip(node_ids, position_array)}
+        if cache:
+            cache.store(key, positions)
+
+    if isinstance(pep_graph, nx.Graph):
+        nx.set_node_attributes(pep_graph, positions, 'position')
+    return positions
@@ -0,0 +1,170 @@
+import json
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from graph.graph_builder import EXCLUDED_PEP_IDS
+
+
+def _is_missing(value) -> bool:
+    return value is None or value != value  # NaN, NaT
+
+
+def _is_same_value(x, y) -> bool:
+    if _is_missing(x) and _is_missing(y):
+        return True
+    return x == y
+
+
+def _missing_value(attribute_name: str):
+    return pd.NaT if attribute_name == 'Created_dt' else np.nan
+
+
+def _to_json_value(value):
+    if _is_missing(value):
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def make_empty_change_report() -> dict:
+    """
+    update_pep_graphが返す変更内容の辞書
+    added_nodes, removed_nodes: 追加・削除されたPEPの番号のリスト
+    added_edges, removed_edges: [リンク元, リンク先, リンク数]のリスト
+    changed_edges: [リンク元, リンク先, 変更前のリンク数, 変更後のリンク数]のリスト
+    changed_attributes: PEPの番号ごとの、{属性名: [変更前の値, 変更後の値]}の辞書
+    """
+    return dict(added_nodes=[], removed_nodes=[],
+                added_edges=[], removed_edges=[], changed_edges=[],
+                changed_attributes={})
+
+
+def change_report_to_json(change_report: dict) -> str:
+    """
+    変更内容を公開用のJSON文字列に変換する。欠損値はnull、日付はISO形式の文字列にする
+    """
+    changed_attributes = {pep_id: {name: [_to_json_value(x) for x in values]
+                                   for name, values in attributes.items()}
+                          for pep_id, attributes in change_report['changed_attributes'].items()}
+    report = dict(change_report, changed_attributes=changed_attributes)
+    return json.dumps(report, ensure_ascii=False, indent=2)
+
+
+def update_pep_graph(pep_graph: nx.DiGraph,
+                     records: dict,
+                     changeset: dict,
+                     fetch_start_datetime=None,
+                     excluded_pep_ids: tuple = EXCLUDED_PEP_IDS) -> dict:
+    """
+    前回のグラフを、追加・削除・変更されたPEPのレコードだけで書き換える
+    書き換えた結果は、今回のすべてのレコードからmake_pep_graph_from_recordsで作り直したグラフと
+    （ノードの並び順を除いて）同じになる。ただし、すべてのPEPからなくなったフィールドは属性に残る
+    :param pep_graph: 前回のグラフ。このグラフ自体を書き換える
+    :param records: PepHeaderAndLinkAcquirerのdata（headerとlinkを持つPEPごとの辞書）
+                    added, changedのPEPのレコードが含まれていればよい
+    :param changeset: PepAcquirer.changeset（added, removed, changedをキーとしたPEPの番号のリストの辞書）
+    :param fetch_start_datetime: グラフの属性に設定するデータ取得日時
+    :param excluded_pep_ids: グラフに含めないPEPの番号
+    :return: 変更内容（make_empty_change_reportの形式）
+    """
+    excluded_pep_ids = set(excluded_pep_ids)
+    report = make_empty_change_report()
+    updated_pep_ids = [pep_id for pep_id in changeset['added'] + changeset['changed']
+                       if pep_id not in excluded_pep_ids]
+    removed_pep_ids = [pep_id for pep_id in changeset['removed']
+                       if pep_id not in excluded_pep_ids]
+
+    # 既存のノードが持つ属性名。基本情報を持つノードはすべての列を持っている
+    attribute_names = []
+    for pep_id in pep_graph.nodes:
+        if pep_graph.nodes[pep_id]:
+            attribute_names = list(pep_graph.nodes[pep_id])
+            break
+
+    old_nodes = set(pep_graph.nodes)
+    old_attributes = {}
+    # リンク先が減ったPEPは、ほかからリンクされていなければノードから削除する候補になる
+    orphan_candidates = set()
+
+    def set_node_attributes(pep_id: str, attributes: dict) -> None:
+        node = pep_graph.nodes[pep_id]
+        old_attributes.setdefault(pep_id, dict(node))
+        node.clear()
+        node.update(attributes)
+
+    def set_out_edges(pep_id: str, link_counter: dict) -> None:
+        new_edges = {destination_pep_id: int(count) for destination_pep_id, count in link_counter.items()
+                     if destination_pep_id not in excluded_pep_ids and count}
+        for destination_pep_id in list(pep_graph.successors(pep_id)):
+            old_count = pep_graph.edges[pep_id, destination_pep_id].get('weight')
+            if destination_pep_id not in new_edges:
+                pep_graph.remove_edge(pep_id, destination_pep_id)
+                report['removed_edges'].append([pep_id, destination_pep_id, old_count])
+                orphan_candidates.add(destination_pep_id)
+            elif new_edges[destination_pep_id] != old_count:
+                pep_graph.edges[pep_id, destination_pep_id]['weight'] = new_edges[destination_pep_id]
+                report['changed_edges'].append([pep_id, destination_pep_id,
+                                                old_count, new_edges[destination_pep_id]])
+        for destination_pep_id, count in new_edges.items():
+            if not pep_graph.has_edge(pep_id, destination_pep_id):
+                pep_graph.add_edge(pep_id, destination_pep_id, weight=count)
+                report['added_edges'].append([pep_id, destination_pep_id, count])
+
+    # 削除されたPEPは、リンク先と基本情報を取り除く（ほかのPEPからのリンクは残る）
+    for pep_id in removed_pep_ids:
+        if pep_id not in pep_graph:
+            continue
+        set_out_edges(pep_id, {})
+        set_node_attributes(pep_id, {})
+        orphan_candidates.add(pep_id)
+
+    # 追加・変更されたPEPは、リンク先と基本情報を置き換える
+    for pep_id in updated_pep_ids:
+        record = records[pep_id]
+        pep_graph.add_node(pep_id)
+        set_out_edges(pep_id, record['link'])
+        for attribute_name in record['header']:
+            if attribute_name not in attribute_names:
+                attribute_names.append(attribute_name)
+        set_node_attributes(pep_id, dict(record['header']))
+
+    # 新しいフィールドが現れた場合は、基本情報を持つすべてのノードを欠損値で埋める
+    updated = set(updated_pep_ids)
+    for pep_id in pep_graph.nodes:
+        node = pep_graph.nodes[pep_id]
+        if not node and pep_id not in updated:
+            continue
+        for attribute_name in attribute_names:
+            if attribute_name not in node:
+                old_attributes.setdefault(pep_id, dict(node))
+                node[attribute_name] = _missing_value(attribute_name)
+
+    # リンク元でもリンク先でもなくなったPEPのノードを削除する
+    # 基本情報もリンク先もなく、ほかからもリンクされていないノードは、今回取得したPEPではない
+    for pep_id in sorted(orphan_candidates - updated):
+        if (pep_id in pep_graph and not pep_graph.nodes[pep_id]
+                and pep_graph.degree(pep_id) == 0):
+            pep_graph.remove_node(pep_id)
+
+    report['added_nodes'] = sorted(set(pep_graph.nodes) - old_nodes)
+    report['removed_nodes'] = sorted(old_nodes - set(pep_graph.nodes))
+
+    for pep_id, before in sorted(old_attributes.items()):
+        if pep_id not in pep_graph or pep_id not in old_nodes:
+            continue
+        after = pep_graph.nodes[pep_id]
+        changes = {name: [before.get(name), after.get(name)]
+                   for name in list(before) + [x for x in after if x not in before]
+                   if not _is_same_value(before.get(name), after.get(name))}
+        if changes:
+            report['changed_attributes'][pep_id] = changes
+
+    if fetch_start_datetime is not None:
+        pep_graph.graph['fetch_start_datetime'] = fetch_start_datetime
+
+    return report
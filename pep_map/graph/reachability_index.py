@@ -0,0 +1,161 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csgraph
+
+from graph.graph_analytics import to_csr_matrix
+from graph.graph_artifact import read_array_dir, write_array_dir
+
+# 保存形式を変更したときは、この値を増やしてload_reachability_indexで読み分ける
+FORMAT_VERSION = 1
+K_HOP_DIR_NAME = 'pep_k_hop'
+
+
+def _smallest_int_dtype(max_value: int, signed: bool):
+    for dtype in ((np.int8, np.int16, np.int32, np.int64) if signed
+                  else (np.uint8, np.uint16, np.uint32, np.uint64)):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError('Too large value: {}'.format(max_value))
+
+
+class ReachabilityIndex:
+    """
+    PEPのリンクをたどって到達できるPEPと、その最短経路を引くための索引
+    到達可能性（推移閉包）はPEPごとにビット列に詰めて持ち、
+    最短距離と最短経路の1つ手前のPEP（リンクの数で数えたもの）は、値に合わせた最小の整数型の行列で持つ
+    """
+
+    def __init__(self, node_ids: list, arrays: dict, meta: dict) -> None:
+        self._node_ids = [str(x) for x in node_ids]
+        self._node_index = {pep_id: i for i, pep_id in enumerate(self._node_ids)}
+        self._arrays = arrays
+        self._meta = meta
+
+    @property
+    def node_ids(self) -> list:
+        return self._node_ids
+
+    @property
+    def unreachable_distance(self) -> int:
+        return self._meta['unreachable_distance']
+
+    def _index(self, pep_id: str) -> int:
+        return self._node_index[pep_id]
+
+    def _bits_to_pep_ids(self, packed_bits: np.ndarray) -> list:
+        bits = np.unpackbits(packed_bits)[:len(self._node_ids)]
+        return [self._node_ids[i] for i in np.flatnonzero(bits)]
+
+    def descendants(self, pep_id: str) -> list:
+        """
+        pep_idからリンクをたどって到達できるPEP（pep_id自身は含まない）
+        """
+        return self._bits_to_pep_ids(self._arrays['descendant_bits'][self._index(pep_id)])
+
+    def ancestors(self, pep_id: str) -> list:
+        """
+        リンクをたどってpep_idに到達できるPEP（pep_id自身は含まない）
+        """
+        return self._bits_to_pep_ids(self._arrays['ancestor_bits'][self._index(pep_id)])
+
+    def is_reachable(self, source_pep_id: str, target_pep_id: str) -> bool:
+        j = self._index(target_pep_id)
+        return bool(self._arrays['descendant_bits'][self._index(source_pep_id), j >> 3] & (0x80 >> (j & 7)))
+
+    def distance(self, source_pep_id: str, target_pep_id: str) -> int:
+        """
+        :return: 最短経路のリンクの数。到達できない場合はNone
+        """
+        value = int(self._arrays['distances'][self._index(source_pep_id), self._index(target_pep_id)])
+        return None if value == self.unreachable_distance else value
+
+    def path(self, source_pep_id: str, target_pep_id: str) -> list:
+        """
+        :return: source_pep_idからtarget_pep_idまでの最短経路のPEPのリスト（両端を含む）。到達できない場合はNone
+        """
+        i, j = self._index(source_pep_id), self._index(target_pep_id)
+        if self.distance(source_pep_id, target_pep_id) is None:
+            return None
+        predecessors = self._arrays['predecessors'][i]
+        path = [j]
+        while path[-1] != i:
+            path.append(int(predecessors[path[-1]]))
+        return [self._node_ids[x] for x in reversed(path)]
+
+    def k_hop(self, pep_id: str, k: int, direction: str = 'out') -> dict:
+        """
+        pep_idからk回以内のリンクでたどれるPEPと、そのリンクの数
+        :param direction: outはpep_idからのリンク、inはpep_idへのリンクをたどる
+        :return: PEPの番号ごとの、リンクの数（1以上k以下）の辞書
+        """
+        i = self._index(pep_id)
+        distances = self._arrays['distances']
+        row = distances[i] if direction == 'out' else distances[:, i]
+        hops = np.flatnonzero((row >= 1) & (row <= k))
+        return {self._node_ids[x]: int(row[x]) for x in hops}
+
+
+def build_reachability_index(pep_graph) -> ReachabilityIndex:
+    """
+    グラフから、すべてのPEPの組の最短距離・最短経路・到達可能性を計算する
+    PEPの数の2乗の大きさの行列を作るので、数千件程度までのグラフを想定している
+    :param pep_graph: networkxのグラフかPepGraphSnapshot
+    """
+    node_ids, matrix = to_csr_matrix(pep_graph)
+    node_count = len(node_ids)
+    distances, predecessors = csgraph.shortest_path(matrix, method='D', directed=True,
+                                                    unweighted=True, return_predecessors=True)
+
+    is_reachable = np.isfinite(distances)
+    np.fill_diagonal(is_reachable, False)
+    max_distance = int(distances[np.isfinite(distances)].max()) if node_count else 0
+    distance_dtype = _smallest_int_dtype(max_distance + 1, signed=False)
+    unreachable_distance = int(np.iinfo(distance_dtype).max)
+
+    arrays = dict(node_ids=np.array(node_ids, dtype=str),
+                  descendant_bits=np.packbits(is_reachable, axis=1),
+                  ancestor_bits=np.packbits(is_reachable.T, axis=1),
+                  distances=np.where(np.isfinite(distances), distances,
+                                     unreachable_distance).astype(distance_dtype),
+                  predecessors=np.where(predecessors < 0, -1,
+                                        predecessors).astype(_smallest_int_dtype(node_count, signed=True)))
+    meta = dict(format_version=FORMAT_VERSION,
+                node_count=node_count,
+                unreachable_distance=unreachable_distance)
+    return ReachabilityIndex(node_ids, arrays, meta)
+
+
+def save_reachability_index(index: ReachabilityIndex, dir_path: str) -> Path:
+    """
+    索引を、メモリマップで読み込める配列(.npy)とメタ情報(meta.json)のディレクトリとして保存する
+    """
+    return write_array_dir(index._arrays, index._meta, dir_path)
+
+
+def load_reachability_index(dir_path: str, mmap: bool = True) -> ReachabilityIndex:
+    meta, arrays = read_array_dir(dir_path, FORMAT_VERSION, mmap)
+    return ReachabilityIndex(arrays['node_ids'], arrays, meta)
+
+
+def write_k_hop_shards(index: ReachabilityIndex, out_dir_path: str, max_hops: int = 3) -> int:
+    """
+    PEPごとに、max_hops回以内のリンクでたどれるPEPをリンクの数ごとにまとめて<PEPの番号>.jsonに保存する
+    {"out": [[1回でたどれるPEP], [2回でたどれるPEP], ...], "in": [...]}の形式なので、
+    ページからは選択したPEPのファイルだけを取得して、すぐに強調表示できる
+    :return: 保存したファイルの数
+    """
+    os.makedirs(out_dir_path, exist_ok=True)
+    for pep_id in index.node_ids:
+        k_hop = {}
+        for direction in ('out', 'in'):
+            hops = [[] for _ in range(max_hops)]
+            for neighbor_pep_id, distance in sorted(index.k_hop(pep_id, max_hops, direction).items()):
+                hops[distance - 1].append(neighbor_pep_id)
+            k_hop[direction] = hops
+        path = Path(out_dir_path) / '{}.json'.format(pep_id)
+        with path.open(mode='w', encoding='utf-8') as f:
+            json.dump(k_hop, f, separators=(',', ':'))
+    return len(index.node_ids)
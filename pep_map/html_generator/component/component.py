@@ -1,3 +1,7 @@
+import json
+import os
+from pathlib import Path
+
 from bokeh.models import Div
 from bokeh.models.sources import ColumnDataSource
 from bokeh.layouts import column, row
@@ -24,8 +28,13 @@ def generate_node_data_source(source_graph: DiGraph) -> ColumnDataSource:
     df['out_edge_nodes'] = df.pep_id.apply(lambda x:
                                            [edge[1]
                                            for edge in source_graph.out_edges(x)])
-    df['in_degree'] = df.pep_id.apply(lambda x: source_graph.in_degree()[x])
-    df['out_degree'] = df.pep_id.apply(lambda x: source_graph.out_degree()[x])
+    # 隣接ノードを行番号でも持たせて、ページ側で番号の検索をせずに参照できるようにする
+    row_index_dict = {pep_id: i for i, pep_id in enumerate(df.pep_id)}
+    df['in_edge_indices'] = df.in_edge_nodes.apply(lambda x: [row_index_dict[y] for y in x])
+    df['out_edge_indices'] = df.out_edge_nodes.apply(lambda x: [row_index_dict[y] for y in x])
+    # in_degree()を行ごとに呼ぶと、そのたびにすべてのノードの次数を数え直すので、辞書にしてから引く
+    df['in_degree'] = df.pep_id.map(dict(source_graph.in_degree()))
+    df['out_degree'] = df.pep_id.map(dict(source_graph.out_degree()))
     del df['pep_id']
 
     df['Created_str'] = df.Created_dt.apply(lambda x: x.strftime('%Y-%m-%d')
@@ -41,6 +50,54 @@ def generate_node_data_source(source_graph: DiGraph) -> ColumnDataSource:
     return ColumnDataSource(df)
 
 
+# 分割時にページに残す列（PEPの番号、タイトル、ステータス、日付、色など）
+CORE_COLUMN_NAMES = ['index', 'PEP', 'Title', 'Type', 'Status', 'Created', 'Created_dt',
+                     'Created_str', 'PythonVersion', 'status_node_color', 'status_font_color', 'y']
+
+# 分割時にPEPごとのJSONファイルに移す列
+NEIGHBORHOOD_COLUMN_NAMES = ['in_edge_nodes', 'out_edge_nodes', 'in_edge_indices', 'out_edge_indices']
+
+
+def write_neighborhood_shards(node_data_source: ColumnDataSource, out_dir_path: str) -> int:
+    """
+    各PEPの隣接ノードを<PEPの番号>.jsonに分けて保存し、データソースからは隣接ノードなどの列を削除する
+    :param node_data_source: generate_node_data_sourceで生成したデータソース
+    :param out_dir_path: JSONファイルの保存先のフォルダのパス
+    :return: 保存したファイルの数
+    """
+    os.makedirs(out_dir_path, exist_ok=True)
+    data = node_data_source.data
+    for i, pep_id in enumerate(data['index']):
+        neighborhood = {column_name: list(data[column_name][i])
+                        for column_name in NEIGHBORHOOD_COLUMN_NAMES}
+        path = Path(out_dir_path) / '{}.json'.format(pep_id)
+        with path.open(mode='w', encoding='utf-8') as f:
+            json.dump(neighborhood, f, separators=(',', ':'))
+
+    node_data_source.data = {column_name: values for column_name, values in data.items()
+                             if column_name in CORE_COLUMN_NAMES}
+    return len(data['index'])
+
+
+def generate_pep_index_data_source(node_data_source: ColumnDataSource) -> ColumnDataSource:
+    """
+    PEPの番号からノード情報のColumnDataSourceの行番号を引くための対応表を生成する
+    row_index[PEPの番号]が行番号で、該当するPEPがない番号は-1になっている
+    :param node_data_source: generate_node_data_sourceで生成したデータソース
+    :return: row_indexを列に持つデータソース
+    """
+    pep_number_dict = {}
+    for i, pep_number in enumerate(node_data_source.data['PEP']):
+        if pep_number == pep_number and str(pep_number).isdigit():  # 基本情報がないノードはPEPが欠損値
+            pep_number_dict[int(pep_number)] = i
+
+    row_indices = [-1] * (max(pep_number_dict.keys(), default=-1) + 1)
+    for pep_number, i in pep_number_dict.items():
+        row_indices[pep_number] = i
+
+    return ColumnDataSource(dict(row_index=row_indices))
+
+
 def generate_color_description_component() -> column:
     """
     色の説明書きのコンポーネントを作成する
@@ -3,10 +3,15 @@ from bokeh.models.widgets import DataTable, TableColumn
 from bokeh.models.widgets.tables import HTMLTemplateFormatter
 from networkx.classes.graph import Graph
 
-from .util import convert_node_attribute2df
+from .util import convert_node_attribute2df, generate_empty_data_source
 from .style_setting import STATUS_COLOR_MAP_DICT, STATUS_FONT_COLOR_MAP_DICT
 
 
+# 表のデータソースの列（リンクのテンプレートで使うindexを含む）
+DATA_TABLE_COLUMN_NAMES = ['index', 'PEP', 'Title', 'Status', 'Created_str',
+                           'status_node_color', 'status_font_color']
+
+
 def generate_data_table_data_source(source_graph: Graph) -> ColumnDataSource:
     """
 
@@ -22,12 +27,19 @@ def generate_data_table_data_source(source_graph: Graph) -> ColumnDataSource:
     df['status_font_color'] = df['Status'].apply(lambda x:
                                                  STATUS_FONT_COLOR_MAP_DICT[x])
 
-    df = df[['PEP', 'Title', 'Status', 'Created_str',
-             'status_node_color', 'status_font_color']]
+    df = df[DATA_TABLE_COLUMN_NAMES[1:]]
 
     return ColumnDataSource(df)
 
 
+def generate_empty_data_table_data_source() -> ColumnDataSource:
+    """
+    generate_data_table_data_sourceと同じ列を持つ、空のデータソースを生成する
+    :return:
+    """
+    return generate_empty_data_source(DATA_TABLE_COLUMN_NAMES)
+
+
 def generate_data_table(data_source: ColumnDataSource) -> DataTable:
     """
 
@@ -10,10 +10,16 @@ from bokeh.models.tickers import FixedTicker
 from networkx.classes.graph import Graph
 import pandas as pd
 
-from .util import convert_node_attribute2df
+from .util import convert_node_attribute2df, generate_empty_data_source
 from .style_setting import STATUS_COLOR_MAP_DICT, PYTHON_YELLOW_COLOR_CODE
 
 
+# 点のデータソースの列（TapToolのURLで使うindexを含む）
+TIMELINE_COLUMN_NAMES = ['index', 'PEP', 'Title', 'Type', 'Status',
+                         'Created', 'Created_dt', 'status_node_color',
+                         'y', 'PythonVersion']
+
+
 def get_timeline_plot_range(source_graph: Graph) -> (dt, dt):
     """
 
@@ -42,12 +48,18 @@ def generate_timeline_data_source(source_graph: Graph) -> ColumnDataSource:
                                                      x if x == x
                                                      else 'No Data')
 
-    df = df[['PEP', 'Title', 'Type', 'Status',
-             'Created', 'Created_dt', 'status_node_color',
-             'y', 'PythonVersion']]
+    df = df[TIMELINE_COLUMN_NAMES[1:]]
     return ColumnDataSource(df)
 
 
+def generate_empty_timeline_data_source() -> ColumnDataSource:
+    """
+    generate_timeline_data_sourceと同じ列を持つ、空のデータソースを生成する
+    :return:
+    """
+    return generate_empty_data_source(TIMELINE_COLUMN_NAMES)
+
+
 def generate_timeline_label_data_source(source_graph: Graph) -> ColumnDataSource:
     """
 
@@ -65,6 +77,14 @@ def generate_timeline_label_data_source(source_graph: Graph) -> ColumnDataSource
     return ColumnDataSource(df)
 
 
+def generate_empty_timeline_label_data_source() -> ColumnDataSource:
+    """
+    PEPの番号の表示に必要な列だけを持つ、空のデータソースを生成する
+    :return:
+    """
+    return generate_empty_data_source(['index', 'pep_id', 'Created_dt', 'displayed_text', 'y'])
+
+
 def generate_timeline_desc_data_source(xs: list,
                                        ys: list,
                                        font_size: int=18) -> ColumnDataSource:
@@ -186,7 +206,8 @@ def generate_timeline_plot(source_graph: Graph,
                            circle_source: ColumnDataSource,
                            label_source: ColumnDataSource,
                            desc_label_source: ColumnDataSource,
-                           release_source_dict: dict) -> figure:
+                           release_source_dict: dict,
+                           initial_circle_source: ColumnDataSource = None) -> figure:
     """
 
     :param source_graph:
@@ -194,6 +215,8 @@ def generate_timeline_plot(source_graph: Graph,
     :param label_source:
     :param desc_label_source:
     :param release_source_dict:
+    :param initial_circle_source: PEPを選択する前に表示する点のデータソース。
+                                  省略時はcircle_sourceに初期状態の点が入っているものとする
     :return:
     """
     start_date, end_date = get_timeline_plot_range(source_graph)
@@ -209,6 +232,11 @@ def generate_timeline_plot(source_graph: Graph,
     setup_timeline_backend_parts(plot, desc_label_source)
 
     # 点を表示する
+    if initial_circle_source:
+        plot.circle(x='Created_dt', y='y',
+                    fill_color='status_node_color', fill_alpha=0.9,
+                    line_color='status_node_color', line_alpha=1,
+                    source=initial_circle_source, size=10, name='circle')
     plot.circle(x='Created_dt', y='y',
                 fill_color='status_node_color', fill_alpha=0.9,
                 line_color='status_node_color', line_alpha=1,
@@ -1,7 +1,13 @@
+import logging
 import math
+
+from bokeh.core.json_encoder import serialize_json
+from bokeh.models.sources import ColumnDataSource
 from networkx.classes.graph import Graph
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 
 def calc_radius(size: float) -> float:
     """
@@ -24,6 +30,42 @@ def convert_node_attribute2df(source_graph: Graph) -> pd.DataFrame:
     return node_df
 
 
+def generate_empty_data_source(column_names: list) -> ColumnDataSource:
+    """
+    列だけを持ち、行を持たないColumnDataSourceを生成する
+    ページを開いたときには表示せず、選択時にクライアント側でデータを入れるデータソースに使う
+    :param column_names: 列名のリスト
+    :return: 空のデータソース
+    """
+    return ColumnDataSource({column_name: [] for column_name in column_names})
+
+
+def calc_data_source_sizes(source_dict: dict) -> dict:
+    """
+    ページに埋め込まれるデータソースのJSONのサイズを算出する
+    :param source_dict: 名前をキー、ColumnDataSourceを値とした辞書
+    :return: 名前をキー、JSONのバイト数を値とした辞書
+    """
+    return {name: len(serialize_json(source.data).encode('utf-8'))
+            for name, source in source_dict.items()}
+
+
+def report_data_source_sizes(before_source_dict: dict, after_source_dict: dict) -> None:
+    """
+    2つの生成方法のデータソースのJSONのサイズを比較して表示する
+    """
+    before_sizes = calc_data_source_sizes(before_source_dict)
+    after_sizes = calc_data_source_sizes(after_source_dict)
+
+    logger.info('{:<35}{:>12}{:>12}'.format('data source', 'before [B]', 'after [B]'))
+    for name in before_sizes:
+        logger.info('{:<35}{:>12}{:>12}'.format(name, before_sizes[name], after_sizes.get(name, 0)))
+    before_total = sum(before_sizes.values())
+    after_total = sum(after_sizes.values())
+    logger.info('{:<35}{:>12}{:>12} ({:.1%})'.format('total', before_total, after_total,
+                                                    after_total / before_total if before_total else 0))
+
+
 def calc_node_position_range(source_graph: Graph) -> dict:
     """
     引数で渡されたネットワーク構造について、ノードの座標の範囲を算出する
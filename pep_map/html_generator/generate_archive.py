@@ -0,0 +1,351 @@
+import argparse
+import copy
+import difflib
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import sys
+
+# ログの設定にはpep_map/instrumentationを使う
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from instrumentation import add_instrumentation_arguments, instrumented_run, log_event  # noqa: E402
+
+# Bokehが出力したHTMLのうち、ドキュメントのJSONと埋め込み先の指定を取り出すためのパターン
+DOCS_JSON_PATTERN = re.compile(r'<script type="application/json" id="(?P<id>[^"]+)">\s*(?P<json>.*?)\s*</script>',
+                               re.DOTALL)
+RENDER_ITEMS_PATTERN = re.compile(r'var render_items = (?P<json>\[.*?\]);')
+HEAD_PATTERN = re.compile(r'<head>(?P<head>.*?)</head>', re.DOTALL)
+ROOT_DIV_PATTERN = re.compile(r'<div class="bk-root" id="(?P<id>[^"]+)"></div>')
+
+BASE_FILE_NAME = 'base.json'
+
+# この大きさ以上のColumnDataSourceの列は、共有のデータとしてドキュメントから切り出す
+MIN_BLOB_SIZE = 256
+
+# アーカイブのページ。Bokehの読み込みなどのheadは元のページのものを使い、
+# ベースと差分を取得して復元したドキュメントを、元のページと同じ方法で埋め込む
+SHELL_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+  <head>{head}</head>
+  <body>
+    <div class="bk-root" id="{root_id}"></div>
+    <script type="text/javascript">
+      (function() {{
+        // 差分の操作を順に適用する（generate_archive.apply_deltaと同じ処理）
+        function applyDelta(doc, ops) {{
+          ops.forEach(function(op) {{
+            var path = op[1];
+            var parent = doc;
+            for (var i = 0; i < path.length - 1; i++) {{
+              parent = parent[path[i]];
+            }}
+            var key = path[path.length - 1];
+            if (op[0] === 'set') {{
+              parent[key] = op[2];
+            }} else if (op[0] === 'remove') {{
+              delete parent[key];
+            }} else if (op[0] === 'splice') {{
+              var list = parent[key];
+              list.splice.apply(list, [op[2], op[3]].concat(op[4]));
+            }}
+          }});
+          return doc;
+        }}
+        // 切り出した列を、ベースの列か差分から復元してドキュメントに戻す
+        function resolveBlobs(value, base, delta) {{
+          if (Array.isArray(value)) {{
+            return value.map(function(x) {{ return resolveBlobs(x, base, delta); }});
+          }}
+          if (value === null || typeof value !== 'object') {{
+            return value;
+          }}
+          if (typeof value['$blob'] === 'string') {{
+            var blob = delta.blobs[value['$blob']];
+            if (!blob) {{
+              return base.blobs[value['$blob']];
+            }}
+            if (blob.base === undefined) {{
+              return blob.value;
+            }}
+            var wrapper = {{v: JSON.parse(JSON.stringify(base.blobs[blob.base]))}};
+            return applyDelta(wrapper, blob.ops).v;
+          }}
+          Object.keys(value).forEach(function(key) {{
+            value[key] = resolveBlobs(value[key], base, delta);
+          }});
+          return value;
+        }}
+        function load(url) {{
+          return fetch(url).then(function(response) {{ return response.json(); }});
+        }}
+        Promise.all([load('{base_url}'), load('{delta_url}')]).then(function(values) {{
+          var base = values[0];
+          var delta = values[1];
+          var doc = resolveBlobs(applyDelta(base.doc, delta.ops), base, delta);
+          // モデルのIDをキーにした辞書を、Bokehが読み込めるリストに戻す
+          var references = doc.roots.references;
+          doc.roots.references = Object.keys(references).map(function(id) {{ return references[id]; }});
+          var docs_json = {{}};
+          docs_json[delta.docid] = doc;
+          Bokeh.embed.embed_items(docs_json, delta.render_items);
+        }});
+      }})();
+    </script>
+  </body>
+</html>
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def parse_bokeh_html(html: str) -> dict:
+    """
+    Bokehのoutput_file/showで出力したHTMLから、ドキュメントのJSONと埋め込みに必要な情報を取り出す
+    :param html: HTMLの文字列
+    :return: head, root_id, docid, doc（ドキュメントのJSON）, render_itemsを持つ辞書
+    """
+    docs_json = json.loads(DOCS_JSON_PATTERN.search(html).group('json'))
+    if len(docs_json) != 1:
+        raise ValueError('Expected one Bokeh document, found {}'.format(len(docs_json)))
+    docid, doc = next(iter(docs_json.items()))
+    return dict(head=HEAD_PATTERN.search(html).group('head'),
+                root_id=ROOT_DIV_PATTERN.search(html).group('id'),
+                docid=docid,
+                doc=doc,
+                render_items=json.loads(RENDER_ITEMS_PATTERN.search(html).group('json')))
+
+
+def normalize_doc(doc: dict) -> dict:
+    """
+    ドキュメントのモデルのリスト(roots.references)を、モデルのIDをキーにした辞書に変換する
+    リストの順序は出力するたびに変わるので、辞書にしてから比較すると差分が変更されたモデルだけになる
+    """
+    doc = dict(doc)
+    doc['roots'] = dict(doc['roots'])
+    doc['roots']['references'] = {reference['id']: reference for reference in doc['roots']['references']}
+    return doc
+
+
+def extract_blobs(doc: dict) -> (dict, dict, dict):
+    """
+    ColumnDataSourceの大きな列を{"$blob": ハッシュ値}に置き換えて、ドキュメントから切り出す
+    同じ内容の列は複数のデータソースやスナップショットにあっても、1回だけ保存すればよくなる
+    :param doc: normalize_docで変換したドキュメント
+    :return: (置き換え後のドキュメント, ハッシュ値をキーとした列の値の辞書, ハッシュ値をキーとした列名の辞書)
+    """
+    doc = copy.deepcopy(doc)
+    blobs = {}
+    blob_names = {}
+    for reference in doc['roots']['references'].values():
+        data = reference.get('attributes', {}).get('data')
+        if not isinstance(data, dict):
+            continue
+        for column_name, value in data.items():
+            text = _dumps(value)
+            if len(text) < MIN_BLOB_SIZE:
+                continue
+            blob_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+            blobs[blob_hash] = value
+            blob_names[blob_hash] = column_name
+            data[column_name] = {'$blob': blob_hash}
+    return doc, blobs, blob_names
+
+
+def resolve_blobs(value, base_blobs: dict, delta_blobs: dict):
+    """
+    extract_blobsで置き換えた列を元に戻す（ページのresolveBlobsと同じ処理）
+    """
+    if isinstance(value, list):
+        return [resolve_blobs(x, base_blobs, delta_blobs) for x in value]
+    if not isinstance(value, dict):
+        return value
+    if isinstance(value.get('$blob'), str):
+        blob = delta_blobs.get(value['$blob'])
+        if blob is None:
+            return base_blobs[value['$blob']]
+        if 'base' not in blob:
+            return blob['value']
+        return apply_delta({'v': copy.deepcopy(base_blobs[blob['base']])}, blob['ops'])['v']
+    return {key: resolve_blobs(x, base_blobs, delta_blobs) for key, x in value.items()}
+
+
+def encode_blob(value, candidate_values: dict) -> dict:
+    """
+    ベースにない列を、ベースの同じ名前の列からの差分か、値そのもので表す（小さい方を使う）
+    :param value: 列の値
+    :param candidate_values: 差分の元にできるベースの列（ハッシュ値をキーとした辞書）
+    :return: {"value": 値} または {"base": ベースの列のハッシュ値, "ops": 差分の操作}
+    """
+    encoded = dict(value=value)
+    encoded_size = len(_dumps(encoded))
+    for blob_hash, candidate_value in candidate_values.items():
+        # ルートのリストを直接書き換えられるように、{"v": 値}で包んでから比較する
+        candidate = dict(base=blob_hash, ops=diff_json({'v': candidate_value}, {'v': value}))
+        candidate_size = len(_dumps(candidate))
+        if candidate_size < encoded_size:
+            encoded, encoded_size = candidate, candidate_size
+    return encoded
+
+
+def diff_json(base, target, path: list = None) -> list:
+    """
+    baseをtargetに変換する操作のリストを作成する
+    操作は['set', パス, 値], ['remove', パス], ['splice', パス, 開始位置, 削除数, 追加する要素のリスト]のいずれか
+    リストの差分は後ろから順に出力するので、先頭から順に適用すればよい
+    :param base: 変換元のJSONの値
+    :param target: 変換先のJSONの値
+    :param path: baseの位置（ルートからのキーとインデックスのリスト）
+    :return: 操作のリスト
+    """
+    path = path or []
+    if isinstance(base, dict) and isinstance(target, dict):
+        ops = []
+        for key in base:
+            if key not in target:
+                ops.append(['remove', path + [key]])
+        for key, value in target.items():
+            if key not in base:
+                ops.append(['set', path + [key], value])
+            else:
+                ops.extend(diff_json(base[key], value, path + [key]))
+        return ops
+
+    if isinstance(base, list) and isinstance(target, list):
+        if base == target:
+            return []
+        # 要素をJSON文字列にして比較し、一致しない範囲だけを操作にする
+        matcher = difflib.SequenceMatcher(None, [_dumps(x) for x in base], [_dumps(x) for x in target],
+                                          autojunk=False)
+        ops = []
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                continue
+            if tag == 'replace' and i2 - i1 == j2 - j1:
+                # 同じ数の要素が置き換わった場合は、要素の中の差分にする
+                for offset in reversed(range(i2 - i1)):
+                    ops.extend(diff_json(base[i1 + offset], target[j1 + offset], path + [i1 + offset]))
+                continue
+            ops.append(['splice', path, i1, i2 - i1, target[j1:j2]])
+        return ops
+
+    if base == target and type(base) == type(target):
+        return []
+    return [['set', path, target]]
+
+
+def apply_delta(doc, ops: list):
+    """
+    diff_jsonで作成した操作を適用する（ページのapplyDeltaと同じ処理）
+    """
+    for op in ops:
+        path = op[1]
+        parent = doc
+        for key in path[:-1]:
+            parent = parent[key]
+        key = path[-1]
+        if op[0] == 'set':
+            parent[key] = op[2]
+        elif op[0] == 'remove':
+            del parent[key]
+        elif op[0] == 'splice':
+            parent[key][op[2]:op[2] + op[3]] = op[4]
+    return doc
+
+
+def make_archive(input_html_paths: list, output_dir_path: str, base_html_path: str = None) -> dict:
+    """
+    スナップショットごとのHTMLを、共通のベースのデータと日付ごとの差分、差分を読み込む薄いページに変換する
+    出力先には base.json, <元のファイル名>.delta.json, <元のファイル名>.html を保存する
+    :param input_html_paths: Bokehで出力したスナップショットのHTMLファイルのパスのリスト
+    :param output_dir_path: 出力先のフォルダのパス
+    :param base_html_path: ベースにするHTMLファイルのパス。省略時は最後のスナップショット
+    :return: 変換前と変換後の合計サイズ(before, after)の辞書
+    """
+    output_dir_path = Path(output_dir_path)
+    os.makedirs(output_dir_path, exist_ok=True)
+    input_html_paths = sorted(Path(x) for x in input_html_paths)
+    base_html_path = Path(base_html_path) if base_html_path else input_html_paths[-1]
+
+    base_doc = normalize_doc(parse_bokeh_html(base_html_path.read_text(encoding='utf-8'))['doc'])
+    base_doc, base_blobs, base_blob_names = extract_blobs(base_doc)
+    base_text = _dumps(dict(doc=base_doc, blobs=base_blobs))
+    (output_dir_path / BASE_FILE_NAME).write_text(base_text, encoding='utf-8')
+
+    before_size = 0
+    after_size = len(base_text.encode('utf-8'))
+    for path in input_html_paths:
+        html = path.read_text(encoding='utf-8')
+        snapshot = parse_bokeh_html(html)
+        doc = normalize_doc(snapshot['doc'])
+        blob_doc, blobs, blob_names = extract_blobs(doc)
+
+        ops = diff_json(base_doc, blob_doc)
+        delta_blobs = {}
+        for blob_hash, value in blobs.items():
+            if blob_hash in base_blobs:
+                continue
+            candidate_values = {x: base_blobs[x] for x, name in base_blob_names.items()
+                                if name == blob_names[blob_hash]}
+            delta_blobs[blob_hash] = encode_blob(value, candidate_values)
+
+        # ベースに適用した結果が元のドキュメントと一致することを確認する
+        restored_doc = apply_delta(copy.deepcopy(base_doc), ops)
+        if resolve_blobs(restored_doc, base_blobs, delta_blobs) != doc:
+            raise ValueError('Failed to reconstruct the snapshot: {}'.format(path))
+
+        delta_file_name = '{}.delta.json'.format(path.stem)
+        delta_text = _dumps(dict(docid=snapshot['docid'],
+                                 render_items=snapshot['render_items'],
+                                 ops=ops,
+                                 blobs=delta_blobs))
+        (output_dir_path / delta_file_name).write_text(delta_text, encoding='utf-8')
+
+        shell_text = SHELL_TEMPLATE.format(head=snapshot['head'],
+                                           root_id=snapshot['root_id'],
+                                           base_url=BASE_FILE_NAME,
+                                           delta_url=delta_file_name)
+        (output_dir_path / path.name).write_text(shell_text, encoding='utf-8')
+
+        before_size += len(html.encode('utf-8'))
+        after_size += len(delta_text.encode('utf-8')) + len(shell_text.encode('utf-8'))
+        log_event(logger, 'archive_delta',
+                  message='{}: {} ops, {} new columns, delta {} bytes'.format(path.name, len(ops), len(delta_blobs),
+                                                                             len(delta_text)),
+                  file_name=path.name, ops=len(ops), new_columns=len(delta_blobs), delta_bytes=len(delta_text))
+
+    log_event(logger, 'archive_total',
+              message='Total: {} bytes -> {} bytes ({:.1%})'.format(before_size, after_size,
+                                                                    after_size / before_size),
+              before_bytes=before_size, after_bytes=after_size)
+    return dict(before=before_size, after=after_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert snapshot HTML files into a shared base dataset, '
+                                                 'per-date deltas and thin pages that rebuild each snapshot.')
+    parser.add_argument('-s',
+                        '--source',
+                        type=str,
+                        nargs='+',
+                        help='input snapshot .html paths (e.g. docs/archives/network/network_*.html)')
+    parser.add_argument('-d',
+                        '--destination',
+                        type=str,
+                        help='output directory path')
+    parser.add_argument('-b',
+                        '--base',
+                        type=str,
+                        default=None,
+                        help='snapshot .html path used as the base dataset (default: the latest one)')
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+    with instrumented_run('generate_archive', args):
+        make_archive(input_html_paths=args.source, output_dir_path=args.destination,
+                     base_html_path=args.base)
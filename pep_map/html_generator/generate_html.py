@@ -1,11 +1,16 @@
 import argparse
 import datetime
+import logging
+import os
 from pathlib import Path
+import pickle
+import sys
 
 import pandas as pd
 from bokeh.io import show, output_file
 from bokeh.models import Div
 from bokeh.models.callbacks import CustomJS
+from bokeh.models.sources import ColumnDataSource
 from bokeh.models.widgets import TextInput, CheckboxGroup
 from bokeh.layouts import column, row
 import networkx as nx
@@ -13,18 +18,92 @@ import networkx as nx
 import component.component as compo
 import component.table_component as table_compo
 import component.timeline_component as tl_compo
+from component.util import report_data_source_sizes
 from component.style_setting import BASE_FONT_COLOR, PYTHON_YELLOW_COLOR_CODE, PYTHON_BLUE_COLOR_CODE
 
+# グラフの読み込みにはpep_map/graphのモジュールを使う
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from graph.graph_artifact import load_pep_graph  # noqa: E402
+from graph.reachability_index import K_HOP_DIR_NAME, build_reachability_index, write_k_hop_shards  # noqa: E402
+from search.search_index import INDEX_FILE_NAME, load_search_index, save_search_index  # noqa: E402
+from instrumentation import add_instrumentation_arguments, count, instrumented_run, span  # noqa: E402
+
+# 隣接ノードのJSONファイルを保存するフォルダ名（出力するHTMLからの相対パス）
+SHARD_DIR_NAME = 'pep_shards'
+
+logger = logging.getLogger(__name__)
+
+
+def load_input_pep_graph(input_dir_path: str) -> nx.DiGraph:
+    """
+    入力フォルダのpep_graph（make_pep_graph.pyで保存したフォルダ）からグラフを読み込む
+    pep_graphがなければ、旧形式のpep_graph.gpickleを読み込む
+    """
+    dir_path = Path(input_dir_path) / 'pep_graph'
+    if dir_path.exists():
+        # 指標と座標の列はページで使わず、all_pep_sourceを大きくするだけなので読み込まない
+        return load_pep_graph(dir_path, include_metrics=False, include_positions=False)
 
-def make_timeline_html(input_dir_path: str, output_path: str) -> None:
-    # Load Data
     path = Path(input_dir_path) / 'pep_graph.gpickle'
-    pep_graph = nx.read_gpickle(path)
+    with path.open(mode='rb') as f:
+        return pickle.load(f)
 
-    path = Path(input_dir_path) / 'python_release_info.csv'
-    release_df = pd.read_csv(path,
-                             encoding='utf-8',
-                             parse_dates=['release_date'])
+
+def generate_timeline_page_sources(pep_graph: nx.DiGraph, compact: bool = False) -> dict:
+    """
+    タイムラインのページに埋め込む、ノード情報を持つデータソースを生成する
+    compactがTrueの場合は、ノード情報をall_pep_sourceにだけ持たせる。
+    表とタイムラインのデータソースは空にしておき、PEPを選択したときにall_pep_sourceから作る
+    :param pep_graph: PEPのグラフ
+    :param compact: ノード情報を1回だけ埋め込むかどうか
+    :return: データソースの名前をキーとした辞書
+    """
+    all_pep_data_source = compo.generate_node_data_source(pep_graph)
+    source_dict = dict(all_pep_source=all_pep_data_source,
+                       pep_index_source=compo.generate_pep_index_data_source(all_pep_data_source))
+
+    if not compact:
+        source_dict['linked_from_table_source'] = table_compo.generate_data_table_data_source(pep_graph)
+        source_dict['link_to_table_source'] = table_compo.generate_data_table_data_source(pep_graph)
+        source_dict['timeline_circle_source'] = tl_compo.generate_timeline_data_source(pep_graph)
+        source_dict['timeline_label_source'] = tl_compo.generate_timeline_label_data_source(pep_graph)
+        return source_dict
+
+    # 選択前の点はall_pep_sourceから描くので、y座標の列だけを追加する
+    all_pep_data_source.data['y'] = [1] * len(all_pep_data_source.data['index'])
+    source_dict['linked_from_table_source'] = table_compo.generate_empty_data_table_data_source()
+    source_dict['link_to_table_source'] = table_compo.generate_empty_data_table_data_source()
+    source_dict['timeline_circle_source'] = tl_compo.generate_empty_timeline_data_source()
+    source_dict['timeline_label_source'] = tl_compo.generate_empty_timeline_label_data_source()
+    return source_dict
+
+
+def make_timeline_html(input_dir_path: str, output_path: str,
+                       compact: bool = False,
+                       shard: bool = False,
+                       k_hop: int = 0,
+                       search: bool = False) -> None:
+    """
+    :param compact: ノード情報を1回だけ埋め込む（generate_timeline_page_sourcesを参照）
+    :param shard: 隣接ノードをページに埋め込まず、出力先と同じフォルダのpep_shards/<PEPの番号>.jsonに
+                  分けて保存する。ページはPEPが選択されたときにそのファイルだけを取得する。compactも有効になる
+    :param k_hop: 1以上の場合は、k_hop回以内のリンクでたどれるPEPを、出力先と同じフォルダの
+                  pep_k_hop/<PEPの番号>.jsonに保存する（reachability_index.write_k_hop_shardsを参照）
+    :param search: 入力フォルダのpep_search_index.json（make_pep_graph.py --search-indexで作成したもの）を
+                   出力先と同じフォルダに保存し、PEPの番号以外の入力をキーワードとして検索する
+    """
+    compact = compact or shard
+    # Load Data
+    with span('load_graph') as load_span:
+        pep_graph = load_input_pep_graph(input_dir_path)
+
+        path = Path(input_dir_path) / 'python_release_info.csv'
+        release_df = pd.read_csv(path,
+                                 encoding='utf-8',
+                                 parse_dates=['release_date'])
+        load_span['attributes'].update(nodes=pep_graph.number_of_nodes(), edges=pep_graph.number_of_edges())
+    count('graph_nodes', pep_graph.number_of_nodes())
+    count('graph_edges', pep_graph.number_of_edges())
 
     release_df = release_df[release_df.micro == 0]
     release_df['color'] = release_df.major.apply(lambda x: PYTHON_YELLOW_COLOR_CODE if x == 2 else PYTHON_BLUE_COLOR_CODE)  # 2, 3以外が出てきたら再考すること
@@ -51,11 +130,42 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
                            'py3_release_line_source': py3_release_line_data_source
                            }
 
-    all_pep_data_source = compo.generate_node_data_source(pep_graph)
+    with span('build_sources', compact=compact):
+        source_dict = generate_timeline_page_sources(pep_graph, compact=compact)
+    if compact:
+        report_data_source_sizes(generate_timeline_page_sources(pep_graph, compact=False),
+                                 source_dict)
+
+    all_pep_data_source = source_dict['all_pep_source']
+    pep_index_source = source_dict['pep_index_source']
+
+    shard_base_urls = []
+    if shard:
+        shard_dir_path = Path(output_path).parent / SHARD_DIR_NAME
+        with span('write_shards'):
+            shard_count = compo.write_neighborhood_shards(all_pep_data_source, shard_dir_path)
+        logger.info('Completed to write {} shards: {}'.format(shard_count, shard_dir_path))
+        report_data_source_sizes(dict(all_pep_source=generate_timeline_page_sources(pep_graph)['all_pep_source']),
+                                 dict(all_pep_source=all_pep_data_source))
+        shard_base_urls = [SHARD_DIR_NAME + '/']
+    shard_config_source = ColumnDataSource(dict(base_url=shard_base_urls))
+
+    if k_hop > 0:
+        k_hop_dir_path = Path(output_path).parent / K_HOP_DIR_NAME
+        with span('write_k_hop', k_hop=k_hop):
+            k_hop_count = write_k_hop_shards(build_reachability_index(pep_graph), k_hop_dir_path, k_hop)
+        logger.info('Completed to write {} k-hop files: {}'.format(k_hop_count, k_hop_dir_path))
+
+    search_base_urls = []
+    if search:
+        with span('copy_search_index'):
+            save_search_index(load_search_index(Path(input_dir_path) / INDEX_FILE_NAME), Path(output_path).parent)
+        search_base_urls = ['./']
+    search_config_source = ColumnDataSource(dict(base_url=search_base_urls))
 
     # DataTable用のデータソースを用意する
-    linked_from_table_source = table_compo.generate_data_table_data_source(pep_graph)
-    link_to_table_source = table_compo.generate_data_table_data_source(pep_graph)
+    linked_from_table_source = source_dict['linked_from_table_source']
+    link_to_table_source = source_dict['link_to_table_source']
 
     linked_from_data_table = table_compo.generate_data_table(linked_from_table_source)
     link_to_data_table = table_compo.generate_data_table(link_to_table_source)
@@ -66,8 +176,8 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
                                   style={'color': BASE_FONT_COLOR})
 
     # Timeline用のデータソースを用意する
-    timeline_display_circle_source = tl_compo.generate_timeline_data_source(pep_graph)
-    timeline_label_source = tl_compo.generate_timeline_label_data_source(pep_graph)
+    timeline_display_circle_source = source_dict['timeline_circle_source']
+    timeline_label_source = source_dict['timeline_label_source']
     desc_start_date, _ = tl_compo.get_timeline_plot_range(pep_graph)
     desc_start_date = desc_start_date + datetime.timedelta(days=30)
     timeline_desc_label_source = tl_compo.generate_timeline_desc_data_source(xs=[desc_start_date, desc_start_date],
@@ -92,7 +202,21 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
                                            "Show Python 3 release dates"],
                                    active=[0, 1])
 
+    # compactの場合は、選択前の点をall_pep_sourceから描き、PEPを選択したら非表示にする
+    timeline_plot = tl_compo.generate_timeline_plot(pep_graph,
+                                                    timeline_display_circle_source,
+                                                    timeline_label_source,
+                                                    timeline_desc_label_source,
+                                                    release_source_dict,
+                                                    initial_circle_source=all_pep_data_source if compact else None)
+    initial_circle_source = all_pep_data_source if compact else timeline_display_circle_source
+    initial_circle_renderer = [renderer for renderer in timeline_plot.select(name='circle')
+                               if renderer.data_source is initial_circle_source][0]
+
     def callback_input_pep_number(all_pep_data_source=all_pep_data_source,
+                                  pep_index_source=pep_index_source,
+                                  shard_config_source=shard_config_source,
+                                  search_config_source=search_config_source,
                                   link_to_table_source=link_to_table_source,
                                   linked_from_table_source=linked_from_table_source,
                                   link_to_table_title_div=link_to_table_title_div,
@@ -100,6 +224,7 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
                                   timeline_display_circle_source=timeline_display_circle_source,
                                   timeline_label_source=timeline_label_source,
                                   timeline_desc_source=timeline_desc_label_source,
+                                  initial_circle_renderer=initial_circle_renderer,
                                   title_div=title_div,
                                   error_message_div=error_message_div) -> None:
         """
@@ -109,6 +234,9 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
         * このパラメータの設定の仕方以外にもあるかもしれない
 
         :param all_pep_data_source:
+        :param pep_index_source:
+        :param shard_config_source:
+        :param search_config_source:
         :param link_to_table_source:
         :param linked_from_table_source:
         :param link_to_table_title_div:
@@ -116,6 +244,7 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
         :param timeline_display_circle_source:
         :param timeline_label_source:
         :param timeline_desc_source:
+        :param initial_circle_renderer:
         :param title_div:
         :param error_message_div:
         :param debug_div:
@@ -153,25 +282,15 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
             return description_text + title_text
 
         def search_index_by_pep_number(text: str) -> int:
-            index = 0
-
-            for pep_number in all_pep_data_source['data']['PEP']:
-                if text == str(pep_number):
-                    return index
-                index += 1
-
-            return -1  # Not Found
-
-        def get_inputed_pep_dict(text: int) -> dict:
-            selected_index = search_index_by_pep_number(text)
-            if selected_index == -1:
-                return {}
-            pep_dict = {}
-
-            for key, value in all_pep_data_source.data.items():
-                pep_dict[key] = value[selected_index]
-
-            return pep_dict
+            # PEPの番号から行番号への対応表を引くので、全行を走査しない
+            row_indices = pep_index_source.data['row_index']
+            # JSに変換したint()は'1.5', '1e3', '0x10'も数値にするので、数字だけの文字列に限る
+            if not window.RegExp('^[0-9]+$').test(text):
+                return -1  # Not Found
+            pep_number = int(text)
+            if not (pep_number >= 0 and pep_number < len(row_indices)):
+                return -1  # Not Found
+            return row_indices[pep_number]
 
         def get_pep_info(list_index: int) -> dict:
             pep_dict = {}
@@ -181,43 +300,75 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
 
             return pep_dict
 
-        def get_neighbor_node_info(pep_dict: dict,
+        def get_neighbor_node_info(neighborhood: dict,
                                    neighbor_type: str) -> dict:
             neighbors = dict()
             for key, value in all_pep_data_source.data.items():
                 neighbors[key] = []
 
-            for pep_id in pep_dict[neighbor_type]:
-                index = search_index_by_pep_number(int(pep_id))
+            # 隣接ノードは行番号で持っているので、番号の検索は不要
+            for index in neighborhood[neighbor_type]:
                 work_pep_dict = get_pep_info(index)
                 for key in neighbors.keys():
                     neighbors[key].append(work_pep_dict[key])
             return neighbors
 
-        def generate_timeline_source_dict(pep_dict: dict) -> dict:
-
-            in_edge_nodes_dict = get_neighbor_node_info(pep_dict,
-                                                        'in_edge_nodes')
-            out_edge_nodes_dict = get_neighbor_node_info(pep_dict,
-                                                         'out_edge_nodes')
-            in_edge_nodes_dict['y'] = [1.5] * len(in_edge_nodes_dict['PEP'])
-            out_edge_nodes_dict['y'] = [0.5] * len(out_edge_nodes_dict['PEP'])
-
-            timeline_source_dict = in_edge_nodes_dict
-            del timeline_source_dict['in_degree']
-            del timeline_source_dict['in_edge_nodes']
-            del timeline_source_dict['out_degree']
-            del timeline_source_dict['out_edge_nodes']
-            for key, value in timeline_source_dict.items():
-                timeline_source_dict[key] += out_edge_nodes_dict[key]
-                if key == 'y':
-                    timeline_source_dict[key].append(1)
-                else:
-                    timeline_source_dict[key].append(pep_dict[key])
+        def generate_timeline_source_dict(pep_dict: dict,
+                                          in_edge_nodes_dict: dict,
+                                          out_edge_nodes_dict: dict) -> dict:
+            timeline_source_dict = {}
+            for key in in_edge_nodes_dict.keys():
+                if key in ['in_degree', 'in_edge_nodes', 'in_edge_indices',
+                           'out_degree', 'out_edge_nodes', 'out_edge_indices']:
+                    continue
+                # 表用の辞書と共有しないように、新しいリストを作る
+                timeline_source_dict[key] = in_edge_nodes_dict[key] + out_edge_nodes_dict[key]
+                timeline_source_dict[key].append(pep_dict[key])
+
+            timeline_source_dict['y'] = [1.5] * len(in_edge_nodes_dict['PEP']) \
+                + [0.5] * len(out_edge_nodes_dict['PEP'])
+            timeline_source_dict['y'].append(1)
 
             return timeline_source_dict
 
-        def update_data_table(pep_dict: dict) -> None:
+        def get_selection_cache() -> dict:
+            cache = window.pep_map_selection_cache
+            if not cache:
+                cache = {}
+                window.pep_map_selection_cache = cache
+            return cache
+
+        def get_selection(selected_index: int, neighborhood: dict) -> dict:
+            # 一度選択したPEPの表示内容はページ内にキャッシュして、再計算しない
+            cache = get_selection_cache()
+            if selected_index in cache:
+                return cache[selected_index]
+
+            # neighborhoodは隣接ノードの行番号（in_edge_indices, out_edge_indices）を持つ辞書
+            # ページに埋め込んでいる場合はpep_dict、分割している場合は取得したJSONファイルの中身
+            pep_dict = get_pep_info(selected_index)
+            in_edge_nodes_dict = get_neighbor_node_info(neighborhood, 'in_edge_indices')
+            out_edge_nodes_dict = get_neighbor_node_info(neighborhood, 'out_edge_indices')
+
+            # 円とラベルは同じ内容なので、1回だけ作ってラベル用に表示文字列を追加する
+            timeline_circle_dict = generate_timeline_source_dict(pep_dict,
+                                                                 in_edge_nodes_dict,
+                                                                 out_edge_nodes_dict)
+            timeline_label_dict = {}
+            for key, value in timeline_circle_dict.items():
+                timeline_label_dict[key] = value
+            timeline_label_dict['displayed_text'] = timeline_circle_dict['PEP']
+
+            selection = dict(pep=pep_dict,
+                             linked_from=in_edge_nodes_dict,
+                             link_to=out_edge_nodes_dict,
+                             timeline_circle=timeline_circle_dict,
+                             timeline_label=timeline_label_dict)
+            cache[selected_index] = selection
+            return selection
+
+        def update_data_table(selection: dict) -> None:
+            pep_dict = selection['pep']
             linked_from_table_title_div.text = '<strong>PEP ' \
                                                + pep_dict['PEP'] \
                                                + ' is linked from ...</strong>'
@@ -225,24 +376,22 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
                                            + pep_dict['PEP'] \
                                            + ' links to ...</strong>'
 
-            in_edge_nodes_dict = get_neighbor_node_info(pep_dict,
-                                                        'in_edge_nodes')
-            linked_from_table_source.data = in_edge_nodes_dict
+            linked_from_table_source.data = selection['linked_from']
             linked_from_table_source.change.emit()
 
-            out_edge_nodes_dict = get_neighbor_node_info(pep_dict,
-                                                         'out_edge_nodes')
-            link_to_table_source.data = out_edge_nodes_dict
+            link_to_table_source.data = selection['link_to']
             link_to_table_source.change.emit()
 
-        def update_timeline(pep_dict: dict) -> None:
-            timeline_circle_dict = generate_timeline_source_dict(pep_dict)
-            timeline_display_circle_source.data = timeline_circle_dict
+        def update_timeline(selection: dict) -> None:
+            pep_dict = selection['pep']
+            # 選択前の点を別のデータソースで描いている場合（compact）は、それを隠す
+            if initial_circle_renderer.data_source is not timeline_display_circle_source:
+                initial_circle_renderer.visible = False
+
+            timeline_display_circle_source.data = selection['timeline_circle']
             timeline_display_circle_source.change.emit()
 
-            timeline_label_dict = generate_timeline_source_dict(pep_dict)
-            timeline_label_dict['displayed_text'] = timeline_label_dict['PEP']
-            timeline_label_source.data = timeline_label_dict
+            timeline_label_source.data = selection['timeline_label']
             timeline_label_source.change.emit()
 
             texts = ['PEP ' + pep_dict['PEP'] + ' is linked from...',
@@ -269,16 +418,64 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
 
         inputed_text = inputed_text.lstrip('0')
 
+        def show_selection(selected_index: int, neighborhood: dict) -> None:
+            selection = get_selection(selected_index, neighborhood)
+            title_div.text = create_header_text(selection['pep'])
+            update_data_table(selection)
+            update_timeline(selection)
+            error_message_div.text = ""
+
+        def show_fetch_error(error) -> None:
+            error_message_div.text = "Failed to load: PEP " + inputed_text
+
+        def select_pep(selected_index: int) -> None:
+            shard_base_urls = shard_config_source.data['base_url']
+            if len(shard_base_urls) == 0 or selected_index in get_selection_cache():
+                show_selection(selected_index, get_pep_info(selected_index))
+            else:
+                # 隣接ノードは選択されたPEPのJSONファイルにだけあるので、選択されたときに取得する
+                shard_url = shard_base_urls[0] + all_pep_data_source.data['index'][selected_index] + '.json'
+                window.fetch(shard_url).then(
+                    lambda response: response.json()).then(
+                    lambda shard: show_selection(selected_index, shard)).catch(show_fetch_error)
+
+        def cache_search_index(data: dict) -> dict:
+            window.pep_search_index = window.pepLoadSearchIndex(data)
+            return window.pep_search_index
+
+        def load_search_index(base_url: str):
+            # 検索用のスクリプトと索引は、最初にキーワードが入力されたときに1回だけ取得する
+            if window.pep_search_index:
+                return window.Promise.resolve(window.pep_search_index)
+            return window.fetch(base_url + 'pep_search.js').then(
+                lambda response: response.text()).then(
+                lambda script: window.eval(script)).then(
+                lambda result: window.fetch(base_url + 'pep_search_index.json')).then(
+                lambda response: response.json()).then(cache_search_index)
+
+        def show_search_result(search_index) -> None:
+            # グラフにないPEPが索引に含まれていても選択しないように、ページにある最初のPEPを表示する
+            results = window.pepSearch(search_index, inputed_text, 20)
+            for result in results:
+                result_index = search_index_by_pep_number(result.pep_id)
+                if result_index >= 0:
+                    select_pep(result_index)
+                    return
+            error_message_div.text = "Not Found: " + inputed_text
+
         # 表示の更新
-        selected_pep_dict = get_inputed_pep_dict(inputed_text)
+        selected_index = search_index_by_pep_number(inputed_text)
+
+        if selected_index == -1:
+            search_base_urls = search_config_source.data['base_url']
+            if len(search_base_urls) == 0:
+                error_message_div.text = "Not Found: PEP " + inputed_text
+                return
+            # PEPの番号として見つからない入力は、キーワードとして検索して最も一致するPEPを表示する
+            load_search_index(search_base_urls[0]).then(show_search_result).catch(show_fetch_error)
+            return
 
-        if selected_pep_dict:
-            title_div.text = create_header_text(selected_pep_dict)
-            update_data_table(selected_pep_dict)
-            update_timeline(selected_pep_dict)
-            error_message_div.text = ""
-        else:
-            error_message_div.text = "Not Found: PEP " + inputed_text
+        select_pep(selected_index)
 
     def callback_change_checkbox(py2_label_source=py2_release_label_data_source,
                                  py2_line_source=py2_release_line_data_source,
@@ -309,9 +506,13 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
         switch_show_or_hide(py3_label_source, py3_line_source, 3)
 
     # Header Component
+    # コールバックのPythonの関数は、ここでJavaScriptに変換される
+    with span('compile_callbacks'):
+        input_pep_number_callback = CustomJS.from_py_func(callback_input_pep_number)
+        change_checkbox_callback = CustomJS.from_py_func(callback_change_checkbox)
     pep_textinput = TextInput(title='PEP:',
                               placeholder='Please enter the PEP number.',
-                              callback=CustomJS.from_py_func(callback_input_pep_number),
+                              callback=input_pep_number_callback,
                               width=190)
     info_div = Div(width=200, height=20,
                    style={'background-color': '#175A89',
@@ -327,12 +528,7 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
                            info_div)
 
     # Timeline Component
-    checkbox_group.callback = CustomJS.from_py_func(callback_change_checkbox)
-    timeline_plot = tl_compo.generate_timeline_plot(pep_graph,
-                                                    timeline_display_circle_source,
-                                                    timeline_label_source,
-                                                    timeline_desc_label_source,
-                                                    release_source_dict)
+    checkbox_group.callback = change_checkbox_callback
     as_of_date_div = Div(width=200, height=8, style={'color': 'red'})
     # TODO: fetch_start_datetimeを持っていないときの対応について決める
     fetch_datetime = pep_graph.graph['fetch_start_datetime'].strftime('%Y/%m/%d') \
@@ -348,9 +544,11 @@ def make_timeline_html(input_dir_path: str, output_path: str) -> None:
     table_component = row(linked_from_table_component, margin_div, link_to_table_component)
 
     # TODO: ここでshowしなくても出力できる方法はないか？
-    output_file(output_path, 'PEP Map | Timeline')
+    with span('write_html'):
+        output_file(output_path, 'PEP Map | Timeline')
 
-    show(column(header_component, checkbox_group, timeline_component, table_component))
+        show(column(header_component, checkbox_group, timeline_component, table_component))
+    count('html_bytes', os.path.getsize(output_path))
 
 
 if __name__ == '__main__':
@@ -363,7 +561,30 @@ if __name__ == '__main__':
                         '--destination',
                         type=str,
                         help='output .html path')
+    parser.add_argument('--compact',
+                        action='store_true',
+                        help='embed the node attributes only once and build the other data sources '
+                             'in the browser when a PEP is selected (the tables start empty)')
+    parser.add_argument('--shard',
+                        action='store_true',
+                        help='write the neighbours of each PEP to pep_shards/<PEP>.json next to the output '
+                             'and fetch them on selection (implies --compact; the page must be served over HTTP)')
+    parser.add_argument('--k-hop',
+                        type=int,
+                        default=0,
+                        help='write the PEPs reachable within K links from and to each PEP '
+                             'to pep_k_hop/<PEP>.json next to the output')
+    parser.add_argument('--search',
+                        action='store_true',
+                        help='copy pep_search_index.json from the input directory next to the output and '
+                             'search the input as keywords when it is not a PEP number '
+                             '(the page must be served over HTTP)')
+    add_instrumentation_arguments(parser)
     args = parser.parse_args()
     # TODO: パスのチェック
-    # TODO: ログ出力
-    make_timeline_html(input_dir_path=args.source, output_path=args.destination)
+    with instrumented_run('generate_html', args):
+        make_timeline_html(input_dir_path=args.source, output_path=args.destination,
+                           compact=args.compact,
+                           shard=args.shard,
+                           k_hop=args.k_hop,
+                           search=args.search)
@@ -0,0 +1,352 @@
+import argparse
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windowsにはresourceモジュールがないので、メモリは記録しない
+    resource = None
+
+# 実行レポートの形式を変更したときは、この値を増やす
+REPORT_FORMAT_VERSION = 1
+LOG_FORMATS = ('text', 'json')
+
+logger = logging.getLogger(__name__)
+
+
+def get_peak_rss_bytes() -> int:
+    """
+    プロセスのこれまでの最大常駐メモリ（バイト）。取得できない環境ではNone
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxではキロバイト、macOSではバイト単位
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def _get_cpu_seconds() -> float:
+    # スレッドの分を含むプロセス全体と、終了済みの子プロセス（プロセスプールのワーカーなど）のCPU時間
+    cpu_seconds = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_seconds += usage.ru_utime + usage.ru_stime
+    return cpu_seconds
+
+
+class Instrumentation:
+    """
+    処理の段階（スパン）ごとの実行時間・CPU時間・メモリと、取得したバイト数などのカウンタを記録する
+    カウンタはスレッドから同時に加算してよい。スパンの入れ子はスレッドごとに管理する
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {}
+        self._spans = []
+        self._hooks = []
+        self._started = datetime.now()
+        self._start_perf_counter = time.perf_counter()
+
+    @property
+    def counters(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    @property
+    def spans(self) -> list:
+        """
+        終了したスパンの記録（終了した順）
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def add_hook(self, hook) -> None:
+        """
+        スパンの開始・終了時に呼び出す関数を追加する。プロファイラを仕掛けるのに使う
+        :param hook: hook(event, span)の形式の関数。eventは'start'か'end'、spanはスパンの記録の辞書
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self._hooks.remove(hook)
+
+    def count(self, name: str, value=1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def merge_counters(self, counters: dict) -> None:
+        """
+        別のプロセスで記録したカウンタを加算する
+        """
+        with self._lock:
+            for name, value in counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        処理の実行時間を<name>_secondsに、回数を<name>_countに加算する
+        1件ごとに繰り返す処理（取得、パースなど）の合計時間を、スパンを作らずに記録する
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._counters[name + '_seconds'] = self._counters.get(name + '_seconds', 0) + elapsed
+                self._counters[name + '_count'] = self._counters.get(name + '_count', 0) + 1
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        処理の段階の実行時間・CPU時間・最大常駐メモリと、その間に増えたカウンタを記録し、ログに出力する
+        CPU時間はプロセス全体の値なので、並行して動いているスレッドの分も含む
+        :param name: 段階の名前。入れ子の場合は親の名前と/でつないだものをpathとして記録する
+        :param attributes: 記録に含める値（件数など）。ブロックの中でspan['attributes']に追加してもよい
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        path = '/'.join([x['name'] for x in stack] + [name])
+        record = dict(name=name, path=path, depth=len(stack),
+                      start_offset_seconds=time.perf_counter() - self._start_perf_counter,
+                      attributes=dict(attributes))
+        start_counters = self.counters
+        start_peak_rss = get_peak_rss_bytes()
+        start_wall, start_cpu = time.perf_counter(), _get_cpu_seconds()
+
+        stack.append(record)
+        self._call_hooks('start', record)
+        status = 'ok'
+        try:
+            yield record
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            stack.pop()
+            peak_rss = get_peak_rss_bytes()
+            end_counters = self.counters
+            record.update(status=status,
+                          wall_seconds=time.perf_counter() - start_wall,
+                          cpu_seconds=_get_cpu_seconds() - start_cpu,
+                          peak_rss_bytes=peak_rss,
+                          # 最大常駐メモリは減らないので、この段階で更新した分だけを増加量とする
+                          rss_growth_bytes=peak_rss - start_peak_rss if peak_rss is not None else None,
+                          counters={key: value - start_counters.get(key, 0)
+                                    for key, value in end_counters.items()
+                                    if value != start_counters.get(key, 0)})
+            with self._lock:
+                self._spans.append(record)
+            self._call_hooks('end', record)
+            log_event(logger, 'span', level=logging.INFO if status == 'ok' else logging.ERROR,
+                      message='{} {} in {:.3f}s'.format(path, status, record['wall_seconds']),
+                      **{key: value for key, value in record.items() if key not in ('name', 'depth')})
+
+    def _call_hooks(self, event: str, record: dict) -> None:
+        for hook in list(self._hooks):
+            hook(event, record)
+
+    def make_report(self) -> dict:
+        """
+        実行全体のスパンとカウンタをまとめた、JSONに変換できる辞書
+        """
+        return dict(format_version=REPORT_FORMAT_VERSION,
+                    started=self._started.isoformat(),
+                    wall_seconds=time.perf_counter() - self._start_perf_counter,
+                    cpu_seconds=_get_cpu_seconds(),
+                    peak_rss_bytes=get_peak_rss_bytes(),
+                    environment=dict(python=platform.python_version(),
+                                     platform=platform.platform(),
+                                     pid=os.getpid(),
+                                     argv=sys.argv),
+                    spans=self.spans,
+                    counters=self.counters)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    return _instrumentation
+
+
+def reset_instrumentation() -> Instrumentation:
+    """
+    記録をすべて破棄して、新しい記録を始める（同じプロセスで複数回実行する場合に使う）
+    """
+    global _instrumentation
+    _instrumentation = Instrumentation()
+    return _instrumentation
+
+
+def span(name: str, **attributes):
+    return _instrumentation.span(name, **attributes)
+
+
+def timer(name: str):
+    return _instrumentation.timer(name)
+
+
+def count(name: str, value=1) -> None:
+    _instrumentation.count(name, value)
+
+
+def write_run_report(path: str) -> Path:
+    """
+    実行レポート（スパンとカウンタ）をJSONファイルに保存する
+    """
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    with path.open(mode='w', encoding='utf-8') as f:
+        json.dump(_instrumentation.make_report(), f, indent=2, default=str)
+    return path
+
+
+def log_event(target_logger: logging.Logger, event: str, level: int = logging.INFO,
+              message: str = None, **fields) -> None:
+    """
+    イベント名と値を持つログを出力する。JsonFormatterでは値がJSONのキーになる
+    :param target_logger: 出力先のロガー
+    :param event: イベントの名前（fetch, span, run_summaryなど）
+    :param message: テキスト形式で出力するメッセージ。省略時はイベントの名前
+    :param fields: ログに含める値
+    """
+    target_logger.log(level, message or event, extra=dict(event=event, fields=fields))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    ログを1行に1つのJSONオブジェクトとして出力する
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = dict(time=datetime.fromtimestamp(record.created).isoformat(),
+                     level=record.levelname,
+                     logger=record.name,
+                     event=getattr(record, 'event', None),
+                     message=record.getMessage())
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: str = 'INFO', log_format: str = 'text', stream=None) -> None:
+    """
+    ルートロガーの出力先と形式を設定する
+    :param level: ログレベル（DEBUG, INFO, WARNING, ERROR）
+    :param log_format: textは人が読む形式、jsonは1行に1つのJSONオブジェクト
+    :param stream: 出力先。省略時は標準エラー出力
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError('Unknown log format: {} (choose from {})'.format(log_format, ', '.join(LOG_FORMATS)))
+    handler = logging.StreamHandler(stream)
+    if log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root_logger = logging.getLogger()
+    for existing_handler in list(root_logger.handlers):
+        root_logger.removeHandler(existing_handler)
+    root_logger.addHandler(handler)
+    root_logger.setLevel(level.upper())
+
+
+class CProfileHook:
+    """
+    指定したスパンの間だけcProfileでプロファイルし、<出力先>/<スパンのpath>.profに保存するフック
+    保存したファイルは python -m pstats や snakeviz で読み込める
+    cProfileは入れ子にできないので、プロファイル中に始まったスパンは対象にしない
+    """
+
+    def __init__(self, out_dir_path: str, span_names: list = None) -> None:
+        """
+        :param out_dir_path: プロファイルの結果を保存するフォルダのパス
+        :param span_names: プロファイルするスパンの名前かpath。省略時は最も外側のスパン
+        """
+        self._out_dir_path = Path(out_dir_path)
+        self._span_names = set(span_names) if span_names else None
+        self._profile = None
+        self._profiled_record = None
+
+    def _is_target(self, record: dict) -> bool:
+        if self._span_names is None:
+            return record['depth'] == 0
+        return record['name'] in self._span_names or record['path'] in self._span_names
+
+    def __call__(self, event: str, record: dict) -> None:
+        if event == 'start' and self._profile is None and self._is_target(record):
+            self._profile = cProfile.Profile()
+            self._profiled_record = record
+            self._profile.enable()
+        elif event == 'end' and record is self._profiled_record:
+            self._profile.disable()
+            os.makedirs(self._out_dir_path, exist_ok=True)
+            path = self._out_dir_path / '{}.prof'.format(record['path'].replace('/', '.'))
+            self._profile.dump_stats(str(path))
+            record['attributes']['profile_path'] = str(path)
+            self._profile = None
+            self._profiled_record = None
+
+
+def add_instrumentation_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    ログと計測の設定のコマンドライン引数を追加する。instrumented_runと組み合わせて使う
+    """
+    parser.add_argument('--log-level',
+                        type=str,
+                        default='INFO',
+                        choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help='ログレベル。DEBUGではPEPごとの取得・パースも出力する。デフォルトではINFO')
+    parser.add_argument('--log-format',
+                        type=str,
+                        default='text',
+                        choices=LOG_FORMATS,
+                        help='ログの形式。jsonは1行に1つのJSONオブジェクト。デフォルトではtext')
+    parser.add_argument('--run-report',
+                        type=str,
+                        default=None,
+                        help='段階ごとの実行時間・CPU時間・メモリとカウンタを保存するJSONファイルのパス')
+    parser.add_argument('--profile-dir',
+                        type=str,
+                        default=None,
+                        help='cProfileの結果(<段階>.prof)を保存するフォルダのパス。デフォルトではプロファイルしない')
+    parser.add_argument('--profile-span',
+                        type=str,
+                        nargs='+',
+                        default=None,
+                        help='--profile-dirでプロファイルする段階の名前。デフォルトでは実行全体')
+
+
+@contextmanager
+def instrumented_run(name: str, args: argparse.Namespace):
+    """
+    add_instrumentation_argumentsの引数でログとプロファイラを設定し、実行全体を1つのスパンとして記録する
+    終了時（エラーで終了した場合も）にカウンタをログに出力し、--run-reportのパスに実行レポートを保存する
+    """
+    configure_logging(args.log_level, args.log_format)
+    instrumentation = get_instrumentation()
+    if args.profile_dir:
+        instrumentation.add_hook(CProfileHook(args.profile_dir, args.profile_span))
+    try:
+        with instrumentation.span(name) as record:
+            yield record
+    finally:
+        log_event(logger, 'counters', message='Counters: {}'.format(instrumentation.counters),
+                  counters=instrumentation.counters)
+        if args.run_report:
+            path = write_run_report(args.run_report)
+            logger.info('Completed to save run report: {}'.format(path))
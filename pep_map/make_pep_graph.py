@@ -1,39 +1,52 @@
 import argparse
 from datetime import datetime as dt
+import itertools
+import logging
 import os
+import pickle
 
 import pandas as pd
 import networkx as nx
 
-from acquirer.pep_acquirer import PepAcquirer, PepHeaderAcquirer, PepLinkDestinationAcquirer
+from acquirer.pep_acquirer import PepHeaderAndLinkAcquirer
+from acquirer.pep_acquirer import EDGE_LIST_FILE_FORMATS
 from acquirer.python_release_acquirer import PythonReleaseAcquirer
+from acquirer.raw_data_store import ContentAddressedRawDataStore
+from acquirer.row_writer import PepHeaderCsvRowWriter, PepLinkEdgeCsvRowWriter
+from graph.graph_builder import StreamingPepGraphBuilder, diff_pep_graphs
+from graph.graph_builder import header_records_from_dataframe, link_records_from_dataframe
+from graph.graph_builder import make_pep_graph_from_records
+from graph.graph_analytics import add_pep_graph_metrics
+from graph.graph_artifact import load_pep_graph, load_pep_graph_snapshot, save_pep_graph
+from graph.graph_layout import LayoutCache, layout_pep_graph
+from graph.reachability_index import build_reachability_index, save_reachability_index
+from search.search_index import make_search_index, save_search_index
+from graph.graph_updater import change_report_to_json, update_pep_graph
+from instrumentation import add_instrumentation_arguments, count, instrumented_run, log_event, span
 
+logger = logging.getLogger(__name__)
 
-def to_adjacency_matrix(source_df: pd.DataFrame) -> pd.DataFrame:
-    df = source_df.copy()
-    # 不足列を追加する
-    missing_columns = list(set(source_df.index) - set(df.columns))  # 行にあって、列にない
-    for column in missing_columns:
-        df[column] = 0
-
-    # 不足行を追加する
-    missing_lines = list(set(df.columns) - set(df.index))  # 列にあって、行にない
-    for line in missing_lines:
-        df.loc[line] = 0
 
-    # 列と行の並び順を揃える
-    df = df[sorted(df.columns)]
-    df = df.sort_index()
+def to_adjacency_matrix(source_df: pd.DataFrame) -> pd.DataFrame:
+    # 行と列の両方に、リンク元とリンク先のすべてのPEPを揃える
+    # 列・行を1つずつ追加するとそのたびにDataFrameが作り直されるので、reindexでまとめて追加する
+    pep_ids = sorted(set(source_df.index) | set(source_df.columns))
 
     # PEP 0 は目次なので除外する
-    df = df.loc[df.index != '0000', df.columns != '0000']
+    pep_ids = [pep_id for pep_id in pep_ids if pep_id != '0000']
+
+    df = source_df.reindex(index=pep_ids, columns=pep_ids, fill_value=0)
 
     return df
 
 
-def make_pep_graph(source_link_df: pd.DataFrame,
-                   source_header_df: pd.DataFrame,
-                   fetch_start_datetime=None) -> pd.DataFrame:
+def make_dense_pep_graph(source_link_df: pd.DataFrame,
+                         source_header_df: pd.DataFrame,
+                         fetch_start_datetime=None) -> nx.DiGraph:
+    """
+    隣接行列を経由してグラフを作成する。PEPの数の2乗のメモリを使うので、
+    make_pep_graphとの結果の比較（--check-equivalence）にだけ使用する
+    """
     # 隣接行列に変換する
     df = source_link_df.copy()
     adj_df = to_adjacency_matrix(df)
@@ -43,60 +56,266 @@ def make_pep_graph(source_link_df: pd.DataFrame,
     header_df = source_header_df.copy()
 
     # ヘッダ情報を属性情報として付加する
-    for column_name, series in header_df.iteritems():
+    for column_name, series in header_df.items():
         nx.set_node_attributes(pep_graph, dict(series), column_name)
 
-    print(nx.info(pep_graph))
-
     pep_graph.graph['fetch_start_datetime'] = fetch_start_datetime
 
     return pep_graph
 
 
-def main(output_root_path: str=None) -> None:
+def make_pep_graph(source_link_df: pd.DataFrame,
+                   source_header_df: pd.DataFrame,
+                   fetch_start_datetime=None) -> nx.DiGraph:
+    # 隣接行列を経由せずに、0でないリンク数だけからグラフを作成する
+    pep_graph = make_pep_graph_from_records(link_records_from_dataframe(source_link_df),
+                                            header_records_from_dataframe(source_header_df),
+                                            fetch_start_datetime)
+
+    logger.info('Number of nodes: {}, Number of edges: {}'.format(pep_graph.number_of_nodes(),
+                                                                  pep_graph.number_of_edges()))
+
+    return pep_graph
+
+
+def check_equivalence(link_csv_path: str, header_csv_path: str) -> bool:
+    """
+    保存済みのCSVから、隣接行列を経由したグラフとmake_pep_graphのグラフを作成して比較する
+    :param link_csv_path: PepLinkDestinationAcquirer.to_csvで保存したCSVのパス
+    :param header_csv_path: PepHeaderAcquirer.to_csvで保存したCSVのパス
+    :return: 2つのグラフが同じであればTrue
+    """
+    link_df = pd.read_csv(link_csv_path, encoding='utf-8', index_col=0, dtype=str).astype(int)
+    header_df = pd.read_csv(header_csv_path, encoding='utf-8', index_col=0, dtype=str)
+
+    differences = diff_pep_graphs(make_dense_pep_graph(link_df, header_df),
+                                  make_pep_graph(link_df, header_df))
+    for difference in differences:
+        print(difference)
+    print('Equivalent.' if not differences else '{} differences found.'.format(len(differences)))
+    return not differences
+
+
+def make_pep_graph_streaming(pep_acquirer: PepHeaderAndLinkAcquirer,
+                             output_root_path: str,
+                             **acquire_kwargs) -> nx.DiGraph:
+    """
+    PEPを1件取得するごとに、CSVへの書き込みとグラフへの追加を行う
+    すべてのレコードをメモリに保持しないので、取得とグラフ作成を並行して進められる
+    :param pep_acquirer: 基本情報とリンク数を取得するAcquirer
+    :param output_root_path: CSVの出力先のフォルダのパス
+    :param acquire_kwargs: iter_acquireに渡す引数
+    :return: PEPのグラフ
+    """
+    builder = StreamingPepGraphBuilder()
+    records = pep_acquirer.iter_acquire(**acquire_kwargs)
+
+    # ファイル名に取得日時を使うので、最初のレコードを取得してからファイルを開く
+    first_record = next(records, None)
+    fetch_datetime = pep_acquirer.fetch_start_datetime_str
+    header_path = os.path.join(output_root_path, 'pep_header_{}.csv'.format(fetch_datetime))
+    link_path = os.path.join(output_root_path, 'pep_link_edges_{}.csv'.format(fetch_datetime))
+
+    with PepHeaderCsvRowWriter(header_path) as header_writer, \
+            PepLinkEdgeCsvRowWriter(link_path) as link_writer:
+        for pep_id, record in itertools.chain([first_record] if first_record else [], records):
+            header_writer.write(pep_id, record['header'])
+            link_writer.write(pep_id, record['link'])
+            builder.add_record(pep_id, record)
+
+    logger.info('Completed to save csv file: {}, {}'.format(header_path, link_path))
+    return builder.build(pep_acquirer.fetch_start_datetime)
+
+
+def update_previous_pep_graph(pep_acquirer: PepHeaderAndLinkAcquirer,
+                              previous_graph_dir_path: str,
+                              output_root_path: str,
+                              verify: bool = False) -> nx.DiGraph:
+    """
+    前回保存したグラフを、差分取得で追加・削除・変更されたPEPだけで更新し、変更内容をJSONで保存する
+    :param pep_acquirer: baseline_raw_dir_pathを指定して取得したAcquirer
+    :param previous_graph_dir_path: save_pep_graphで保存した前回のグラフのフォルダのパス
+    :param output_root_path: 変更内容のJSONの出力先のフォルダのパス
+    :param verify: Trueの場合は、すべてのレコードから作り直したグラフと比較する
+    :return: 更新したグラフ
+    """
+    # 指標と座標はグラフ全体から計算し直すので、読み込まない
+    pep_graph = load_pep_graph(previous_graph_dir_path, include_metrics=False, include_positions=False)
+    change_report = update_pep_graph(pep_graph, pep_acquirer.data, pep_acquirer.changeset,
+                                     pep_acquirer.fetch_start_datetime)
+    change_sizes = {key: len(value) for key, value in change_report.items()}
+    log_event(logger, 'graph_changes', message='Graph changes: {}'.format(change_sizes), **change_sizes)
+
+    file_name = 'pep_graph_changes_{}.json'.format(pep_acquirer.fetch_start_datetime_str)
+    with open(os.path.join(output_root_path, file_name), mode='w', encoding='utf-8') as f:
+        f.write(change_report_to_json(change_report))
+
+    if verify:
+        rebuilt_graph = make_pep_graph_from_records(pep_acquirer.link_acquirer.data,
+                                                    header_records_from_dataframe(pep_acquirer.header_acquirer.to_dataframe()),
+                                                    pep_acquirer.fetch_start_datetime)
+        differences = diff_pep_graphs(rebuilt_graph, pep_graph, ignore_node_order=True)
+        for difference in differences:
+            logger.warning(difference)
+        if differences:
+            raise ValueError('The updated graph differs from the rebuilt graph: {} differences'.format(
+                len(differences)))
+        logger.info('Updated graph is equivalent to the rebuilt graph.')
+
+    return pep_graph
+
+
+def load_pep_graph_positions(graph_dir_path: str, layout_cache: LayoutCache) -> dict:
+    """
+    保存済みのグラフのノードの座標を返す。座標を保存していない場合は、配置を計算する
+    :return: PEPの番号ごとの座標(x, y)の辞書
+    """
+    snapshot = load_pep_graph_snapshot(graph_dir_path)
+    if snapshot.positions is None:
+        return layout_pep_graph(snapshot, cache=layout_cache)
+    return {str(pep_id): (x, y) for pep_id, (x, y) in zip(snapshot.node_ids, snapshot.positions.tolist())
+            if x == x and y == y}
+
+
+def analyze_pep_graphs(graph_dir_paths: list) -> None:
+    """
+    保存済みのグラフの指標（次数、PageRank、HITS、媒介中心性）を計算し直して、同じフォルダに保存し直す
+    過去のスナップショットに指標を追加するときに使用する
+    """
+    for graph_dir_path in graph_dir_paths:
+        with span('analyze', graph_dir_path=str(graph_dir_path)):
+            pep_graph = load_pep_graph(graph_dir_path, include_metrics=False)
+            add_pep_graph_metrics(pep_graph)
+            save_pep_graph(pep_graph, graph_dir_path)
+        logger.info('Completed to save metrics: {}'.format(graph_dir_path))
+
+
+def main(output_root_path: str=None,
+         max_workers: int = 1,
+         requests_per_second: float = 1.0,
+         http_cache_dir_path: str = None,
+         baseline_raw_dir_path: str = None,
+         raw_data_store_path: str = None,
+         streaming: bool = False,
+         resume: bool = False,
+         link_format: str = 'wide',
+         write_gpickle: bool = False,
+         previous_graph_dir_path: str = None,
+         verify_update: bool = False,
+         layout_cache_dir_path: str = None,
+         analytics: bool = True,
+         reachability: bool = False,
+         search_index: bool = False) -> None:
     if not output_root_path:
         output_root_path = dt.now().strftime('%Y%m%d')
 
+    raw_data_store = ContentAddressedRawDataStore(raw_data_store_path) if raw_data_store_path else None
+
+    # 段階ごとの実行時間・メモリとカウンタはinstrumentationで記録する（--run-reportで保存できる）
     # Pythonのリリース情報の取得
-    python_release_acquirer = PythonReleaseAcquirer()
-    python_release_acquirer.acquire()
+    with span('acquire_python_release'):
+        python_release_acquirer = PythonReleaseAcquirer(http_cache_dir_path=http_cache_dir_path)
+        python_release_acquirer.acquire()
 
-    python_release_acquirer.to_csv(output_root_path)
+        python_release_acquirer.to_csv(output_root_path)
 
-    # PEP Headerの取得
+    # PEPの基本情報と各PEPのリンク先PEPの取得
+    # 個別ページは1回だけパースして、両方を同時に抽出する
     raw_root_path = os.path.join(output_root_path, 'raw')
-    pep_header_acquirer = PepHeaderAcquirer(raw_data_out_root_path=raw_root_path,
-                                            should_save_raw_data=True)
-    pep_header_acquirer.acquire()
-    pep_header_df = pep_header_acquirer.to_dataframe()
+    pep_acquirer = PepHeaderAndLinkAcquirer(raw_data_out_root_path=raw_root_path,
+                                            should_save_raw_data=True,
+                                            max_workers=max_workers,
+                                            requests_per_second=requests_per_second,
+                                            http_cache_dir_path=http_cache_dir_path,
+                                            raw_data_store=raw_data_store,
+                                            checkpoint_path=os.path.join(output_root_path,
+                                                                         'pep_checkpoint.jsonl'))
+    if streaming:
+        # 取得とグラフへの追加を交互に行うので、1つの段階として記録する
+        with span('acquire_and_build_graph_streaming'):
+            pep_graph = make_pep_graph_streaming(pep_acquirer, output_root_path,
+                                                 baseline_raw_dir_path=baseline_raw_dir_path,
+                                                 resume=resume)
+    else:
+        with span('acquire_peps'):
+            pep_acquirer.acquire(baseline_raw_dir_path=baseline_raw_dir_path,
+                                 resume=resume)
 
-    pep_header_acquirer.to_csv(out_root_path=output_root_path)
+        with span('save_csv', link_format=link_format):
+            if link_format == 'wide':
+                pep_acquirer.to_csv(out_root_path=output_root_path)
+            else:
+                # リンク数は隣接行列ではなく、リンクごとに1行の縦持ちの形式で保存する
+                pep_acquirer.header_acquirer.to_csv(out_root_path=output_root_path)
+                pep_acquirer.link_acquirer.to_edge_list(out_root_path=output_root_path,
+                                                        file_format=link_format)
 
-    # 取得済みのPEPリスト
-    acquired_pep_ids = list(pep_header_acquirer.data.keys())
+        # make pep graph
+        if previous_graph_dir_path and pep_acquirer.changeset is not None:
+            # 前回のグラフを、変更のあったPEPの分だけ書き換える
+            with span('update_graph'):
+                pep_graph = update_previous_pep_graph(pep_acquirer, previous_graph_dir_path,
+                                                      output_root_path, verify=verify_update)
+        else:
+            # 取得結果の辞書から直接作成するので、隣接行列のDataFrameは作らない
+            with span('build_graph'):
+                pep_graph = make_pep_graph_from_records(pep_acquirer.link_acquirer.data,
+                                                        header_records_from_dataframe(pep_acquirer.header_acquirer.to_dataframe()),
+                                                        pep_acquirer.fetch_start_datetime)
+    count('graph_nodes', pep_graph.number_of_nodes())
+    count('graph_edges', pep_graph.number_of_edges())
 
-    # 各PEPのリンク先PEPの取得
-    # ローカルファイルから取得する
-    raw_data_dir_path = pep_header_acquirer.raw_data_out_dir_path
+    if http_cache_dir_path:
+        log_event(logger, 'http_cache',
+                  message='HTTP cache: {} hits, {} misses'.format(pep_acquirer.cache_hit_count,
+                                                                  pep_acquirer.cache_miss_count),
+                  hits=pep_acquirer.cache_hit_count, misses=pep_acquirer.cache_miss_count)
 
-    pep_link_acquirer = PepLinkDestinationAcquirer()
-    pep_link_acquirer.acquire(pep_ids=acquired_pep_ids,
-                              input_local_dir_path=raw_data_dir_path)
-    pep_link_df = pep_link_acquirer.to_dataframe()
+    if search_index:
+        # 今回保存したHTMLから作成するので、PEPを取得し直す必要はない
+        with span('search_index'):
+            search_index_path = save_search_index(make_search_index(pep_acquirer.raw_data_out_dir_path,
+                                                                    raw_data_store),
+                                                  output_root_path)
+        logger.info('Completed to save search index: {}'.format(search_index_path))
 
-    pep_link_acquirer.to_csv(output_root_path)
+    if analytics:
+        with span('analytics'):
+            add_pep_graph_metrics(pep_graph)
 
-    # make pep graph
-    pep_graph = make_pep_graph(pep_link_df,
-                               pep_header_df,
-                               pep_link_acquirer.fetch_start_datetime)
+    if layout_cache_dir_path:
+        # 前回のグラフの座標から始めるので、スナップショットの間で配置がほとんど変わらない
+        # 座標はノードの属性positionに設定され、グラフと一緒に保存される
+        with span('layout'):
+            layout_cache = LayoutCache(layout_cache_dir_path)
+            previous_positions = None
+            if previous_graph_dir_path:
+                previous_positions = load_pep_graph_positions(previous_graph_dir_path, layout_cache)
+            layout_pep_graph(pep_graph,
+                             previous_positions=previous_positions,
+                             cache=layout_cache)
+        logger.info('Completed to layout graph: {}'.format(layout_cache.cache_dir_path))
 
     # Save
     fetch_datetime = pep_graph.graph['fetch_start_datetime'].strftime('%Y%m%d-%H%M%S')
-    file_name = 'pep_graph_{fetch_datetime}.gpickle'.format(fetch_datetime=fetch_datetime)
-    file_path = os.path.join(output_root_path, file_name)
+    dir_name = 'pep_graph_{fetch_datetime}'.format(fetch_datetime=fetch_datetime)
+    with span('save_graph'):
+        dir_path = save_pep_graph(pep_graph, os.path.join(output_root_path, dir_name))
+    logger.info('Completed to save graph: {}'.format(dir_path))
+
+    if reachability:
+        reachability_dir_path = os.path.join(output_root_path,
+                                              'pep_reachability_{}'.format(fetch_datetime))
+        with span('reachability'):
+            save_reachability_index(build_reachability_index(load_pep_graph_snapshot(dir_path)),
+                                    reachability_dir_path)
+        logger.info('Completed to save reachability index: {}'.format(reachability_dir_path))
 
-    nx.write_gpickle(pep_graph, file_path)
+    if write_gpickle:
+        # 旧形式。pickleは信頼できないファイルを読み込むと危険なので、互換性のためにだけ残している
+        file_path = os.path.join(output_root_path, '{}.gpickle'.format(dir_name))
+        with open(file_path, mode='wb') as f:
+            pickle.dump(pep_graph, f, pickle.HIGHEST_PROTOCOL)
 
 
 if __name__ == '__main__':
@@ -109,7 +328,104 @@ if __name__ == '__main__':
                         '--destination',
                         type=str,
                         help='出力となるフォルダのパス。デフォルトでは実行時の日付')
+    parser.add_argument('-w',
+                        '--workers',
+                        type=int,
+                        default=1,
+                        help='PEPを並行して取得するスレッド数。デフォルトでは1（逐次取得）')
+    parser.add_argument('--requests-per-second',
+                        type=float,
+                        default=1.0,
+                        help='並行取得時の1秒あたりのリクエスト数の上限。デフォルトでは1.0')
+    parser.add_argument('--http-cache',
+                        type=str,
+                        default=None,
+                        help='条件付きGETのキャッシュを保存するフォルダのパス。デフォルトではキャッシュしない')
+    parser.add_argument('-b',
+                        '--baseline',
+                        type=str,
+                        default=None,
+                        help='差分取得の基準とする前回のHTMLのフォルダ(<出力フォルダ>/raw/<YYYYmmdd-HHMMSS>)のパス')
+    parser.add_argument('--raw-store',
+                        type=str,
+                        default=None,
+                        help='取得したHTMLを圧縮して内容ごとに1回だけ保存するストアのフォルダのパス。'
+                             'デフォルトでは<出力フォルダ>/raw/<YYYYmmdd-HHMMSS>にそのまま保存する')
+    parser.add_argument('--streaming',
+                        action='store_true',
+                        help='PEPを1件取得するごとにCSVへの書き込みとグラフへの追加を行う。'
+                             'リンク数はリンク元・リンク先・リンク数の縦持ちのCSVで出力する')
+    parser.add_argument('--resume',
+                        action='store_true',
+                        help='中断した実行を、<出力フォルダ>/pep_checkpoint.jsonlに記録済みのPEPの続きから再開する')
+    parser.add_argument('--link-format',
+                        type=str,
+                        default='wide',
+                        choices=('wide',) + EDGE_LIST_FILE_FORMATS,
+                        help='リンク数の保存形式。wideは隣接行列のCSV、csv/parquet/featherは'
+                             'リンク元・リンク先・リンク数の縦持ちの形式。デフォルトではwide')
+    parser.add_argument('--gpickle',
+                        action='store_true',
+                        help='グラフを旧形式のgpickleファイルとしても保存する')
+    parser.add_argument('--previous-graph',
+                        type=str,
+                        default=None,
+                        help='--baselineと同じ実行で保存したグラフのフォルダ(<出力フォルダ>/pep_graph_<YYYYmmdd-HHMMSS>)のパス。'
+                             '指定した場合は、変更のあったPEPの分だけグラフを書き換え、'
+                             '変更内容をpep_graph_changes_<YYYYmmdd-HHMMSS>.jsonに保存する')
+    parser.add_argument('--verify-update',
+                        action='store_true',
+                        help='--previous-graphで書き換えたグラフが、すべてのPEPから作り直したグラフと同じかを確認する')
+    parser.add_argument('--layout-cache',
+                        type=str,
+                        default=None,
+                        help='ノードの座標のキャッシュを保存するフォルダのパス。指定した場合は座標を計算してグラフと一緒に保存する。'
+                             '--previous-graphを指定した場合は、前回のグラフの座標から計算を始める。デフォルトでは座標を計算しない')
+    parser.add_argument('--no-analytics',
+                        action='store_true',
+                        help='グラフの指標（次数、PageRank、HITS、媒介中心性）を計算しない')
+    parser.add_argument('--reachability',
+                        action='store_true',
+                        help='PEPの組ごとの到達可能性・最短経路の索引をpep_reachability_<YYYYmmdd-HHMMSS>に保存する')
+    parser.add_argument('--search-index',
+                        action='store_true',
+                        help='取得したHTMLから、タイトル・基本情報・本文の検索用の索引pep_search_index.jsonを作成する')
+    parser.add_argument('--analyze',
+                        type=str,
+                        nargs='+',
+                        metavar='GRAPH_DIR',
+                        default=None,
+                        help='保存済みのグラフのフォルダ(pep_graph_<YYYYmmdd-HHMMSS>)の指標を計算して保存し直して終了する')
+    parser.add_argument('--check-equivalence',
+                        type=str,
+                        nargs=2,
+                        metavar=('LINK_CSV', 'HEADER_CSV'),
+                        default=None,
+                        help='保存済みのCSVから、隣接行列を経由したグラフと同じグラフが作成されるかを確認して終了する')
+    add_instrumentation_arguments(parser)
     args = parser.parse_args()
+    if args.check_equivalence:
+        is_equivalent = check_equivalence(*args.check_equivalence)
+        raise SystemExit(0 if is_equivalent else 1)
+    if args.analyze:
+        with instrumented_run('analyze_pep_graphs', args):
+            analyze_pep_graphs(args.analyze)
+        raise SystemExit(0)
     # TODO: パスのチェック
-    # TODO: ログ出力
-    main(output_root_path=args.destination)
+    with instrumented_run('make_pep_graph', args):
+        main(output_root_path=args.destination,
+             max_workers=args.workers,
+             requests_per_second=args.requests_per_second,
+             http_cache_dir_path=args.http_cache,
+             baseline_raw_dir_path=args.baseline,
+             raw_data_store_path=args.raw_store,
+             streaming=args.streaming,
+             resume=args.resume,
+             link_format=args.link_format,
+             write_gpickle=args.gpickle,
+             previous_graph_dir_path=args.previous_graph,
+             verify_update=args.verify_update,
+             layout_cache_dir_path=args.layout_cache,
+             analytics=not args.no_analytics,
+             reachability=args.reachability,
+             search_index=args.search_index)
@@ -0,0 +1,364 @@
+import base64
+import bisect
+import collections
+import json
+import math
+import os
+from pathlib import Path
+import re
+import unicodedata
+
+from bs4 import BeautifulSoup
+
+from graph.graph_builder import EXCLUDED_PEP_IDS
+
+# 保存形式を変更したときは、この値を増やしてload_search_indexで読み分ける
+FORMAT_VERSION = 1
+INDEX_FILE_NAME = 'pep_search_index.json'
+SCRIPT_FILE_NAME = 'pep_search.js'
+
+# フィールドごとの重み。タイトルに含まれる語を本文に含まれる語より上位にする
+TITLE_WEIGHT = 8
+HEADER_WEIGHT = 2
+BODY_WEIGHT = 1
+
+# 前方一致で展開する語の数の上限と、前方一致を行う最短の文字数
+MAX_PREFIX_EXPANSIONS = 200
+MIN_PREFIX_LENGTH = 2
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> list:
+    """
+    英数字の連続を小文字にして語に分ける。1文字の語は数字だけ残す
+    pep_search.jsのtokenizeと同じ規則にすること
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return [token for token in _TOKEN_PATTERN.findall(text) if len(token) > 1 or token.isdigit()]
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """
+    0以上の整数を、下位から7ビットずつ、続きがあるバイトの最上位ビットを立てて書き込む
+    """
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data: bytes, start: int, end: int) -> list:
+    values = []
+    value = 0
+    shift = 0
+    for byte in data[start:end]:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
+
+def extract_search_document(html: bytes) -> dict:
+    """
+    PEPの個別ページのHTMLから、検索対象のタイトル・基本情報・本文を取り出す
+    :return: title（文字列）, header（フィールド名と値の辞書）, body（文字列）をキーとした辞書
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    header_dict = {}
+    table_tag = soup.select_one('table.rfc2822')
+    if table_tag:
+        for tr_tag in table_tag.find_all('tr'):
+            if tr_tag.find('th') and tr_tag.find('td'):
+                header_dict[tr_tag.find('th').text.replace(':', '').strip()] = tr_tag.find('td').text.strip()
+        table_tag.decompose()
+
+    content_tag = soup.select_one('#pep-content') or soup.find('article') or soup.body or soup
+    for tag in content_tag.find_all(['script', 'style', 'nav']):
+        tag.decompose()
+    return dict(title=header_dict.get('Title', ''),
+                header=header_dict,
+                body=content_tag.get_text(' '))
+
+
+def iter_raw_html(raw_dir_path: str, raw_data_store=None):
+    """
+    PepAcquirerが保存したスナップショット（raw/<YYYYmmdd-HHMMSS>のpep-NNNN.html）のHTMLを順に返す
+    :param raw_data_store: HTMLをContentAddressedRawDataStoreに保存している場合のストア
+    :return: (PEPの番号, HTML)のイテレータ
+    """
+    raw_dir_path = Path(raw_dir_path)
+    if raw_data_store:
+        file_names = raw_data_store.list_files(raw_dir_path.name)
+        read = lambda file_name: raw_data_store.get(raw_dir_path.name, file_name)  # noqa: E731
+    else:
+        file_names = [path.name for path in raw_dir_path.glob('pep-*.html')]
+        read = lambda file_name: (raw_dir_path / file_name).read_bytes()  # noqa: E731
+
+    for file_name in sorted(file_names):
+        match = re.fullmatch(r'pep-(\d+)\.html', file_name)
+        if match:
+            yield match.group(1), read(file_name)
+
+
+class PepSearchIndex:
+    """
+    語からPEPを引く転置索引
+    語は辞書順に並べ、語ごとのポスティングリストは(PEPの位置の差分, スコア)をvarintで詰めたバイト列にする
+    スコアはフィールドの重み×出現回数の合計で、検索時は逆文書頻度を掛けて合計する
+    """
+
+    def __init__(self, pep_ids: list, titles: list, terms: list, offsets: list, postings: bytes) -> None:
+        self._pep_ids = pep_ids
+        self._titles = titles
+        self._terms = terms
+        self._offsets = offsets
+        self._postings = postings
+
+    @property
+    def pep_ids(self) -> list:
+        return self._pep_ids
+
+    @property
+    def terms(self) -> list:
+        return self._terms
+
+    def postings(self, term: str) -> dict:
+        """
+        :return: 語を含むPEPの位置ごとのスコアの辞書。語がなければ空の辞書
+        """
+        i = bisect.bisect_left(self._terms, term)
+        if i == len(self._terms) or self._terms[i] != term:
+            return {}
+        return self._decode_postings(i)
+
+    def _decode_postings(self, term_index: int) -> dict:
+        values = decode_varints(self._postings, self._offsets[term_index], self._offsets[term_index + 1])
+        postings = {}
+        doc_index = 0
+        for delta, score in zip(values[0::2], values[1::2]):
+            doc_index += delta
+            postings[doc_index] = score
+        return postings
+
+    def _idf(self, postings: dict) -> float:
+        return math.log(1 + len(self._pep_ids) / len(postings))
+
+    def _term_scores(self, token: str, is_prefix: bool) -> dict:
+        """
+        語（前方一致の場合は語で始まるすべての語）の、PEPの位置ごとのスコア
+        """
+        start = bisect.bisect_left(self._terms, token)
+        if is_prefix and len(token) >= MIN_PREFIX_LENGTH:
+            end = start
+            while (end < len(self._terms) and end - start < MAX_PREFIX_EXPANSIONS
+                   and self._terms[end].startswith(token)):
+                end += 1
+        else:
+            end = start + 1 if start < len(self._terms) and self._terms[start] == token else start
+
+        scores = {}
+        for term_index in range(start, end):
+            postings = self._decode_postings(term_index)
+            idf = self._idf(postings)
+            for doc_index, score in postings.items():
+                scores[doc_index] = max(scores.get(doc_index, 0), score * idf)
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        すべての語を含むPEPを、スコアの高い順に返す。最後の語は入力途中とみなして前方一致で探す
+        pep_search.jsのpepSearchと同じ結果になる
+        :return: pep_id, title, scoreをキーとした辞書のリスト
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        total_scores = None
+        for i, token in enumerate(tokens):
+            scores = self._term_scores(token, is_prefix=(i == len(tokens) - 1))
+            if total_scores is None:
+                total_scores = scores
+            else:
+                total_scores = {doc_index: total_scores[doc_index] + score
+                                for doc_index, score in scores.items() if doc_index in total_scores}
+            if not total_scores:
+                return []
+
+        ranked = sorted(total_scores.items(), key=lambda x: (-x[1], x[0]))[:limit]
+        return [dict(pep_id=self._pep_ids[doc_index], title=self._titles[doc_index], score=score)
+                for doc_index, score in ranked]
+
+    def to_dict(self) -> dict:
+        return dict(format_version=FORMAT_VERSION,
+                    pep_ids=self._pep_ids,
+                    titles=self._titles,
+                    terms=self._terms,
+                    offsets=self._offsets,
+                    postings=base64.b64encode(self._postings).decode('ascii'))
+
+
+def build_search_index(documents: dict) -> PepSearchIndex:
+    """
+    :param documents: PEPの番号ごとの、extract_search_documentの辞書
+    :return: 検索用の索引
+    """
+    pep_ids = sorted(documents)
+    titles = [documents[pep_id]['title'] for pep_id in pep_ids]
+    term_postings = collections.defaultdict(list)
+    for doc_index, pep_id in enumerate(pep_ids):
+        document = documents[pep_id]
+        scores = collections.Counter()
+        # PEPの番号でも引けるようにする（"484"と"0484"）
+        for token in {pep_id, pep_id.lstrip('0') or '0'}:
+            scores[token] += TITLE_WEIGHT
+        for token in tokenize(document['title']):
+            scores[token] += TITLE_WEIGHT
+        for field_name, value in document['header'].items():
+            if field_name != 'Title':
+                for token in tokenize(value):
+                    scores[token] += HEADER_WEIGHT
+        for token in tokenize(document['body']):
+            scores[token] += BODY_WEIGHT
+        for token, score in scores.items():
+            term_postings[token].append((doc_index, score))
+
+    terms = sorted(term_postings)
+    postings = bytearray()
+    offsets = [0]
+    for term in terms:
+        previous_doc_index = 0
+        for doc_index, score in term_postings[term]:
+            encode_varint(doc_index - previous_doc_index, postings)
+            encode_varint(score, postings)
+            previous_doc_index = doc_index
+        offsets.append(len(postings))
+    return PepSearchIndex(pep_ids, titles, terms, offsets, bytes(postings))
+
+
+def make_search_index(raw_dir_path: str, raw_data_store=None,
+                      excluded_pep_ids: tuple = EXCLUDED_PEP_IDS) -> PepSearchIndex:
+    """
+    スナップショットのHTMLから検索用の索引を作成する
+    :param excluded_pep_ids: 索引に含めないPEP。グラフと同じく、目次のPEP 0を除外する
+    """
+    documents = {pep_id: extract_search_document(html)
+                 for pep_id, html in iter_raw_html(raw_dir_path, raw_data_store)
+                 if pep_id not in excluded_pep_ids}
+    return build_search_index(documents)
+
+
+def save_search_index(index: PepSearchIndex, out_dir_path: str) -> Path:
+    """
+    索引をpep_search_index.jsonとして、ブラウザで検索するためのpep_search.jsと一緒に保存する
+    :return: 索引のファイルのパス
+    """
+    os.makedirs(out_dir_path, exist_ok=True)
+    path = Path(out_dir_path) / INDEX_FILE_NAME
+    with path.open(mode='w', encoding='utf-8') as f:
+        json.dump(index.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+    (Path(out_dir_path) / SCRIPT_FILE_NAME).write_text(SEARCH_SCRIPT, encoding='utf-8')
+    return path
+
+
+def load_search_index(path: str) -> PepSearchIndex:
+    with Path(path).open(mode='r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format_version') != FORMAT_VERSION:
+        raise ValueError('Unsupported search index format version: {} (expected {})'.format(
+            data.get('format_version'), FORMAT_VERSION))
+    return PepSearchIndex(data['pep_ids'], data['titles'], data['terms'], data['offsets'],
+                          base64.b64decode(data['postings']))
+
+
+# ブラウザ用の検索関数。pepLoadSearchIndexでpep_search_index.jsonの内容を読み込み、pepSearchで検索する
+# PepSearchIndex.searchと同じ規則で検索するので、変更するときは両方を変更すること
+SEARCH_SCRIPT = r'''(function (root) {
+  var MAX_PREFIX_EXPANSIONS = %(max_prefix_expansions)d;
+  var MIN_PREFIX_LENGTH = %(min_prefix_length)d;
+
+  function tokenize(text) {
+    var tokens = (text || '').normalize('NFKC').toLowerCase().match(/[a-z0-9]+/g) || [];
+    return tokens.filter(function (token) { return token.length > 1 || /^[0-9]$/.test(token); });
+  }
+
+  function bisectLeft(terms, term) {
+    var lo = 0, hi = terms.length;
+    while (lo < hi) {
+      var mid = (lo + hi) >>> 1;
+      if (terms[mid] < term) { lo = mid + 1; } else { hi = mid; }
+    }
+    return lo;
+  }
+
+  function decodePostings(index, termIndex) {
+    var bytes = index.postings, end = index.offsets[termIndex + 1];
+    var docs = [], scores = [], value = 0, shift = 0, isDoc = true, doc = 0;
+    for (var i = index.offsets[termIndex]; i < end; i++) {
+      var b = bytes[i];
+      value += (b & 0x7f) * Math.pow(2, shift);
+      if (b & 0x80) { shift += 7; continue; }
+      if (isDoc) { doc += value; docs.push(doc); } else { scores.push(value); }
+      isDoc = !isDoc; value = 0; shift = 0;
+    }
+    return {docs: docs, scores: scores};
+  }
+
+  function termScores(index, token, isPrefix) {
+    var terms = index.terms, start = bisectLeft(terms, token), end = start;
+    if (isPrefix && token.length >= MIN_PREFIX_LENGTH) {
+      while (end < terms.length && end - start < MAX_PREFIX_EXPANSIONS
+             && terms[end].lastIndexOf(token, 0) === 0) { end++; }
+    } else if (start < terms.length && terms[start] === token) {
+      end = start + 1;
+    }
+    var scores = new Map();
+    for (var t = start; t < end; t++) {
+      var postings = decodePostings(index, t);
+      var idf = Math.log(1 + index.pep_ids.length / postings.docs.length);
+      for (var i = 0; i < postings.docs.length; i++) {
+        var score = postings.scores[i] * idf, previous = scores.get(postings.docs[i]);
+        if (previous === undefined || score > previous) { scores.set(postings.docs[i], score); }
+      }
+    }
+    return scores;
+  }
+
+  root.pepLoadSearchIndex = function (data) {
+    var binary = root.atob ? root.atob(data.postings) : Buffer.from(data.postings, 'base64').toString('binary');
+    var postings = new Uint8Array(binary.length);
+    for (var i = 0; i < binary.length; i++) { postings[i] = binary.charCodeAt(i); }
+    return {pep_ids: data.pep_ids, titles: data.titles, terms: data.terms,
+            offsets: data.offsets, postings: postings};
+  };
+
+  root.pepSearch = function (index, query, limit) {
+    var tokens = tokenize(query);
+    if (tokens.length === 0) { return []; }
+    var total = null;
+    for (var i = 0; i < tokens.length; i++) {
+      var scores = termScores(index, tokens[i], i === tokens.length - 1);
+      if (total === null) {
+        total = scores;
+      } else {
+        var next = new Map();
+        scores.forEach(function (score, doc) {
+          if (total.has(doc)) { next.set(doc, total.get(doc) + score); }
+        });
+        total = next;
+      }
+      if (total.size === 0) { return []; }
+    }
+    var ranked = Array.from(total.entries());
+    ranked.sort(function (a, b) { return b[1] - a[1] || a[0] - b[0]; });
+    return ranked.slice(0, limit === undefined ? 20 : limit).map(function (entry) {
+      return {pep_id: index.pep_ids[entry[0]], title: index.titles[entry[0]], score: entry[1]};
+    });
+  };
+})(typeof window !== 'undefined' ? window : globalThis);
+''' % dict(max_prefix_expansions=MAX_PREFIX_EXPANSIONS, min_prefix_length=MIN_PREFIX_LENGTH)
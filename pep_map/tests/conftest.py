@@ -0,0 +1,83 @@
+from pathlib import Path
+import sys
+
+# pep_map直下のモジュール（acquirer, graph, benchmarkなど）をスクリプトと同じく読み込めるようにする
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from http.server import ThreadingHTTPServer  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+
+import pytest  # noqa: E402
+
+from benchmark.synthetic_corpus import CorpusRequestHandler, serve_corpus, write_corpus  # noqa: E402
+
+
+@pytest.fixture
+def corpus_server(tmp_path):
+    """
+    合成したPEPのページをローカルのHTTPサーバで公開し、(コーパスのフォルダ, base_url)を返す
+    """
+    corpus_dir_path = tmp_path / 'corpus'
+    write_corpus(corpus_dir_path, 30, seed=3)
+    server, base_url = serve_corpus(corpus_dir_path)
+    yield corpus_dir_path, base_url
+    server.shutdown()
+    server.server_close()
+
+
+class RecordingCorpusServer(ThreadingHTTPServer):
+    """
+    受け取ったリクエストと同時に処理していたリクエストの数を記録し、指定したパスには失敗の応答を返すサーバ
+    """
+    daemon_threads = True
+
+    def __init__(self, corpus_dir_path, delay_seconds: float = 0.0) -> None:
+        handler = lambda *args, **kwargs: RecordingCorpusRequestHandler(  # noqa: E731
+            *args, directory=str(corpus_dir_path), **kwargs)
+        super().__init__(('127.0.0.1', 0), handler)
+        self.delay_seconds = delay_seconds
+        self.lock = threading.Lock()
+        self.requested_paths = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # パスごとに、順に返すエラーのステータスコードのリスト
+        self.error_statuses = {}
+
+    @property
+    def base_url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class RecordingCorpusRequestHandler(CorpusRequestHandler):
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.requested_paths.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            statuses = server.error_statuses.get(self.path)
+            status = statuses.pop(0) if statuses else None
+        time.sleep(server.delay_seconds)
+        # 応答を返す前に減らすので、クライアントが次のリクエストを送っても多く数えることはない
+        with server.lock:
+            server.in_flight -= 1
+
+        if status:
+            self.send_error(status)
+        else:
+            super().do_GET()
+
+
+@pytest.fixture
+def recording_corpus_server(tmp_path):
+    """
+    合成したPEPのページを、リクエストを記録するローカルのHTTPサーバで公開する
+    """
+    corpus_dir_path = tmp_path / 'corpus'
+    write_corpus(corpus_dir_path, 30, seed=3)
+    server = RecordingCorpusServer(corpus_dir_path, delay_seconds=0.05)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,85 @@
+import logging
+import shutil
+
+from acquirer.pep_acquirer import PepHeaderAndLinkAcquirer
+
+
+def requested_pep_ids(server) -> list:
+    """
+    サーバが受け取ったリクエストのうち、PEPの個別ページ（PEP 0を除く）の番号
+    """
+    paths = [path.rstrip('/') for path in server.requested_paths]
+    return [path.rsplit('pep-', 1)[1] for path in paths if 'pep-' in path and not path.endswith('pep-0000')]
+
+
+def test_resume_fetches_only_missing_peps(recording_corpus_server, tmp_path):
+    server = recording_corpus_server
+    # 前回の取得結果として、out_root/raw/<YYYYmmdd-HHMMSS>/ のHTMLとout_root/のCSVを用意する
+    baseline_raw_dir_path = tmp_path / 'previous' / 'raw' / '20200101-000000'
+    shutil.copytree(tmp_path / 'corpus', baseline_raw_dir_path)
+    baseline_acquirer = PepHeaderAndLinkAcquirer()
+    baseline_acquirer.acquire(input_local_dir_path=str(baseline_raw_dir_path))
+    baseline_acquirer.to_csv(str(tmp_path / 'previous'))
+
+    def make_acquirer() -> PepHeaderAndLinkAcquirer:
+        return PepHeaderAndLinkAcquirer(base_url=server.base_url,
+                                        max_workers=4,
+                                        requests_per_second=1000,
+                                        checkpoint_path=str(tmp_path / 'checkpoint.jsonl'))
+
+    # 10件取得したところで異常終了したものとする
+    crashed_acquirer = make_acquirer()
+    journaled_pep_ids = []
+    records = crashed_acquirer.iter_acquire(baseline_raw_dir_path=str(baseline_raw_dir_path))
+    for pep_id, _ in records:
+        journaled_pep_ids.append(pep_id)
+        if len(journaled_pep_ids) == 10:
+            break
+    records.close()
+
+    server.requested_paths.clear()
+    acquirer = make_acquirer()
+    data = acquirer.acquire(baseline_raw_dir_path=str(baseline_raw_dir_path), resume=True)
+
+    all_pep_ids = list(baseline_acquirer.data)
+    assert list(data) == all_pep_ids
+    assert data == baseline_acquirer.data
+    assert acquirer.fetch_start_datetime == crashed_acquirer.fetch_start_datetime
+    assert acquirer.run_summary['resumed'] == 10
+    # ジャーナルにないPEPだけを取得し直す
+    assert sorted(requested_pep_ids(server)) == sorted(set(all_pep_ids) - set(journaled_pep_ids))
+    # ジャーナルから復元したPEPも、HTMLのハッシュ値で前回と同じと判定される
+    changeset = acquirer.changeset
+    assert sorted(changeset['unchanged']) == sorted(all_pep_ids)
+    assert changeset['added'] == changeset['removed'] == changeset['changed'] == changeset['failed'] == []
+
+
+def test_retry_with_backoff(recording_corpus_server, caplog):
+    server = recording_corpus_server
+    # 0005は2回失敗してから成功し、0007は再試行しても失敗し続ける
+    server.error_statuses['/dev/peps/pep-0005'] = [503, 429]
+    server.error_statuses['/dev/peps/pep-0007'] = [500] * 4
+
+    acquirer = PepHeaderAndLinkAcquirer(base_url=server.base_url,
+                                        max_workers=2,
+                                        requests_per_second=1000,
+                                        max_retries=3,
+                                        retry_backoff_seconds=0.01)
+    with caplog.at_level(logging.WARNING):
+        data = acquirer.acquire()
+
+    assert '0005' in data
+    assert '0007' not in data
+    assert list(acquirer.failures) == ['0007']
+    assert list(acquirer.run_summary['failed']) == ['0007']
+    assert acquirer.run_summary['acquired'] == acquirer.run_summary['requested'] - 1
+
+    pep_ids = requested_pep_ids(server)
+    assert pep_ids.count('0005') == 3
+    assert pep_ids.count('0007') == 4
+    # 再試行のたびに待ち時間を2倍にする
+    backoffs = {}
+    for record in caplog.records:
+        if getattr(record, 'event', None) == 'fetch_retry':
+            backoffs.setdefault(record.fields['url'].rsplit('pep-', 1)[1], []).append(record.fields['backoff_seconds'])
+    assert backoffs == {'0005': [0.01, 0.02], '0007': [0.01, 0.02, 0.04]}
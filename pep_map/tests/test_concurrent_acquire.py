@@ -0,0 +1,22 @@
+from acquirer.pep_acquirer import PepHeaderAndLinkAcquirer
+
+
+def test_concurrent_acquire_keeps_order_and_in_flight_limit(recording_corpus_server, tmp_path):
+    server = recording_corpus_server
+    corpus_dir_path = tmp_path / 'corpus'
+    # 完了順ではなく、指定した順にレコードが並ぶことを確かめるため、逆順に指定する
+    pep_ids = sorted((path.stem[len('pep-'):] for path in corpus_dir_path.glob('pep-*.html')
+                      if path.stem != 'pep-0000'), reverse=True)
+    expected = PepHeaderAndLinkAcquirer().acquire(input_local_dir_path=str(corpus_dir_path), pep_ids=pep_ids)
+
+    acquirer = PepHeaderAndLinkAcquirer(base_url=server.base_url,
+                                        max_workers=6,
+                                        max_in_flight_per_host=2,
+                                        requests_per_second=1000)
+    data = acquirer.acquire(pep_ids=pep_ids)
+
+    assert list(data) == pep_ids
+    assert data == expected
+    assert len(server.requested_paths) == len(pep_ids)
+    # スレッドは6つあっても、同じホストへの同時リクエストは2つまで
+    assert server.max_in_flight == 2
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from acquirer.date_parser import make_pep_created_date_parser, make_release_date_parser
+
+# Createdフィールドの文字列と、変換結果（Noneは NaT）・変換に失敗したか
+# 以前のPepAcquirer._str2datetimeと同じ結果になる。'1-Mar-2001 x'のように、コメント付きの形式に
+# 一致するのに変換できない文字列は、以前は例外を投げていたが、失敗として記録するようにした
+PEP_CREATED_CASES = [
+    ('13-Mar-2001', datetime(2001, 3, 13), False),  # %d-%b-%Y
+    ('1-September-2001', datetime(2001, 9, 1), False),  # %d-%B-%Y
+    ('2001-03-13', datetime(2001, 3, 13), False),  # %Y-%m-%d
+    ('13 Mar 2001', datetime(2001, 3, 13), False),  # %d %b %Y
+    ('13 March 2001', datetime(2001, 3, 13), False),  # %d %B %Y
+    ('13-Mar-2001 (edited 20-Mar-2001)', datetime(2001, 3, 13), False),  # コメントを取り除く
+    ('05-Jul-2001, 27-Aug-2001', datetime(2001, 7, 5), False),
+    ('1-Mar-2001 x', None, True),  # 取り除いた後に空白が残る
+    ('32-Mar-2001 (typo)', None, True),
+    ('31-Feb-2001', None, True),  # 存在しない日
+    ('5-Sept-2001', None, True),
+    ('unknown', None, True),
+    ('', None, False),
+    (None, None, False),
+    (np.nan, None, False),
+]
+
+# python.orgのダウンロードページのリリース日の文字列と、変換結果・変換に失敗したか
+RELEASE_DATE_CASES = [
+    ('Oct. 24, 2022', datetime(2022, 10, 24), False),  # %b. %d, %Y
+    ('Sept. 6, 2022', datetime(2022, 9, 6), False),  # Sept.はSep.として扱う
+    ('June 6, 2022', datetime(2022, 6, 6), False),  # %B %d, %Y
+    ('Jan 5, 2021', datetime(2021, 1, 5), False),  # %b %d, %Y
+    ('Sept 6, 2022', None, True),
+    ('2022-10-24', None, True),
+    ('', None, False),
+]
+
+
+def assert_parsed(actual, expected) -> None:
+    if expected is None:
+        assert actual is pd.NaT
+    else:
+        assert actual == expected
+
+
+@pytest.mark.parametrize('make_parser, cases', [(make_pep_created_date_parser, PEP_CREATED_CASES),
+                                                (make_release_date_parser, RELEASE_DATE_CASES)])
+def test_parse(make_parser, cases):
+    parser = make_parser()
+    # 直前に成功した書式から試すので、順序を変えても結果は変わらない
+    for source_str, expected, expected_failed in cases + cases[::-1]:
+        converted, failed = parser.parse(source_str)
+        assert_parsed(converted, expected)
+        assert failed == expected_failed, source_str
+
+
+@pytest.mark.parametrize('make_parser, cases', [(make_pep_created_date_parser, PEP_CREATED_CASES),
+                                                (make_release_date_parser, RELEASE_DATE_CASES)])
+def test_parse_series(make_parser, cases):
+    series = pd.Series([source_str for source_str, _, _ in cases] * 2, dtype=object)
+    converted, failed = make_parser().parse_series(series)
+
+    expected = pd.to_datetime(pd.Series([x if x is not None else pd.NaT for _, x, _ in cases] * 2))
+    pd.testing.assert_series_equal(converted, expected, check_names=False)
+    assert failed.tolist() == [x for _, _, x in cases] * 2
@@ -0,0 +1,17 @@
+import networkx as nx
+
+from graph.graph_analytics import METRIC_NAMES, calc_pep_graph_metrics, to_csr_matrix
+from graph.graph_layout import layout_pep_graph
+from graph.reachability_index import build_reachability_index
+
+
+def test_empty_graph():
+    pep_graph = nx.DiGraph()
+
+    node_ids, matrix = to_csr_matrix(pep_graph)
+    assert node_ids == []
+    assert matrix.shape == (0, 0)
+    assert calc_pep_graph_metrics(pep_graph) == {name: {} for name in METRIC_NAMES}
+    assert list(build_reachability_index(pep_graph).node_ids) == []
+    assert layout_pep_graph(pep_graph) == {}
+    assert layout_pep_graph(pep_graph, previous_positions={'0001': (0.0, 0.0)}) == {}
@@ -0,0 +1,38 @@
+import networkx as nx
+
+from graph.graph_artifact import load_pep_graph, load_pep_graph_snapshot, save_pep_graph
+from graph.graph_builder import diff_pep_graphs
+from graph.graph_layout import layout_pep_graph
+
+
+def make_graph() -> nx.DiGraph:
+    pep_graph = nx.DiGraph()
+    pep_graph.add_node('0001', Title='PEP Purpose and Guidelines')
+    pep_graph.add_node('0008', Title='Style Guide for Python Code')
+    pep_graph.add_node('0020')
+    pep_graph.add_edge('0008', '0001', weight=2)
+    pep_graph.add_edge('0020', '0008', weight=1)
+    pep_graph.graph['fetch_start_datetime'] = None
+    return pep_graph
+
+
+def test_positions_are_saved_with_graph(tmp_path):
+    pep_graph = make_graph()
+    positions = layout_pep_graph(pep_graph)
+    save_pep_graph(pep_graph, tmp_path / 'pep_graph')
+
+    snapshot = load_pep_graph_snapshot(tmp_path / 'pep_graph')
+    # 座標は基本情報の列にはならない
+    assert snapshot.attribute_names == ['Title']
+    assert list(snapshot.has_attributes) == [True, True, False]
+    assert dict(zip(snapshot.node_ids, map(tuple, snapshot.positions.tolist()))) == positions
+
+    assert diff_pep_graphs(pep_graph, load_pep_graph(tmp_path / 'pep_graph')) == []
+    assert 'position' not in load_pep_graph(tmp_path / 'pep_graph', include_positions=False).nodes['0001']
+
+
+def test_graph_without_positions(tmp_path):
+    save_pep_graph(make_graph(), tmp_path / 'pep_graph')
+
+    assert load_pep_graph_snapshot(tmp_path / 'pep_graph').positions is None
+    assert diff_pep_graphs(make_graph(), load_pep_graph(tmp_path / 'pep_graph')) == []
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from benchmark.synthetic_corpus import generate_header_records, generate_link_records, make_pep_ids
+from graph.graph_builder import diff_pep_graphs, make_pep_graph_from_edge_list, make_pep_graph_from_records
+from graph.graph_builder import header_records_from_dataframe, link_records_from_dataframe
+from make_pep_graph import check_equivalence, make_dense_pep_graph
+
+
+@pytest.fixture
+def records() -> (dict, dict):
+    """
+    リンクのないPEP、どこからもリンクされないPEP、一部のPEPにだけあるフィールドを含むレコード
+    """
+    pep_ids = make_pep_ids(120)
+    link_records = generate_link_records(pep_ids, seed=3)
+    header_records = generate_header_records(pep_ids, seed=3)
+    for pep_id in pep_ids[:5]:
+        link_records[pep_id] = {}
+    # 目次のPEP 0と、リンクも被リンクもないPEP
+    link_records['0000'] = {pep_id: 1 for pep_id in pep_ids}
+    header_records['0000'] = dict(PEP='0', Title='Index')
+    link_records['0999'] = {}
+    header_records['0999'] = dict(PEP='999', Title='Isolated', Type='Informational')
+    header_records[pep_ids[0]]['Replaces'] = '3'
+    header_records[pep_ids[1]].pop('Status')
+    return link_records, header_records
+
+
+def to_link_df(link_records: dict) -> pd.DataFrame:
+    # PepLinkDestinationAcquirer.to_dataframeと同じ隣接行列の形式
+    return pd.DataFrame(link_records).T.fillna(0).astype(int)
+
+
+def to_header_df(header_records: dict) -> pd.DataFrame:
+    return pd.DataFrame.from_dict(header_records, orient='index')
+
+
+def to_edge_df(link_records: dict) -> pd.DataFrame:
+    edges = [(source_pep_id, destination_pep_id, count)
+             for source_pep_id, counter in link_records.items()
+             for destination_pep_id, count in sorted(counter.items()) if count]
+    return pd.DataFrame(edges, columns=['link_source_pep_id', 'link_destination_pep_id', 'count'])
+
+
+def test_records_match_dense_graph(records):
+    link_records, header_records = records
+    link_df, header_df = to_link_df(link_records), to_header_df(header_records)
+    dense_graph = make_dense_pep_graph(link_df, header_df)
+
+    assert '0000' not in dense_graph
+    assert dense_graph.degree('0999') == 0
+    assert diff_pep_graphs(dense_graph,
+                           make_pep_graph_from_records(link_records_from_dataframe(link_df),
+                                                       header_records_from_dataframe(header_df))) == []
+    assert diff_pep_graphs(dense_graph, make_pep_graph_from_edge_list(to_edge_df(link_records), header_df)) == []
+    # ストリーミング取得と同じく、フィールドが揃っていない辞書のまま渡した場合も欠損値で埋まる
+    assert diff_pep_graphs(dense_graph, make_pep_graph_from_records(link_records, header_records)) == []
+
+
+def test_check_equivalence_on_saved_csv(records, tmp_path):
+    link_records, header_records = records
+    link_csv_path, header_csv_path = tmp_path / 'pep_link.csv', tmp_path / 'pep_header.csv'
+    to_link_df(link_records).to_csv(link_csv_path, encoding='utf-8')
+    to_header_df(header_records).to_csv(header_csv_path, encoding='utf-8')
+
+    assert check_equivalence(str(link_csv_path), str(header_csv_path))
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pandas as pd
+
+from benchmark.synthetic_corpus import generate_header_records, generate_link_records, make_pep_ids
+from graph.graph_artifact import load_pep_graph, save_pep_graph
+from graph.graph_builder import diff_pep_graphs, header_records_from_dataframe, make_pep_graph_from_records
+from graph.graph_updater import update_pep_graph
+
+
+def make_records(pep_ids: list, seed: int) -> dict:
+    """
+    PepHeaderAndLinkAcquirer.dataの形式のレコード。PEP 0（目次）はすべてのPEPにリンクする
+    """
+    link_records = generate_link_records(pep_ids, seed)
+    header_records = generate_header_records(pep_ids, seed)
+    for header_dict in header_records.values():
+        header_dict['Created_dt'] = pd.to_datetime(header_dict['Created'], format='%d-%b-%Y')
+    records = {pep_id: dict(header=header_records[pep_id], link=link_records[pep_id]) for pep_id in pep_ids}
+    records['0000'] = dict(header={'PEP': '0', 'Title': 'Index'}, link={pep_id: 1 for pep_id in pep_ids})
+    return records
+
+
+def rebuild_pep_graph(records: dict, fetch_start_datetime: datetime):
+    # make_pep_graph.mainと同じく、基本情報はDataFrameを経由して揃える
+    header_df = pd.DataFrame.from_dict({pep_id: record['header'] for pep_id, record in records.items()},
+                                       orient='index')
+    return make_pep_graph_from_records({pep_id: record['link'] for pep_id, record in records.items()},
+                                       header_records_from_dataframe(header_df),
+                                       fetch_start_datetime)
+
+
+def test_update_matches_rebuild(tmp_path):
+    pep_ids = make_pep_ids(80)
+    previous_records = make_records(pep_ids, seed=0)
+    save_pep_graph(rebuild_pep_graph(previous_records, datetime(2020, 1, 1)), tmp_path / 'previous')
+
+    # 5件を削除、5件を追加、10件のリンクとタイトルを変更し、変更したPEPの1件に新しいフィールドを加える
+    removed = pep_ids[10:15]
+    added = ['{:04d}'.format(i) for i in range(81, 86)]
+    changed = pep_ids[20:30]
+    current_pep_ids = [pep_id for pep_id in pep_ids if pep_id not in removed] + added
+    regenerated = make_records(current_pep_ids, seed=1)
+    current_records = {pep_id: previous_records[pep_id] for pep_id in current_pep_ids if pep_id in previous_records}
+    current_records['0000'] = regenerated['0000']
+    for pep_id in changed + added:
+        current_records[pep_id] = regenerated[pep_id]
+    for pep_id in changed:
+        current_records[pep_id]['header']['Title'] += ' (revised)'
+    current_records[changed[0]]['header']['Discussions-To'] = 'python-dev@python.org'
+
+    changeset = dict(added=added, removed=removed, changed=changed + ['0000'],
+                     unchanged=[pep_id for pep_id in current_pep_ids if pep_id not in changed + added])
+
+    fetch_start_datetime = datetime(2020, 2, 1)
+    updated = load_pep_graph(tmp_path / 'previous', include_metrics=False)
+    report = update_pep_graph(updated, current_records, changeset, fetch_start_datetime)
+    rebuilt = rebuild_pep_graph(current_records, fetch_start_datetime)
+
+    assert diff_pep_graphs(rebuilt, updated, ignore_node_order=True) == []
+    assert set(added) <= set(report['added_nodes'])
+    assert 'Discussions-To' in report['changed_attributes'][changed[0]]
+
+    # 保存・読み込みしても同じグラフになる
+    save_pep_graph(updated, tmp_path / 'updated')
+    assert diff_pep_graphs(rebuilt, load_pep_graph(tmp_path / 'updated', include_metrics=False),
+                           ignore_node_order=True) == []
@@ -0,0 +1,55 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+
+from acquirer.http_transport import HttpTransport
+
+
+class SlowOnceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    request_count = 0
+
+    def do_GET(self) -> None:
+        SlowOnceHandler.request_count += 1
+        if SlowOnceHandler.request_count == 2:
+            # 2回目のリクエストだけ、クライアントのタイムアウトより長く待たせる
+            time.sleep(1.5)
+        body = b'hello'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address) -> None:
+        # タイムアウトしたクライアントへの書き込みの失敗（BrokenPipeError）は想定どおりなので表示しない
+        pass
+
+
+@pytest.fixture
+def slow_once_url():
+    SlowOnceHandler.request_count = 0
+    server = QuietHTTPServer(('127.0.0.1', 0), SlowOnceHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_is_usable_after_timeout(slow_once_url):
+    transport = HttpTransport(timeout=0.5)
+    assert transport.get(slow_once_url).body == b'hello'
+    with pytest.raises(TimeoutError):
+        transport.get(slow_once_url)
+    # タイムアウトした接続は捨てられ、次のリクエストは新しい接続で成功する
+    assert transport.get(slow_once_url).body == b'hello'
+    assert transport.get(slow_once_url).body == b'hello'
+    transport.close()
@@ -0,0 +1,51 @@
+import pytest
+
+import acquirer.pep_acquirer as pep_acquirer_module
+from acquirer.link_extractor import LINK_EXTRACTORS, check_parity
+from acquirer.pep_acquirer import PepHeaderAndLinkAcquirer
+from benchmark.synthetic_corpus import write_corpus
+
+# パーサと正規表現で扱いが分かれやすい書き方（コメント、クォート、文字参照、フラグメント）を含むページ
+EDGE_CASE_HTML = b"""<html><body><div id="pep-content">
+<!-- <a href="/dev/peps/pep-0001/">commented out</a> -->
+<a href='/dev/peps/pep-0002/'>single quotes</a>
+<a class=reference href=/dev/peps/pep-0003/>no quotes</a>
+<a href="https://www.python.org/dev/peps/pep-0004/#abstract">fragment</a>
+<a data-href="/dev/peps/pep-0005/" href="/dev/peps/pep-0006/">data attribute</a>
+<a href="/dev/peps/pep-0007/#a&amp;b">entity</a>
+<A HREF="/dev/peps/pep-0008/">upper case</A>
+<a href="/dev/peps/pep-0002/">duplicate</a>
+<a href="https://docs.python.org/3/">not a PEP</a>
+</div></body></html>
+"""
+
+
+@pytest.fixture
+def corpus_dir_path(tmp_path):
+    # ローカルのHTMLから取得するときは、フォルダ名を取得日時として扱う
+    dir_path = tmp_path / '20200101-000000'
+    write_corpus(dir_path, 40, seed=5)
+    (dir_path / 'pep-0041.html').write_bytes(EDGE_CASE_HTML)
+    return dir_path
+
+
+def test_extractors_match_bs4(corpus_dir_path):
+    assert check_parity(corpus_dir_path) == {name: [] for name in LINK_EXTRACTORS if name != 'bs4'}
+
+
+@pytest.mark.parametrize('link_extractor', sorted(name for name in LINK_EXTRACTORS if name != 'bs4'))
+def test_combined_acquirer_uses_link_extractor(corpus_dir_path, monkeypatch, link_extractor):
+    # 目次にないpep-0041.htmlも含めて取得する
+    pep_ids = sorted(path.stem[len('pep-'):] for path in corpus_dir_path.glob('pep-*.html'))
+    expected = PepHeaderAndLinkAcquirer().acquire(input_local_dir_path=str(corpus_dir_path), pep_ids=pep_ids)
+
+    # bs4以外を選んだ場合は、パース済みの木からリンクを探さない
+    def fail(soup):
+        raise AssertionError('bs4 was used to extract links')
+
+    monkeypatch.setattr(pep_acquirer_module, 'extract_linked_pep_ids_from_soup', fail)
+    actual = PepHeaderAndLinkAcquirer(link_extractor=link_extractor).acquire(
+        input_local_dir_path=str(corpus_dir_path), pep_ids=pep_ids)
+
+    assert actual == expected
+    assert actual['0041']['link'] == {'0002': 2, '0003': 1, '0004': 1, '0006': 1, '0007': 1, '0008': 1}
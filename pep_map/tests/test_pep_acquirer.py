@@ -0,0 +1,107 @@
+from datetime import datetime
+import urllib.error
+
+from acquirer.pep_acquirer import PepHeaderAndLinkAcquirer, PepLinkDestinationAcquirer
+from acquirer.raw_data_store import ContentAddressedRawDataStore
+from benchmark.synthetic_corpus import write_corpus
+
+# リンクを1つも持たないページ
+NO_LINK_HTML = b"""<html><body><div id="pep-content">
+<table class="rfc2822 docutils field-list"><tbody>
+<tr class="field"><th class="field-name">PEP:</th><td class="field-body">41</td></tr>
+<tr class="field"><th class="field-name">Title:</th><td class="field-body">No links</td></tr>
+</tbody></table>
+<p>This PEP does not link to any other PEP.</p>
+</div></body></html>
+"""
+
+
+def test_edge_list_baseline_keeps_peps_without_links(tmp_path):
+    # out_root/raw/<YYYYmmdd-HHMMSS>/ の形で保存したスナップショットを、前回の取得結果とする
+    raw_dir_path = tmp_path / 'raw' / '20200101-000000'
+    write_corpus(raw_dir_path, 40, seed=7)
+    (raw_dir_path / 'pep-0041.html').write_bytes(NO_LINK_HTML)
+    pep_ids = sorted(path.stem[len('pep-'):] for path in raw_dir_path.glob('pep-*.html') if path.stem != 'pep-0000')
+
+    acquirer = PepHeaderAndLinkAcquirer()
+    acquirer.acquire(input_local_dir_path=str(raw_dir_path), pep_ids=pep_ids)
+    acquirer.header_acquirer.to_csv(str(tmp_path))
+    acquirer.link_acquirer.to_edge_list(str(tmp_path))
+    assert '0041' not in set(acquirer.link_acquirer.to_edge_list_dataframe()['link_source_pep_id'])
+
+    link_acquirer = PepLinkDestinationAcquirer()
+    link_acquirer.acquire(input_local_dir_path=str(raw_dir_path), pep_ids=pep_ids,
+                          baseline_raw_dir_path=str(raw_dir_path))
+
+    assert link_acquirer.changeset == dict(added=[], removed=[], changed=[], unchanged=pep_ids, failed=[])
+
+
+def save_snapshot(tmp_path, pep_count: int = 20) -> (list, dict):
+    """
+    out_root/raw/<YYYYmmdd-HHMMSS>/ のHTMLと、out_root/のCSVを前回の取得結果として保存する
+    """
+    raw_dir_path = tmp_path / 'raw' / '20200101-000000'
+    write_corpus(raw_dir_path, pep_count, seed=11)
+    pep_ids = sorted(path.stem[len('pep-'):] for path in raw_dir_path.glob('pep-*.html') if path.stem != 'pep-0000')
+
+    acquirer = PepHeaderAndLinkAcquirer()
+    data = acquirer.acquire(input_local_dir_path=str(raw_dir_path), pep_ids=pep_ids)
+    acquirer.to_csv(str(tmp_path))
+    return pep_ids, data
+
+
+def test_failed_pep_is_not_removed(tmp_path, monkeypatch):
+    pep_ids, baseline_data = save_snapshot(tmp_path)
+    raw_dir_path = tmp_path / 'raw' / '20200101-000000'
+
+    acquirer = PepHeaderAndLinkAcquirer()
+    acquire_pep_html = acquirer._acquire_pep_html
+
+    def fail_0005(pep_id, **kwargs):
+        if pep_id == '0005':
+            raise urllib.error.URLError('connection refused')
+        return acquire_pep_html(pep_id=pep_id, **kwargs)
+
+    monkeypatch.setattr(acquirer, '_acquire_pep_html', fail_0005)
+    data = acquirer.acquire(input_local_dir_path=str(raw_dir_path), pep_ids=pep_ids,
+                            baseline_raw_dir_path=str(raw_dir_path))
+
+    assert list(acquirer.failures) == ['0005']
+    assert acquirer.changeset['removed'] == []
+    assert acquirer.changeset['failed'] == ['0005']
+    # 取得できなかったPEPは、前回のレコードのまま残る
+    assert list(data) == pep_ids
+    assert data['0005']['link'] == baseline_data['0005']['link']
+    assert '0005' in acquirer.header_acquirer.to_dataframe().index
+
+
+def test_unrequested_pep_is_not_removed(tmp_path):
+    pep_ids, _ = save_snapshot(tmp_path)
+    raw_dir_path = tmp_path / 'raw' / '20200101-000000'
+
+    acquirer = PepHeaderAndLinkAcquirer()
+    acquirer.acquire(input_local_dir_path=str(raw_dir_path), pep_ids=pep_ids[:5],
+                     baseline_raw_dir_path=str(raw_dir_path))
+
+    assert acquirer.changeset == dict(added=[], removed=[], changed=[], unchanged=pep_ids[:5], failed=[])
+
+
+def test_acquire_from_raw_data_store(tmp_path, corpus_server):
+    _, base_url = corpus_server
+    store = ContentAddressedRawDataStore(tmp_path / 'store')
+    # 日付形式ではないフォルダに保存すると、HTMLはストアにだけあってフォルダには何もない
+    acquirer = PepHeaderAndLinkAcquirer(should_save_raw_data=True,
+                                        raw_data_out_root_path=str(tmp_path / 'html'),
+                                        make_fetch_datetime_dir=False,
+                                        raw_data_store=store,
+                                        base_url=base_url,
+                                        max_workers=4,
+                                        requests_per_second=1000)
+    expected = acquirer.acquire()
+    assert not list((tmp_path / 'html').glob('*.html'))
+
+    local_acquirer = PepHeaderAndLinkAcquirer(raw_data_store=store)
+    actual = local_acquirer.acquire(input_local_dir_path=str(tmp_path / 'html'))
+
+    assert actual == expected
+    assert local_acquirer.fetch_start_datetime == datetime.fromtimestamp(store.snapshot_mtime('html'))
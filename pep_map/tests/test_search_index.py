@@ -0,0 +1,13 @@
+from benchmark.synthetic_corpus import write_corpus
+from search.search_index import iter_raw_html, make_search_index
+
+
+def test_index_page_is_not_indexed(tmp_path):
+    write_corpus(tmp_path, 30, seed=0)
+    assert '0000' in dict(iter_raw_html(tmp_path))
+
+    index = make_search_index(tmp_path)
+    assert '0000' not in index.pep_ids
+    assert len(index.pep_ids) == 30
+    # PEP 0の目次にはすべてのタイトルが含まれるので、除外しないとタイトルの語で上位に出てしまう
+    assert all(result['pep_id'] != '0000' for result in index.search('0'))